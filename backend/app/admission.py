@@ -0,0 +1,335 @@
+"""
+Admission control for the public endpoints that are expensive to serve
+
+Registration does a QRZ lookup and a database write, and every event stream
+holds a connection open for as long as the client stays. Each guarded endpoint
+gets a token bucket per client IP (a burst, refilled at a steady rate) and a
+cap on how many requests or streams it serves at once. A client over either
+limit gets 429 with a Retry-After header.
+
+Counters live in this process by default. With several workers or nodes they
+go in Redis (REDIS_URL, or MONGO_URI when the queue lives in Redis) so the
+limits hold across all of them. If the counter store fails, requests are let
+through rather than turned away.
+
+Admission control is off unless ADMISSION_CONTROL=true.
+"""
+import os
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+from fastapi import HTTPException, Request
+from app.metrics import ADMISSION_REJECTIONS, bound
+from app.services.events import redis_events_url
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; only needed for shared counters
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+# Take one token from a bucket stored as a hash of {tokens, updated}.
+# Returns 0 when admitted, otherwise the seconds until a token is available.
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+else
+  wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+# Take a concurrency slot as a lease in a sorted set scored by its expiry time.
+# Leases that were never released (a worker died) drop out once they expire.
+ACQUIRE_SLOT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+class CounterStore(ABC):
+    """Where the rate-limit buckets and concurrency slots are kept"""
+
+    @abstractmethod
+    async def take_token(self, key: str, rate: float, burst: int) -> float:
+        """Take a token from key's bucket; returns 0 if admitted, else the seconds to wait"""
+
+    @abstractmethod
+    async def acquire_slot(self, key: str, limit: int, lease: float) -> Optional[str]:
+        """Take one of limit slots for up to lease seconds; returns its token, or None if all are taken"""
+
+    @abstractmethod
+    async def renew_slot(self, key: str, token: str, lease: float):
+        """Extend a held slot's lease"""
+
+    @abstractmethod
+    async def release_slot(self, key: str, token: str):
+        """Give a slot back"""
+
+    @abstractmethod
+    async def slots_in_use(self, key: str) -> int:
+        """Number of slots currently held"""
+
+
+class MemoryCounterStore(CounterStore):
+    """Counters for a single process"""
+
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, updated)
+        self._slots: Dict[str, Set[str]] = {}
+
+    async def take_token(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        # Re-inserted last, so the first keys are the least recently seen
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            del self._buckets[next(iter(self._buckets))]
+        return wait
+
+    async def acquire_slot(self, key: str, limit: int, lease: float) -> Optional[str]:
+        # Slots can't outlive this process, so leases never need to expire here
+        slots = self._slots.setdefault(key, set())
+        if len(slots) >= limit:
+            return None
+        token = uuid.uuid4().hex
+        slots.add(token)
+        return token
+
+    async def renew_slot(self, key: str, token: str, lease: float):
+        pass
+
+    async def release_slot(self, key: str, token: str):
+        self._slots.get(key, set()).discard(token)
+
+    async def slots_in_use(self, key: str) -> int:
+        return len(self._slots.get(key, ()))
+
+
+class RedisCounterStore(CounterStore):
+    """Counters shared by every worker and node through Redis"""
+
+    def __init__(self, client=None, prefix: str = 'pileup_buster:admission'):
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("The redis package is required for shared admission counters")
+            client = aioredis.from_url(redis_events_url(), decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self._take_token = client.register_script(TAKE_TOKEN_SCRIPT)
+        self._acquire_slot = client.register_script(ACQUIRE_SLOT_SCRIPT)
+
+    async def take_token(self, key: str, rate: float, burst: int) -> float:
+        wait = await self._take_token(keys=[f'{self.prefix}:bucket:{key}'], args=[rate, burst, time.time()])
+        return float(wait)
+
+    async def acquire_slot(self, key: str, limit: int, lease: float) -> Optional[str]:
+        token = uuid.uuid4().hex
+        now = time.time()
+        acquired = await self._acquire_slot(
+            keys=[f'{self.prefix}:slots:{key}'],
+            args=[limit, now, now + lease, token, int(lease) + 1]
+        )
+        return token if acquired else None
+
+    async def renew_slot(self, key: str, token: str, lease: float):
+        await self.client.zadd(f'{self.prefix}:slots:{key}', {token: time.time() + lease}, xx=True)
+
+    async def release_slot(self, key: str, token: str):
+        await self.client.zrem(f'{self.prefix}:slots:{key}', token)
+
+    async def slots_in_use(self, key: str) -> int:
+        return await self.client.zcount(f'{self.prefix}:slots:{key}', time.time(), '+inf')
+
+
+def admission_enabled() -> bool:
+    """Whether the guarded endpoints are rate limited (ADMISSION_CONTROL=true)"""
+    return os.getenv('ADMISSION_CONTROL', 'false').lower() in ('1', 'true', 'yes')
+
+
+def client_ip(request: Request) -> str:
+    """
+    The address a request came from
+
+    X-Forwarded-For is only believed with TRUST_PROXY_HEADERS=true, i.e. when the
+    app is only reachable through a proxy that sets it.
+    """
+    if os.getenv('TRUST_PROXY_HEADERS', 'false').lower() in ('1', 'true', 'yes'):
+        forwarded = request.headers.get('x-forwarded-for')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.client.host if request.client else 'unknown'
+
+
+@dataclass
+class Slot:
+    """A held concurrency slot; give it back with AdmissionLimiter.release()"""
+    token: Optional[str]
+
+
+class AdmissionLimiter:
+    """Per-IP token bucket plus a concurrency cap for one endpoint"""
+
+    def __init__(self, name: str, rate: float, burst: int, max_concurrent: int,
+                 lease: float = 60.0, store: Optional[CounterStore] = None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.lease = lease
+        self.store = store
+        self.rejections: Counter = Counter()  # reason -> count
+        self.admitted = 0
+
+    @classmethod
+    def from_env(cls, name: str, rate: float, burst: int, max_concurrent: int, lease: float = 60.0):
+        """
+        Build a limiter whose limits can be overridden with <NAME>_RATE (tokens per
+        second), <NAME>_BURST and <NAME>_MAX_CONCURRENT
+        """
+        prefix = name.upper()
+        return cls(
+            name,
+            rate=float(os.getenv(f'{prefix}_RATE', str(rate))),
+            burst=int(os.getenv(f'{prefix}_BURST', str(burst))),
+            max_concurrent=int(os.getenv(f'{prefix}_MAX_CONCURRENT', str(max_concurrent))),
+            lease=lease
+        )
+
+    async def admit(self, request: Request) -> Slot:
+        """
+        Check the client's rate and take a concurrency slot
+
+        Raises:
+            HTTPException: 429 with Retry-After when either limit is reached
+        """
+        if not admission_enabled():
+            return Slot(None)
+        store = self.store or admission_store()
+        ip = client_ip(request)
+
+        try:
+            wait = await store.take_token(f'{self.name}:{ip}', self.rate, self.burst)
+        except Exception as e:
+            logger.warning(f"Admission counter store failed, admitting {self.name} request: {e}")
+            return Slot(None)
+        if wait > 0:
+            self._reject('rate', f'Too many requests from {ip}, please slow down', wait)
+
+        try:
+            token = await store.acquire_slot(self.name, self.max_concurrent, self.lease)
+        except Exception as e:
+            logger.warning(f"Admission counter store failed, admitting {self.name} request: {e}")
+            return Slot(None)
+        if token is None:
+            self._reject('concurrency', 'Server is busy, please try again shortly', 1)
+
+        self.admitted += 1
+        return Slot(token)
+
+    async def renew(self, slot: Slot):
+        """Keep a long-lived slot (an event stream) from expiring in the shared store"""
+        if slot.token is None:
+            return
+        try:
+            await (self.store or admission_store()).renew_slot(self.name, slot.token, self.lease)
+        except Exception as e:
+            logger.warning(f"Failed to renew {self.name} admission slot: {e}")
+
+    async def release(self, slot: Slot):
+        """Give a slot taken by admit() back"""
+        if slot.token is None:
+            return
+        try:
+            await (self.store or admission_store()).release_slot(self.name, slot.token)
+        except Exception as e:
+            logger.warning(f"Failed to release {self.name} admission slot: {e}")
+        slot.token = None
+
+    async def stats(self) -> Dict[str, Any]:
+        """Admissions, rejections by reason and slots in use"""
+        try:
+            in_use = await (self.store or admission_store()).slots_in_use(self.name)
+        except Exception as e:
+            logger.warning(f"Failed to read {self.name} admission slots: {e}")
+            in_use = None
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'max_concurrent': self.max_concurrent,
+            'in_use': in_use,
+            'admitted': self.admitted,
+            'rejected': dict(self.rejections)
+        }
+
+    def _reject(self, reason: str, detail: str, retry_after: float):
+        self.rejections[reason] += 1
+        bound(ADMISSION_REJECTIONS, self.name, reason).inc()
+        logger.info(f"Rejected {self.name} request ({reason} limit)")
+        raise HTTPException(
+            status_code=429,
+            detail=detail,
+            headers={'Retry-After': str(max(1, int(retry_after + 0.999)))}
+        )
+
+
+_store: Optional[CounterStore] = None
+
+
+def admission_store() -> CounterStore:
+    """The counter store shared by all limiters: Redis when configured, else this process"""
+    global _store
+    if _store is None:
+        if redis_events_url() and aioredis is not None:
+            _store = RedisCounterStore()
+        else:
+            _store = MemoryCounterStore()
+    return _store
+
+
+def set_admission_store(store: Optional[CounterStore]):
+    """Use a different counter store (None goes back to the default on next use)"""
+    global _store
+    _store = store
+
+
+# Registrations: a burst of 5 per client, then one every 10 seconds; 50 in flight at once
+register_limiter = AdmissionLimiter.from_env('register', rate=0.1, burst=5, max_concurrent=50)
+# Event streams: a client can reconnect a few times quickly; 1000 open streams per deployment
+stream_limiter = AdmissionLimiter.from_env('stream', rate=0.2, burst=10, max_concurrent=1000, lease=90.0)
+
+limiters = {limiter.name: limiter for limiter in (register_limiter, stream_limiter)}
+
+
+async def admission_stats() -> Dict[str, Any]:
+    """Stats for every limiter, keyed by name"""
+    return {
+        'enabled': admission_enabled(),
+        'limiters': {name: await limiter.stats() for name, limiter in limiters.items()}
+    }
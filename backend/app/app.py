@@ -1,6 +1,6 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 import os
@@ -356,6 +356,10 @@ def create_app():
     # Load environment variables
     load_dotenv()
     
+    # Text or JSON log output (LOG_FORMAT, LOG_LEVEL)
+    from app.logs import activity, configure_logging
+    configure_logging()
+    
     # Create FastAPI app
     app = FastAPI(
         title="Pileup Buster API",
@@ -372,6 +376,15 @@ def create_app():
         }
     )
     
+    # Keep admin requests in their own concurrency pool so public traffic can't starve them
+    # (added before CORS so that CORS headers also go on the pool's 503 responses)
+    from app.bulkhead import BulkheadMiddleware, reserve_threads
+    app.add_middleware(BulkheadMiddleware)
+    
+    @app.on_event("startup")
+    async def reserve_admin_threads():
+        reserve_threads()
+    
     # Enable CORS for frontend communication
     app.add_middleware(
         CORSMiddleware,
@@ -381,6 +394,47 @@ def create_app():
         allow_headers=["*"],
     )
     
+    from app.metrics import MetricsMiddleware, metrics_available, render_metrics
+    
+    @app.get('/metrics', include_in_schema=False)
+    def get_metrics():
+        """Prometheus metrics"""
+        if not metrics_available():
+            raise HTTPException(status_code=503, detail='Metrics are unavailable (install prometheus_client)')
+        content, media_type = render_metrics()
+        return Response(content=content, media_type=media_type)
+    
+    # Record a span per request when tracing is configured (TRACING_EXPORTER)
+    from app.tracing import TracingMiddleware, flush_tracing
+    app.add_middleware(TracingMiddleware)
+    
+    @app.on_event("shutdown")
+    async def flush_traces():
+        flush_tracing()
+    
+    # Note the request behind each operation in the slow-op log (when enabled)
+    from app.slow_ops import SlowOpMiddleware, slow_op_log
+    if slow_op_log is not None:
+        app.add_middleware(SlowOpMiddleware)
+    
+    # Record mutating calls and SSE connects/disconnects for replay (TRAFFIC_RECORD_FILE)
+    from app.recorder import TrafficRecorderMiddleware, traffic_recorder
+    if traffic_recorder is not None:
+        app.add_middleware(TrafficRecorderMiddleware, recorder=traffic_recorder)
+    
+        @app.on_event("startup")
+        async def start_traffic_recorder():
+            traffic_recorder.start()
+    
+        @app.on_event("shutdown")
+        async def stop_traffic_recorder():
+            traffic_recorder.stop()
+    
+    # Time every request for /metrics; added last so it is outermost and the
+    # timings include pool waits and the tracing, slow-op and recorder layers
+    if metrics_available():
+        app.add_middleware(MetricsMiddleware)
+    
     # Configuration (stored as app state)
     app.state.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.state.mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/pileup_buster')
@@ -455,11 +509,55 @@ def create_app():
     from app.routes.admin import admin_router
     from app.routes.public import public_router
     from app.routes.events import events_router
+    from app.routes.images import images_router
     
     app.include_router(queue_router, prefix="/api/queue", tags=["queue"])
     app.include_router(admin_router, prefix="/api/admin", tags=["admin"])
     app.include_router(public_router, prefix="/api/public", tags=["public"])
     app.include_router(events_router, prefix="/api/events", tags=["events"])
+    app.include_router(images_router, prefix="/api/images", tags=["images"])
+    
+    # Share SSE events between nodes when Redis is configured
+    from app.services.events import event_broadcaster, RedisEventRelay, redis_events_url
+    
+    @app.on_event("startup")
+    async def start_event_relay():
+        if redis_events_url():
+            try:
+                relay = RedisEventRelay(event_broadcaster)
+                await relay.start()
+            except Exception as e:
+                # A node that can't reach Redis still serves its own clients
+                logging.error(f"Failed to start Redis event relay, broadcasting locally only: {e}")
+            else:
+                app.state.event_relay = relay
+    
+    @app.on_event("shutdown")
+    async def stop_event_relay():
+        relay = getattr(app.state, 'event_relay', None)
+        if relay is not None:
+            await relay.stop()
+    
+    # One aggregated line per interval instead of a line per SSE connection and broadcast
+    @app.on_event("startup")
+    async def start_activity_summary():
+        await activity.start()
+    
+    @app.on_event("shutdown")
+    async def stop_activity_summary():
+        await activity.stop()
+    
+    # Absorb registration bursts through the intake buffer when enabled
+    from app.services.intake import registration_intake, intake_enabled
+    
+    @app.on_event("startup")
+    async def start_registration_intake():
+        if intake_enabled():
+            await registration_intake.start()
+    
+    @app.on_event("shutdown")
+    async def stop_registration_intake():
+        await registration_intake.stop()
     
     return app
 
@@ -0,0 +1,183 @@
+"""
+Bulkheads: separate concurrency pools for admin and public requests
+
+Sync route handlers all run on one anyio threadpool, so a storm of public
+reads can use every thread while the operator's "next" waits behind it. Each
+request under /api/ is admitted to a pool first: /api/admin/* to the admin
+pool and everything else to the public pool. The threadpool is sized to
+hold both pools at once, so public traffic can never take the threads kept
+for admin requests.
+
+Requests wait in their pool's queue when it is full. Public requests are
+turned away with 503 once too many are already waiting. Event streams are
+long-lived and capped by admission control instead, so they skip the pools.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+import anyio
+from fastapi.responses import JSONResponse
+from app.metrics import BULKHEAD_IN_FLIGHT, BULKHEAD_REJECTIONS, BULKHEAD_WAITING, bound
+
+logger = logging.getLogger(__name__)
+
+
+class BulkheadFull(Exception):
+    """Raised when a pool's wait queue is full"""
+
+
+class Bulkhead:
+    """A concurrency pool with a FIFO wait queue"""
+
+    def __init__(self, name: str, size: int, max_waiting: Optional[int] = None):
+        self.name = name
+        self.size = size
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.peak_waiting = 0
+        self.total_wait = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._in_flight_gauge = bound(BULKHEAD_IN_FLIGHT, name)
+        self._waiting_gauge = bound(BULKHEAD_WAITING, name)
+        self._rejections = bound(BULKHEAD_REJECTIONS, name)
+
+    @property
+    def waiting(self) -> int:
+        """Requests queued for a slot"""
+        return len(self._waiters)
+
+    async def acquire(self):
+        """
+        Wait for a slot
+
+        Raises:
+            BulkheadFull: if max_waiting requests are already queued
+        """
+        if self.in_flight < self.size and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            self._in_flight_gauge.set(self.in_flight)
+            return
+
+        if self.max_waiting is not None and len(self._waiters) >= self.max_waiting:
+            self.rejected += 1
+            self._rejections.inc()
+            raise BulkheadFull(f"{self.name} pool is full ({len(self._waiters)} waiting)")
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.peak_waiting = max(self.peak_waiting, len(self._waiters))
+        self._waiting_gauge.set(len(self._waiters))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._waiting_gauge.set(len(self._waiters))
+            raise
+        self.total_wait += time.perf_counter() - started
+        self.admitted += 1
+
+    def release(self):
+        """Hand the slot to the next waiter, or free it"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._waiting_gauge.set(len(self._waiters))
+                return
+        self.in_flight -= 1
+        self._waiting_gauge.set(0)
+        self._in_flight_gauge.set(self.in_flight)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, slots in use, queue depth and wait times"""
+        return {
+            'size': self.size,
+            'in_flight': self.in_flight,
+            'waiting': self.waiting,
+            'peak_waiting': self.peak_waiting,
+            'max_waiting': self.max_waiting,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'total_wait_seconds': round(self.total_wait, 6)
+        }
+
+
+admin_pool = Bulkhead('admin', int(os.getenv('ADMIN_POOL_SIZE', '8')))
+public_pool = Bulkhead(
+    'public',
+    int(os.getenv('PUBLIC_POOL_SIZE', '32')),
+    max_waiting=int(os.getenv('PUBLIC_POOL_MAX_WAITING', '500'))
+)
+pools = {pool.name: pool for pool in (admin_pool, public_pool)}
+
+
+def pool_for_path(path: str) -> Optional[Bulkhead]:
+    """The pool a request path is admitted to (None for unpooled paths)"""
+    if path.startswith('/api/admin'):
+        return admin_pool
+    if path.startswith('/api/events/stream'):
+        return None
+    if path.startswith('/api/') or path == '/status':
+        return public_pool
+    return None
+
+
+def reserve_threads():
+    """
+    Size the default threadpool to hold every pool at once
+
+    A request uses at most one worker thread at a time, so with this many
+    threads the admin pool's share is always free for admin requests.
+    """
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    needed = sum(pool.size for pool in pools.values())
+    if limiter.total_tokens < needed:
+        limiter.total_tokens = needed
+    logger.info(f"Threadpool holds {limiter.total_tokens} threads for pools of "
+                + ', '.join(f"{pool.name}={pool.size}" for pool in pools.values()))
+
+
+class BulkheadMiddleware:
+    """ASGI middleware admitting each request to its pool"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        pool = pool_for_path(scope['path']) if scope['type'] == 'http' else None
+        if pool is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await pool.acquire()
+        except BulkheadFull as e:
+            logger.warning(f"Rejected {scope['path']}: {e}")
+            response = JSONResponse(status_code=503, content={'detail': 'Server is busy, please try again shortly'},
+                                    headers={'Retry-After': '1'})
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
+
+
+def bulkhead_stats() -> Dict[str, Any]:
+    """Stats for every pool, keyed by name"""
+    return {name: pool.stats() for name, pool in pools.items()}
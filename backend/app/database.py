@@ -1,13 +1,359 @@
-"""Database module for MongoDB operations"""
+"""Database module for queue storage backends (MongoDB by default)"""
 import os
+from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-from pymongo import MongoClient
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+from pymongo import MongoClient, ReturnDocument
 from pymongo.collection import Collection
-from pymongo.errors import PyMongoError
+from pymongo.errors import PyMongoError, DuplicateKeyError
+from app.faults import inject_storage_faults
+from app.metrics import instrument_storage
+from app.slow_ops import mongo_event_listeners, trace_storage
+from app.tracing import span_storage
 
 
-class QueueDatabase:
+# Status collection document holding the last assigned queue sequence number
+SEQ_COUNTER_ID = 'queue_seq'
+
+# Status collection document holding the state version bumped by every write
+STATE_VERSION_ID = 'state_version'
+
+T = TypeVar('T')
+
+
+class VersionConflict(Exception):
+    """Raised when a conditional write expected a different state version"""
+
+    def __init__(self, expected: int, current: int):
+        super().__init__(f"State version is {current}, expected {expected}")
+        self.expected = expected
+        self.current = current
+
+
+def default_qrz_info(callsign: str) -> Dict[str, Any]:
+    """Placeholder QRZ information stored when no lookup result is available"""
+    return {
+        'callsign': callsign,
+        'name': None,
+        'address': None,
+        'dxcc_name': None,
+        'image': None,
+        'error': 'QRZ information not available'
+    }
+
+
+def bson_utcnow() -> datetime:
+    """Current UTC time truncated to the millisecond precision BSON datetimes keep"""
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def isoformat_timestamp(value: Any) -> Any:
+    """Timestamps are stored as native datetimes but returned as ISO strings"""
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class QueueSettings:
+    """
+    Queue limits, read from the environment once rather than on every request
+
+    max_size is MAX_QUEUE_SIZE (default 4). window_size and neighborhood_radius
+    size the large-queue views (QUEUE_WINDOW_SIZE, None when unset, and
+    QUEUE_NEIGHBORHOOD_RADIUS; see app/queue_window.py).
+    """
+
+    def __init__(self, max_size: int = 4, window_size: Optional[int] = None, neighborhood_radius: int = 5):
+        self.max_size = max_size
+        self.window_size = window_size
+        self.neighborhood_radius = neighborhood_radius
+
+    @classmethod
+    def from_env(cls) -> 'QueueSettings':
+        window_size = os.getenv('QUEUE_WINDOW_SIZE')
+        return cls(
+            max_size=int(os.getenv('MAX_QUEUE_SIZE', '4')),
+            window_size=max(0, int(window_size)) if window_size is not None else None,
+            neighborhood_radius=int(os.getenv('QUEUE_NEIGHBORHOOD_RADIUS', '5'))
+        )
+
+
+# Global settings, loaded with the global queue_db below (create_app has run load_dotenv by then)
+queue_settings = QueueSettings.from_env()
+
+
+def max_queue_size() -> int:
+    """The MAX_QUEUE_SIZE setting (default 4)"""
+    return queue_settings.max_size
+
+
+# Fields a queue listing can be projected to; qrz sub-fields can be picked with qrz.<name>.
+# callsign, seq and position are always returned so entries stay identifiable and pageable.
+QUEUE_FIELDS = ('callsign', 'seq', 'position', 'timestamp', 'qrz')
+ALWAYS_RETURNED_FIELDS = ('callsign', 'seq', 'position')
+
+
+def parse_queue_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma-separated fields= projection
+
+    Raises:
+        ValueError: if a field isn't part of a queue entry
+    """
+    if fields is None:
+        return None
+    names = [name.strip() for name in fields.split(',') if name.strip()]
+    for name in names:
+        if name not in QUEUE_FIELDS and not (name.startswith('qrz.') and len(name) > 4):
+            raise ValueError(f"Unknown queue field: {name}")
+    if 'qrz' in names:
+        # The whole subdocument already covers its fields (and MongoDB rejects the overlap)
+        names = [name for name in names if not name.startswith('qrz.')]
+    return list(dict.fromkeys(names))
+
+
+def project_entry(entry: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Reduce a queue entry to the requested fields (for backends that can't push it down)"""
+    if fields is None:
+        return entry
+    result = {name: entry[name] for name in ALWAYS_RETURNED_FIELDS if name in entry}
+    for name in fields:
+        if name.startswith('qrz.'):
+            key = name[4:]
+            qrz = entry.get('qrz') or {}
+            if key in qrz:
+                result.setdefault('qrz', {})[key] = qrz[key]
+        elif name in entry:
+            result[name] = entry[name]
+    return result
+
+
+def queue_page(store: "QueueStorage", limit: Optional[int] = None, after: Optional[int] = None,
+               fields: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read one page of the queue for a listing endpoint
+
+    Returns the entries, the total queue length and the cursor for the next page
+    (None on the last page). Without paging arguments the whole queue is returned.
+    """
+    field_names = parse_queue_fields(fields)
+    if limit is None and after is None and field_names is None:
+        queue_list = store.get_queue_list()
+        return {'queue': queue_list, 'total': len(queue_list), 'next_cursor': None}
+
+    queue_list = store.get_queue_list(limit=limit, after=after, fields=field_names)
+    total = store.get_queue_count()
+    next_cursor = None
+    if queue_list and queue_list[-1]['position'] < total:
+        next_cursor = queue_list[-1]['seq']
+    return {'queue': queue_list, 'total': total, 'next_cursor': next_cursor}
+
+
+class QueueStorage(ABC):
+    """
+    Storage interface for the queue, current QSO, system status, frequency and split.
+
+    Every backend returns plain dicts without storage identifiers and raises
+    ValueError for rule violations (inactive system, duplicate callsign, full queue)
+    so the routes can treat them interchangeably.
+
+    Every write also bumps a monotonically increasing state version, returned under
+    'version' by the mutations that return a dict.
+    """
+
+    @abstractmethod
+    def get_state_version(self) -> int:
+        """Get the current state version (0 before the first write)"""
+
+    @abstractmethod
+    def claim_version(self, expected: int) -> int:
+        """
+        Reserve the state version for one conditional write if it still equals expected
+
+        Of several admins holding the same version, only the first to claim it may
+        go on to write. The claim doesn't bump the version (the write does, once) and
+        lapses when the version moves on.
+
+        Raises:
+            VersionConflict: if the version has moved on or is already claimed
+        """
+
+    @abstractmethod
+    def release_version(self, expected: int):
+        """Drop a claim on expected that no write used"""
+
+    def write_if_version(self, expected: int, write: Callable[[], T]) -> T:
+        """
+        Run write only if the state version still equals expected (If-Match)
+
+        By default the version is claimed first and the claim released if the write
+        didn't move the version (it failed or had nothing to change). That stops a
+        second conditional write on the same version, but an unconditional write
+        (a registration) can still land between the claim and the write. Backends
+        that can hold other writers off for the whole write make it atomic instead.
+
+        Raises:
+            VersionConflict: if the version has moved on or is already claimed
+        """
+        self.claim_version(expected)
+        try:
+            return write()
+        finally:
+            if self.get_state_version() == expected:
+                self.release_version(expected)
+
+    @abstractmethod
+    def register_callsign(self, callsign: str, qrz_info: Dict[str, Any] = None,
+                          include_queue: bool = False) -> Dict[str, Any]:
+        """
+        Register a callsign in the queue with optional QRZ information
+
+        With include_queue the entry also carries the resulting queue list under
+        'queue', read together with the write so callers don't need to re-read it.
+        """
+
+    @abstractmethod
+    def find_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Find a callsign in the queue and return with updated position"""
+
+    @abstractmethod
+    def get_queue_list(self, limit: Optional[int] = None, after: Optional[int] = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Get the queue list with updated positions
+
+        Args:
+            limit: Return at most this many entries
+            after: Only return entries with a sequence number greater than this (cursor)
+            fields: Project entries to these fields (see QUEUE_FIELDS)
+        """
+
+    @abstractmethod
+    def get_neighborhood(self, callsign: str, radius: int) -> List[Dict[str, Any]]:
+        """
+        Get a callsign's entry with up to radius entries either side of it
+
+        Returns an empty list if the callsign isn't queued. Cost depends on the radius,
+        not on the queue length, so it can back per-client views of very long queues.
+        """
+
+    @abstractmethod
+    def remove_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Remove a callsign from the queue"""
+
+    @abstractmethod
+    def clear_queue(self) -> Dict[str, Any]:
+        """Clear the entire queue; returns cleared_count and the state version the clear wrote"""
+
+    @abstractmethod
+    def get_next_callsign(self, include_queue: bool = False) -> Optional[Dict[str, Any]]:
+        """Get and remove the next callsign in queue (FIFO), optionally with the remaining queue under 'queue'"""
+
+    @abstractmethod
+    def get_queue_count(self) -> int:
+        """Get the total count of entries in queue"""
+
+    @abstractmethod
+    def get_system_status(self) -> Dict[str, Any]:
+        """Get the current system status (active/inactive)"""
+
+    @abstractmethod
+    def reset(self, active: bool, updated_by: str = "admin") -> Dict[str, Any]:
+        """Atomically clear the queue and current QSO and set the system status"""
+
+    def set_system_status(self, active: bool, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the system status (active/inactive) and clear queue when changing status"""
+        return self.reset(active, updated_by)
+
+    @abstractmethod
+    def advance(self, include_queue: bool = True) -> Dict[str, Any]:
+        """
+        Atomically move the next queued callsign into the current QSO
+
+        Returns:
+            Dict with previous_qso, current_qso (None when the queue was empty) and,
+            if include_queue, the remaining queue list under 'queue'
+        """
+
+    @abstractmethod
+    def get_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Get the current callsign in QSO"""
+
+    @abstractmethod
+    def set_current_qso(self, callsign: str, qrz_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Set the current callsign in QSO with QRZ information"""
+
+    @abstractmethod
+    def clear_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Clear the current QSO"""
+
+    @abstractmethod
+    def get_frequency(self) -> Optional[Dict[str, Any]]:
+        """Get the current transmission frequency"""
+
+    @abstractmethod
+    def set_frequency(self, frequency: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current transmission frequency"""
+
+    @abstractmethod
+    def clear_frequency(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current transmission frequency"""
+
+    @abstractmethod
+    def get_split(self) -> Optional[Dict[str, Any]]:
+        """Get the current split value"""
+
+    @abstractmethod
+    def set_split(self, split: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current split value"""
+
+    @abstractmethod
+    def clear_split(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current split value"""
+
+    def is_system_active(self) -> bool:
+        """Check if the system is currently active"""
+        try:
+            status = self.get_system_status()
+            return status.get("active", False)
+        except Exception:
+            # If we can't check status, default to inactive for safety
+            return False
+
+
+class StorageProxy:
+    """
+    A QueueStorage store seen through wrapped public methods
+
+    Only calls made through the proxy are wrapped: the store is left untouched,
+    so its calls to itself (register_callsign checking is_system_active, reset
+    clearing the queue) are neither faulted, timed nor traced a second time.
+    Anything else is read from the store.
+    """
+
+    def __init__(self, store, wrap: Callable[[str, Callable], Callable]):
+        self._store = store
+        for name in dir(QueueStorage):
+            if name.startswith('_') or not callable(getattr(QueueStorage, name)):
+                continue
+            setattr(self, name, wrap(name, getattr(store, name)))
+
+    def __getattr__(self, name):
+        return getattr(self._store, name)
+
+
+def wrap_storage(store, wrap: Callable[[str, Callable], Callable]) -> StorageProxy:
+    """Wrap every public QueueStorage method of a store with wrap(name, method)"""
+    return StorageProxy(store, wrap)
+
+
+def storage_backend(store) -> str:
+    """The class name of the backend behind any number of proxies"""
+    while isinstance(store, StorageProxy):
+        store = store._store
+    return type(store).__name__
+
+
+class QueueDatabase(QueueStorage):
     """MongoDB database operations for queue management"""
     
     def __init__(self):
@@ -16,13 +362,15 @@ class QueueDatabase:
         self.collection: Optional[Collection] = None
         self.status_collection: Optional[Collection] = None
         self.currentqso_collection: Optional[Collection] = None
+        self._transactions: Optional[bool] = None
         self._connect()
     
     def _connect(self):
         """Initialize MongoDB connection"""
         try:
             mongo_uri = os.getenv('MONGO_URI', 'mongodb://localhost:27017/pileup_buster')
-            self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+            self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000,
+                                      event_listeners=mongo_event_listeners())
             # Extract database name from URI or use default
             if 'pileup_buster' in mongo_uri:
                 db_name = 'pileup_buster'
@@ -37,6 +385,12 @@ class QueueDatabase:
             # Test connection with short timeout
             self.client.admin.command('ping')
             
+            self._backfill_seq()
+            # Queue order, positions and FIFO pops all go through the sequence number
+            self.collection.create_index('seq')
+            # Duplicate checks and status lookups go by callsign
+            self.collection.create_index('callsign')
+            
         except PyMongoError as e:
             print(f"MongoDB connection error: {e}")
             print("Note: In production, ensure MongoDB is accessible via MONGO_URI environment variable")
@@ -47,7 +401,31 @@ class QueueDatabase:
             self.status_collection = None
             self.currentqso_collection = None
     
-    def register_callsign(self, callsign: str, qrz_info: Dict[str, Any] = None) -> Dict[str, Any]:
+    def _backfill_seq(self):
+        """
+        Number queue entries written before entries carried a seq, in timestamp order
+
+        Without a seq they would have no position and never be advanced to. They take
+        the next numbers from the counter, so they are queued after any numbered entry.
+        """
+        legacy = list(self.collection.find({"seq": {"$exists": False}}, {"_id": 1}).sort("timestamp", 1))
+        if not legacy:
+            return
+        counter = self.status_collection.find_one_and_update(
+            {"_id": SEQ_COUNTER_ID},
+            {"$inc": {"seq": len(legacy)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first_seq = counter["seq"] - len(legacy) + 1
+        for offset, doc in enumerate(legacy):
+            # Another instance starting up at the same time may have numbered it already
+            self.collection.update_one({"_id": doc["_id"], "seq": {"$exists": False}},
+                                       {"$set": {"seq": first_seq + offset}})
+        print(f"Assigned queue sequence numbers to {len(legacy)} existing entries")
+    
+    def register_callsign(self, callsign: str, qrz_info: Dict[str, Any] = None,
+                          include_queue: bool = False) -> Dict[str, Any]:
         """Register a callsign in the queue with optional QRZ information"""
         if self.collection is None:
             raise Exception("Database connection not available")
@@ -56,17 +434,25 @@ class QueueDatabase:
         if not self.is_system_active():
             raise ValueError("System is currently inactive. Registration is not available.")
         
-        # Check if callsign already exists
-        existing = self.collection.find_one({"callsign": callsign})
+        if include_queue:
+            # One read of the (bounded) queue answers the duplicate and capacity checks and the snapshot
+            queue_list = self.get_queue_list()
+            existing = any(e['callsign'] == callsign for e in queue_list)
+            current_count = len(queue_list)
+        else:
+            # Check if callsign already exists
+            existing = self.collection.find_one({"callsign": callsign})
+            # Get current queue count
+            current_count = self.collection.count_documents({})
+        
         if existing:
             raise ValueError("Callsign already in queue")
         
-        # Get current queue count and check against limit
-        current_count = self.collection.count_documents({})
-        max_queue_size = int(os.getenv('MAX_QUEUE_SIZE', '4'))
+        # Check against limit
+        limit = max_queue_size()
         
-        if current_count >= max_queue_size:
-            raise ValueError(f"Queue is full. Maximum queue size is {max_queue_size}")
+        if current_count >= limit:
+            raise ValueError(f"Queue is full. Maximum queue size is {limit}")
         
         # Get current position (count + 1)
         position = current_count + 1
@@ -74,24 +460,86 @@ class QueueDatabase:
         # Create entry with QRZ information
         entry = {
             'callsign': callsign,
-            'timestamp': datetime.utcnow().isoformat(),
+            'seq': self._next_seq(),
+            'timestamp': bson_utcnow(),
             'position': position,
-            'qrz': qrz_info or {
-                'callsign': callsign,
-                'name': None,
-                'address': None,
-                'dxcc_name': None,
-                'image': None,
-                'error': 'QRZ information not available'
-            }
+            'qrz': qrz_info or default_qrz_info(callsign)
         }
         
         # Insert into database
         self.collection.insert_one(entry)
-        # Remove MongoDB ObjectId from response
-        if '_id' in entry:
-            del entry['_id']
         
+        result = self._entry_response(entry)
+        if include_queue:
+            result['queue'] = queue_list + [dict(result)]
+        result['version'] = self._bump_version()
+        return result
+    
+    def _next_seq(self) -> int:
+        """Atomically assign the next queue sequence number"""
+        counter = self.status_collection.find_one_and_update(
+            {"_id": SEQ_COUNTER_ID},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter.get("seq")
+    
+    def _bump_version(self, session=None) -> Optional[int]:
+        """Increment the state version; called by every write"""
+        if self.status_collection is None:
+            return None
+        counter = self.status_collection.find_one_and_update(
+            {"_id": STATE_VERSION_ID},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return counter.get("version")
+    
+    def get_state_version(self) -> int:
+        """Get the current state version (0 before the first write)"""
+        if self.status_collection is None:
+            raise Exception("Database connection not available")
+        
+        counter = self.status_collection.find_one({"_id": STATE_VERSION_ID})
+        return counter.get("version", 0) if counter else 0
+    
+    def claim_version(self, expected: int) -> int:
+        """Reserve the state version if it still equals expected and isn't claimed yet"""
+        if self.status_collection is None:
+            raise Exception("Database connection not available")
+        
+        try:
+            # The claim sits on the version document, so the next bump moves past it
+            counter = self.status_collection.find_one_and_update(
+                {"_id": STATE_VERSION_ID, "version": expected, "claimed": {"$ne": expected}},
+                {"$set": {"claimed": expected}},
+                upsert=expected == 0,  # No writes yet, so no counter document
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            counter = None
+        if counter is None:
+            raise VersionConflict(expected, self.get_state_version())
+        return counter["version"]
+    
+    def release_version(self, expected: int):
+        """Drop an unused claim on expected"""
+        if self.status_collection is None:
+            raise Exception("Database connection not available")
+        self.status_collection.update_one(
+            {"_id": STATE_VERSION_ID, "version": expected, "claimed": expected},
+            {"$unset": {"claimed": ""}}
+        )
+    
+    @staticmethod
+    def _entry_response(entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Remove the MongoDB ObjectId and return the stored datetime as an ISO string"""
+        entry.pop('_id', None)
+        if 'timestamp' in entry:
+            entry['timestamp'] = isoformat_timestamp(entry['timestamp'])
         return entry
     
     def find_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
@@ -104,33 +552,66 @@ class QueueDatabase:
         if not entry:
             return None
         
-        # Calculate current position based on timestamp order
+        # Calculate current position based on sequence order
         position = self.collection.count_documents({
-            "timestamp": {"$lt": entry["timestamp"]}
+            "seq": {"$lt": entry["seq"]}
         }) + 1
         
         # Update position in the returned entry (but not in database)
         entry['position'] = position
-        if '_id' in entry:
-            del entry['_id']  # Remove MongoDB ObjectId from response
-            
-        return entry
+        return self._entry_response(entry)
     
-    def get_queue_list(self) -> List[Dict[str, Any]]:
-        """Get the complete queue list with updated positions"""
+    def get_queue_list(self, limit: Optional[int] = None, after: Optional[int] = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get the queue list with updated positions, optionally paged and projected"""
         if self.collection is None:
             raise Exception("Database connection not available")
         
-        # Get all entries sorted by timestamp (FIFO order)
-        entries = list(self.collection.find({}).sort("timestamp", 1))
+        return self._queue_list(limit=limit, after=after, fields=fields)
+    
+    def get_neighborhood(self, callsign: str, radius: int) -> List[Dict[str, Any]]:
+        """Get a callsign's entry with up to radius entries either side of it"""
+        entry = self.find_callsign(callsign)
+        if not entry:
+            return []
+        
+        # Both directions walk the seq index from the entry, so the cost is bounded by radius
+        before = list(self.collection.find({"seq": {"$lt": entry["seq"]}}, {"_id": 0})
+                      .sort("seq", -1).limit(radius))
+        after = list(self.collection.find({"seq": {"$gt": entry["seq"]}}, {"_id": 0})
+                     .sort("seq", 1).limit(radius))
+        
+        window = before[::-1] + [entry] + after
+        first_position = entry['position'] - len(before)
+        for i, neighbor in enumerate(window):
+            neighbor['position'] = first_position + i
+            self._entry_response(neighbor)
+        return window
+    
+    def _queue_list(self, session=None, limit: Optional[int] = None, after: Optional[int] = None,
+                    fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        query = {}
+        offset = 0
+        if after is not None:
+            query = {"seq": {"$gt": after}}
+            # Entries before the cursor still count towards positions
+            offset = self.collection.count_documents({"seq": {"$lte": after}}, session=session)
+        
+        # Leave out _id (and unrequested fields) on the server rather than in Python
+        projection = {"_id": 0}
+        if fields is not None:
+            projection.update({"callsign": 1, "seq": 1})
+            projection.update({name: 1 for name in fields if name != 'position'})
+        
+        # Entries sorted by sequence number (FIFO order)
+        cursor = self.collection.find(query, projection, session=session).sort("seq", 1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
         
-        # Update positions and remove MongoDB ObjectIds
         queue_list = []
-        for i, entry in enumerate(entries):
-            entry['position'] = i + 1
-            if '_id' in entry:
-                del entry['_id']
-            queue_list.append(entry)
+        for i, entry in enumerate(cursor):
+            entry['position'] = offset + i + 1
+            queue_list.append(self._entry_response(entry))
         
         return queue_list
     
@@ -141,35 +622,39 @@ class QueueDatabase:
         
         # Find and remove the entry
         entry = self.collection.find_one_and_delete({"callsign": callsign})
-        if entry and '_id' in entry:
-            del entry['_id']
+        if not entry:
+            return None
         
-        return entry
+        result = self._entry_response(entry)
+        result['version'] = self._bump_version()
+        return result
     
-    def clear_queue(self) -> int:
-        """Clear the entire queue and return count of removed entries"""
+    def clear_queue(self) -> Dict[str, Any]:
+        """Clear the entire queue; returns cleared_count and the state version the clear wrote"""
         if self.collection is None:
             raise Exception("Database connection not available")
         
-        count = self.collection.count_documents({})
-        self.collection.delete_many({})
-        return count
+        count = self.collection.delete_many({}).deleted_count
+        return {"cleared_count": count, "version": self._bump_version()}
     
-    def get_next_callsign(self) -> Optional[Dict[str, Any]]:
+    def get_next_callsign(self, include_queue: bool = False) -> Optional[Dict[str, Any]]:
         """Get and remove the next callsign in queue (FIFO)"""
         if self.collection is None:
             raise Exception("Database connection not available")
         
-        # Find and remove the oldest entry (by timestamp)
+        # Find and remove the oldest entry (by sequence number)
         entry = self.collection.find_one_and_delete(
             {},
-            sort=[("timestamp", 1)]
+            sort=[("seq", 1)]
         )
+        if not entry:
+            return None
         
-        if entry and '_id' in entry:
-            del entry['_id']
-        
-        return entry
+        result = self._entry_response(entry)
+        if include_queue:
+            result['queue'] = self.get_queue_list()
+        result['version'] = self._bump_version()
+        return result
     
     def get_queue_count(self) -> int:
         """Get the total count of entries in queue"""
@@ -210,42 +695,127 @@ class QueueDatabase:
         
         return result
     
-    def set_system_status(self, active: bool, updated_by: str = "admin") -> Dict[str, Any]:
+    def reset(self, active: bool, updated_by: str = "admin") -> Dict[str, Any]:
         """Set the system status (active/inactive) and clear queue when changing status"""
         if self.status_collection is None:
             raise Exception("Database connection not available")
         
-        # Clear the queue whenever the system status changes (activate or deactivate)
-        cleared_count = self.clear_queue()
+        def apply(session):
+            # Clear the queue whenever the system status changes (activate or deactivate)
+            cleared_count = self.collection.delete_many({}, session=session).deleted_count
+            
+            # Also clear any current QSO when changing system status
+            qso_cleared = self.currentqso_collection.delete_one({"_id": "current_qso"}, session=session).deleted_count > 0
+            
+            # Status is written last: without a transaction an interrupted reset leaves the old
+            # status in place and is safe to retry
+            status_update = {
+                "_id": "system_status",
+                "active": active,
+                "last_updated": datetime.utcnow().isoformat(),
+                "updated_by": updated_by
+            }
+            self.status_collection.replace_one({"_id": "system_status"}, status_update, upsert=True, session=session)
+            
+            return {
+                "active": active,
+                "last_updated": status_update["last_updated"],
+                "updated_by": updated_by,
+                "queue_cleared": True,
+                "cleared_count": cleared_count,
+                "qso_cleared": qso_cleared,
+                "version": self._bump_version(session)
+            }
         
-        # Also clear any current QSO when changing system status
-        cleared_qso = self.clear_current_qso()
-        qso_cleared = cleared_qso is not None
+        return self._run_atomic(apply)
+    
+    def advance(self, include_queue: bool = True) -> Dict[str, Any]:
+        """Move the next queued callsign into the current QSO"""
+        if self.collection is None or self.currentqso_collection is None:
+            raise Exception("Database connection not available")
         
-        # Update or create status document
-        status_update = {
-            "_id": "system_status",
-            "active": active,
-            "last_updated": datetime.utcnow().isoformat(),
-            "updated_by": updated_by
-        }
+        while True:
+            result = self._run_atomic(lambda session: self._try_advance(session, include_queue))
+            if result is not None:
+                return result
+            # Another admin advanced first; retry against the new current QSO
+    
+    def _try_advance(self, session, include_queue: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        One advance attempt, or None if the current QSO changed underneath it.
         
-        self.status_collection.replace_one(
-            {"_id": "system_status"},
-            status_update,
-            upsert=True
-        )
+        The current QSO document is the point of serialisation: it is replaced with a
+        compare-and-swap on the document read, and records the seq of the entry it was
+        promoted from. The entry is only removed from the queue afterwards, so without a
+        transaction a crash in between leaves the station in the queue rather than losing
+        it, and the next advance skips and cleans up any entry at or below that seq.
+        """
+        previous = self.currentqso_collection.find_one({"_id": "current_qso"}, session=session)
+        previous_seq = (previous or {}).get("seq") or 0
+        head = self.collection.find_one({"seq": {"$gt": previous_seq}}, sort=[("seq", 1)], session=session)
         
-        result = {
-            "active": active,
-            "last_updated": status_update["last_updated"],
-            "updated_by": updated_by,
-            "queue_cleared": True,
-            "cleared_count": cleared_count,
-            "qso_cleared": qso_cleared
-        }
+        new_qso = None
+        if head is not None:
+            new_qso = {
+                "_id": "current_qso",
+                "callsign": head["callsign"],
+                "seq": head["seq"],
+                "timestamp": bson_utcnow(),
+                "qrz": head.get("qrz") or default_qrz_info(head["callsign"])
+            }
         
-        return result
+        if previous is None and new_qso is not None:
+            try:
+                self.currentqso_collection.insert_one(new_qso, session=session)
+            except DuplicateKeyError:
+                return None
+        elif previous is not None:
+            expected = {"_id": "current_qso", "callsign": previous.get("callsign"), "timestamp": previous.get("timestamp")}
+            if new_qso is None:
+                swapped = self.currentqso_collection.delete_one(expected, session=session).deleted_count
+            else:
+                swapped = self.currentqso_collection.replace_one(expected, new_qso, session=session).matched_count
+            if not swapped:
+                return None
+        
+        if head is not None:
+            self.collection.delete_many({"seq": {"$lte": head["seq"]}}, session=session)
+        
+        state = {
+            "previous_qso": self._qso_response(previous),
+            "current_qso": self._qso_response(new_qso),
+            "version": self._bump_version(session)
+        }
+        if include_queue:
+            state["queue"] = self._queue_list(session)
+        return state
+    
+    def _run_atomic(self, apply):
+        """Run apply(session) in a transaction when the deployment supports them"""
+        if not self._supports_transactions():
+            return apply(None)
+        with self.client.start_session() as session:
+            return session.with_transaction(apply)
+    
+    def _supports_transactions(self) -> bool:
+        """Transactions need a replica set or sharded cluster (Atlas always is)"""
+        if self._transactions is None:
+            try:
+                hello = self.client.admin.command('hello')
+                self._transactions = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+            except Exception:
+                self._transactions = False
+        return self._transactions
+    
+    @staticmethod
+    def _qso_response(entry: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if not entry:
+            return None
+        return {
+            "callsign": entry.get("callsign"),
+            "timestamp": isoformat_timestamp(entry.get("timestamp")),
+            "qrz": entry.get("qrz", default_qrz_info(entry.get("callsign")))
+        }
     
     def get_current_qso(self) -> Optional[Dict[str, Any]]:
         """Get the current callsign in QSO"""
@@ -260,15 +830,8 @@ class QueueDatabase:
         # Remove MongoDB ObjectId from response
         result = {
             "callsign": entry.get("callsign"),
-            "timestamp": entry.get("timestamp"),
-            "qrz": entry.get("qrz", {
-                'callsign': entry.get("callsign"),
-                'name': None,
-                'address': None,
-                'dxcc_name': None,
-                'image': None,
-                'error': 'QRZ information not available'
-            })
+            "timestamp": isoformat_timestamp(entry.get("timestamp")),
+            "qrz": entry.get("qrz", default_qrz_info(entry.get("callsign")))
         }
         
         return result
@@ -282,15 +845,8 @@ class QueueDatabase:
         qso_entry = {
             "_id": "current_qso",
             "callsign": callsign,
-            "timestamp": datetime.utcnow().isoformat(),
-            "qrz": qrz_info or {
-                'callsign': callsign,
-                'name': None,
-                'address': None,
-                'dxcc_name': None,
-                'image': None,
-                'error': 'QRZ information not available'
-            }
+            "timestamp": bson_utcnow(),
+            "qrz": qrz_info or default_qrz_info(callsign)
         }
         
         # Use replace_one with upsert to ensure only one QSO entry exists
@@ -302,8 +858,9 @@ class QueueDatabase:
         
         return {
             "callsign": callsign,
-            "timestamp": qso_entry["timestamp"],
-            "qrz": qso_entry["qrz"]
+            "timestamp": isoformat_timestamp(qso_entry["timestamp"]),
+            "qrz": qso_entry["qrz"],
+            "version": self._bump_version()
         }
     
     def clear_current_qso(self) -> Optional[Dict[str, Any]]:
@@ -318,15 +875,9 @@ class QueueDatabase:
         
         return {
             "callsign": entry.get("callsign"),
-            "timestamp": entry.get("timestamp"),
-            "qrz": entry.get("qrz", {
-                'callsign': entry.get("callsign"),
-                'name': None,
-                'address': None,
-                'dxcc_name': None,
-                'image': None,
-                'error': 'QRZ information not available'
-            })
+            "timestamp": isoformat_timestamp(entry.get("timestamp")),
+            "qrz": entry.get("qrz", default_qrz_info(entry.get("callsign"))),
+            "version": self._bump_version()
         }
     
     def get_frequency(self) -> Optional[Dict[str, Any]]:
@@ -369,7 +920,8 @@ class QueueDatabase:
         return {
             "frequency": frequency,
             "last_updated": freq_update["last_updated"],
-            "updated_by": updated_by
+            "updated_by": updated_by,
+            "version": self._bump_version()
         }
     
     def clear_frequency(self, updated_by: str = "admin") -> Dict[str, Any]:
@@ -384,18 +936,10 @@ class QueueDatabase:
             "frequency": None,
             "last_updated": datetime.utcnow().isoformat(),
             "updated_by": updated_by,
-            "cleared": result.deleted_count > 0
+            "cleared": result.deleted_count > 0,
+            "version": self._bump_version()
         }
     
-    def is_system_active(self) -> bool:
-        """Check if the system is currently active"""
-        try:
-            status = self.get_system_status()
-            return status.get("active", False)
-        except Exception:
-            # If we can't check status, default to inactive for safety
-            return False
-
     def get_split(self) -> Optional[Dict[str, Any]]:
         """Get the current split value"""
         if self.status_collection is None:
@@ -436,7 +980,8 @@ class QueueDatabase:
         return {
             "split": split,
             "last_updated": split_update["last_updated"],
-            "updated_by": updated_by
+            "updated_by": updated_by,
+            "version": self._bump_version()
         }
 
     def clear_split(self, updated_by: str = "admin") -> Dict[str, Any]:
@@ -450,9 +995,36 @@ class QueueDatabase:
         return {
             "split": None,
             "last_updated": datetime.utcnow().isoformat(),
-            "updated_by": updated_by
+            "updated_by": updated_by,
+            "version": self._bump_version()
         }
 
 
-# Global database instance
-queue_db = QueueDatabase()
\ No newline at end of file
+def create_queue_db() -> QueueStorage:
+    """
+    Create the queue store selected by the environment
+
+    MONGO_URI picks the backend by scheme (sqlite:///path.db for the embedded
+    SQLite store, redis:// for Redis, anything else for MongoDB).
+    QUEUE_ENGINE=memory wraps MongoDB in the in-memory engine with
+    write-behind persistence.
+    """
+    mongo_uri = os.getenv('MONGO_URI', '')
+    # Imported here because the backends build on QueueStorage
+    if mongo_uri.startswith('sqlite:'):
+        from app.sqlite_database import SQLiteQueueDatabase
+        return SQLiteQueueDatabase()
+    if mongo_uri.startswith(('redis://', 'rediss://')):
+        from app.redis_database import RedisQueueDatabase
+        return RedisQueueDatabase()
+
+    engine = os.getenv('QUEUE_ENGINE', 'mongo').lower()
+    if engine == 'memory':
+        from app.engine import InMemoryQueueEngine
+        return InMemoryQueueEngine(QueueDatabase())
+    return QueueDatabase()
+
+
+# Global database instance (its calls are timed for /metrics and, when enabled, the slow-op log and
+# tracing; FAULT_STORAGE injects latency and errors underneath for benchmarks)
+queue_db = instrument_storage(trace_storage(span_storage(inject_storage_faults(create_queue_db()))))
\ No newline at end of file
@@ -0,0 +1,548 @@
+"""In-memory queue engine with write-behind persistence to MongoDB"""
+import atexit
+import logging
+import threading
+import queue as queue_module
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from app.database import (
+    QueueDatabase, QueueStorage, SEQ_COUNTER_ID, STATE_VERSION_ID, T, VersionConflict,
+    default_qrz_info, isoformat_timestamp, max_queue_size, project_entry
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _stored_document(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy an entry in the form QueueDatabase stores it (native datetime, no position)"""
+    document = _copy_entry(entry)
+    document.pop('position', None)
+    document['timestamp'] = datetime.fromisoformat(document['timestamp'])
+    return document
+
+
+def _copy_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy an entry so callers can't mutate engine state"""
+    result = dict(entry)
+    if isinstance(result.get('qrz'), dict):
+        result['qrz'] = dict(result['qrz'])
+    return result
+
+
+class InMemoryQueueEngine(QueueStorage):
+    """
+    Authoritative in-process owner of the queue, current QSO, status, frequency and split.
+
+    Reads are served from native data structures and never touch the network.
+    Every mutation is applied in memory under a single lock and then handed to one
+    background writer thread, which replays the writes against MongoDB in the same
+    order. On startup the state is reloaded from MongoDB, so a restart loses at most
+    the writes still pending in the write-behind queue.
+
+    Implements QueueStorage so routes don't need to know which backend is in use.
+    """
+
+    def __init__(self, store: Optional[QueueDatabase] = None, retry_delay: float = 1.0,
+                 max_retry_delay: float = 30.0, close_timeout: float = 10.0):
+        self.store = store
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.close_timeout = close_timeout
+        self._lock = threading.RLock()
+        # Entries by callsign, plus the queue order as parallel sorted lists of seqs and
+        # callsigns so positions and windows are a bisect rather than a scan
+        self._queue: Dict[str, Dict[str, Any]] = {}
+        self._seqs: List[int] = []
+        self._order: List[str] = []
+        self._current_qso: Optional[Dict[str, Any]] = None
+        self._status: Optional[Dict[str, Any]] = None
+        self._frequency: Optional[Dict[str, Any]] = None
+        self._split: Optional[Dict[str, Any]] = None
+        self._seq = 0
+        self._version = 0
+        # Version reserved by claim_version; lapses once the version moves past it
+        self._claimed: Optional[int] = None
+
+        self._writes: "queue_module.Queue[Optional[Callable[[], None]]]" = queue_module.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
+        # Set when close gives up on the writes still pending
+        self._abandoned = threading.Event()
+
+        self._load()
+        if self._persistent:
+            self._writer = threading.Thread(target=self._write_loop, name='queue-write-behind', daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    @property
+    def _persistent(self) -> bool:
+        return self.store is not None and self.store.collection is not None
+
+    # Recovery and write-behind
+
+    def _load(self):
+        """Reload state from MongoDB (restart recovery)"""
+        if not self._persistent:
+            logger.warning("In-memory queue engine running without MongoDB; state will not survive a restart")
+            return
+
+        store = self.store
+        for entry in store.collection.find({}, {'_id': 0}).sort('seq', 1):
+            entry['timestamp'] = isoformat_timestamp(entry['timestamp'])
+            self._queue[entry['callsign']] = entry
+            self._seq = max(self._seq, entry.get('seq') or 0)
+
+        current = store.currentqso_collection.find_one({'_id': 'current_qso'})
+        if current:
+            current.pop('_id', None)
+            current['timestamp'] = isoformat_timestamp(current.get('timestamp'))
+            self._current_qso = current
+            # Drop an entry an interrupted advance promoted but didn't remove
+            for callsign in [c for c, e in self._queue.items() if e.get('seq', 0) <= (current.get('seq') or 0)]:
+                del self._queue[callsign]
+        self._order = list(self._queue)
+        self._seqs = [self._queue[callsign]['seq'] for callsign in self._order]
+
+        status_ids = ['system_status', 'frequency', 'split', SEQ_COUNTER_ID, STATE_VERSION_ID]
+        for doc in store.status_collection.find({'_id': {'$in': status_ids}}):
+            doc_id = doc.pop('_id')
+            if doc_id == 'system_status':
+                self._status = doc
+            elif doc_id == 'frequency':
+                self._frequency = doc
+            elif doc_id == 'split':
+                self._split = doc
+            elif doc_id == STATE_VERSION_ID:
+                self._version = doc.get('version', 0)
+            else:
+                self._seq = max(self._seq, doc.get('seq', 0))
+
+        logger.info(f"Loaded queue engine state from MongoDB: {len(self._queue)} queued")
+
+    def _persist(self, write: Callable[[], None]):
+        """Schedule a MongoDB write; must be called while holding the lock to keep order"""
+        if self._persistent and not self._closed:
+            self._writes.put(write)
+
+    def _write_loop(self):
+        while True:
+            write = self._writes.get()
+            if write is None:
+                self._writes.task_done()
+                return
+            try:
+                self._apply(write)
+            finally:
+                self._writes.task_done()
+
+    def _apply(self, write: Callable[[], None]):
+        """
+        Apply one write, retrying MongoDB errors until it lands
+
+        Writes are idempotent (upserts and deletes), so retrying one that already
+        committed is safe; a duplicate key means an earlier attempt got through.
+        Retries back off up to max_retry_delay so later writes are never applied
+        out of order. Any other error is a bug in the write itself: it is logged
+        and dropped so the writer thread (and flush) keep going. Once close has
+        given up, remaining writes are dropped without being tried.
+        """
+        delay = self.retry_delay
+        while not self._abandoned.is_set():
+            try:
+                write()
+                return
+            except DuplicateKeyError:
+                return
+            except PyMongoError as e:
+                logger.error(f"Write-behind to MongoDB failed, retrying in {delay:g}s: {e}")
+                if self._abandoned.wait(delay):
+                    return
+                delay = min(delay * 2, self.max_retry_delay)
+            except Exception:
+                logger.exception("Write-behind to MongoDB failed with an unexpected error; write dropped")
+                return
+
+    @property
+    def pending_writes(self) -> int:
+        """Number of mutations not yet persisted"""
+        return self._writes.qsize()
+
+    def flush(self):
+        """Block until every scheduled write has been persisted"""
+        if self._writer is not None:
+            self._writes.join()
+
+    def close(self):
+        """
+        Persist outstanding writes and stop the writer thread
+
+        Waits at most close_timeout seconds, so an unreachable MongoDB can't hang
+        shutdown; writes still pending then are logged and dropped.
+        """
+        if self._writer is None or self._closed:
+            return
+        self._closed = True
+        self._writes.put(None)
+        self._writer.join(self.close_timeout)
+        if self._writer.is_alive():
+            logger.error(f"Write-behind to MongoDB did not finish within {self.close_timeout:g}s; "
+                         f"dropping the pending writes")
+            self._abandoned.set()
+            self._writer.join(self.close_timeout)
+
+    # Queue order index
+
+    def _rank(self, callsign: str) -> int:
+        """Zero-based position of a queued callsign"""
+        return bisect_left(self._seqs, self._queue[callsign]['seq'])
+
+    def _pop(self, callsign: str) -> Dict[str, Any]:
+        """Remove a queued callsign from the entries and the order index"""
+        rank = self._rank(callsign)
+        del self._seqs[rank]
+        del self._order[rank]
+        return self._queue.pop(callsign)
+
+    # State version
+
+    def _bump_version(self) -> int:
+        """Increment the state version; must be called while holding the lock"""
+        self._version += 1
+        version = self._version
+        self._persist(lambda: self.store.status_collection.update_one(
+            {'_id': STATE_VERSION_ID}, {'$max': {'version': version}}, upsert=True
+        ))
+        return version
+
+    def get_state_version(self) -> int:
+        """Get the current state version (0 before the first write)"""
+        return self._version
+
+    def claim_version(self, expected: int) -> int:
+        """Reserve the state version if it still equals expected and isn't claimed yet"""
+        with self._lock:
+            if self._version != expected or self._claimed == expected:
+                raise VersionConflict(expected, self._version)
+            self._claimed = expected
+            return expected
+
+    def release_version(self, expected: int):
+        """Drop an unused claim on expected"""
+        with self._lock:
+            if self._claimed == expected:
+                self._claimed = None
+
+    def write_if_version(self, expected: int, write: Callable[[], T]) -> T:
+        """Run write only if the state version still equals expected, holding other writers off meanwhile"""
+        with self._lock:
+            if self._version != expected or self._claimed == expected:
+                raise VersionConflict(expected, self._version)
+            return write()
+
+    # Queue operations
+
+    def register_callsign(self, callsign: str, qrz_info: Dict[str, Any] = None,
+                          include_queue: bool = False) -> Dict[str, Any]:
+        """Register a callsign in the queue with optional QRZ information"""
+        with self._lock:
+            if not self.is_system_active():
+                raise ValueError("System is currently inactive. Registration is not available.")
+
+            if callsign in self._queue:
+                raise ValueError("Callsign already in queue")
+
+            limit = max_queue_size()
+            if len(self._queue) >= limit:
+                raise ValueError(f"Queue is full. Maximum queue size is {limit}")
+
+            self._seq += 1
+            entry = {
+                'callsign': callsign,
+                'seq': self._seq,
+                'timestamp': datetime.utcnow().isoformat(),
+                'position': len(self._queue) + 1,
+                'qrz': qrz_info or default_qrz_info(callsign)
+            }
+            self._queue[callsign] = entry
+            self._seqs.append(self._seq)
+            self._order.append(callsign)
+
+            document = _stored_document(entry)
+            seq = self._seq
+
+            def write():
+                # Keep the shared counter ahead so QueueDatabase continues the sequence after a switch back
+                self.store.status_collection.update_one({'_id': SEQ_COUNTER_ID}, {'$max': {'seq': seq}}, upsert=True)
+                # An upsert rather than insert_one, so a retry of a write that committed is a no-op
+                self.store.collection.replace_one({'callsign': document['callsign']}, document, upsert=True)
+            self._persist(write)
+
+            result = _copy_entry(entry)
+            if include_queue:
+                result['queue'] = self.get_queue_list()
+            result['version'] = self._bump_version()
+            return result
+
+    def find_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Find a callsign in the queue and return with updated position"""
+        with self._lock:
+            entry = self._queue.get(callsign)
+            if entry is None:
+                return None
+            result = _copy_entry(entry)
+            result['position'] = self._rank(callsign) + 1
+            return result
+
+    def get_queue_list(self, limit: Optional[int] = None, after: Optional[int] = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get the queue list with updated positions, optionally paged and projected"""
+        with self._lock:
+            start = bisect_right(self._seqs, after) if after is not None else 0
+            end = len(self._order) if limit is None else start + limit
+            queue_list = []
+            for i, callsign in enumerate(self._order[start:end]):
+                # Project before copying so unrequested qrz data is never duplicated
+                result = _copy_entry(project_entry(self._queue[callsign], fields))
+                result['position'] = start + i + 1
+                queue_list.append(result)
+            return queue_list
+
+    def get_neighborhood(self, callsign: str, radius: int) -> List[Dict[str, Any]]:
+        """Get a callsign's entry with up to radius entries either side of it"""
+        with self._lock:
+            if callsign not in self._queue:
+                return []
+            rank = self._rank(callsign)
+            start = max(0, rank - radius)
+            window = []
+            for i, neighbor in enumerate(self._order[start:rank + radius + 1]):
+                result = _copy_entry(self._queue[neighbor])
+                result['position'] = start + i + 1
+                window.append(result)
+            return window
+
+    def remove_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Remove a callsign from the queue"""
+        with self._lock:
+            if callsign not in self._queue:
+                return None
+            entry = self._pop(callsign)
+            self._persist(lambda: self.store.collection.delete_one({'callsign': callsign}))
+            result = _copy_entry(entry)
+            result['version'] = self._bump_version()
+            return result
+
+    def clear_queue(self) -> Dict[str, Any]:
+        """Clear the entire queue; returns cleared_count and the state version the clear wrote"""
+        with self._lock:
+            return {'cleared_count': self._clear_queue(), 'version': self._bump_version()}
+
+    def _clear_queue(self) -> int:
+        """Clear the queue without bumping the version; must be called while holding the lock"""
+        count = len(self._queue)
+        self._queue.clear()
+        self._seqs.clear()
+        self._order.clear()
+        self._persist(lambda: self.store.collection.delete_many({}))
+        return count
+
+    def get_next_callsign(self, include_queue: bool = False) -> Optional[Dict[str, Any]]:
+        """Get and remove the next callsign in queue (FIFO)"""
+        with self._lock:
+            if not self._queue:
+                return None
+            callsign = self._order[0]
+            entry = self._pop(callsign)
+            self._persist(lambda: self.store.collection.delete_one({'callsign': callsign}))
+
+            result = _copy_entry(entry)
+            if include_queue:
+                result['queue'] = self.get_queue_list()
+            result['version'] = self._bump_version()
+            return result
+
+    def get_queue_count(self) -> int:
+        """Get the total count of entries in queue"""
+        return len(self._queue)
+
+    # System status
+
+    def get_system_status(self) -> Dict[str, Any]:
+        """Get the current system status (active/inactive)"""
+        with self._lock:
+            if self._status is None:
+                self._status = {
+                    'active': False,
+                    'last_updated': datetime.utcnow().isoformat(),
+                    'updated_by': 'system'
+                }
+                document = {'_id': 'system_status', **self._status}
+                self._persist(lambda: self.store.status_collection.replace_one(
+                    {'_id': 'system_status'}, document, upsert=True
+                ))
+            return {
+                'active': self._status.get('active', False),
+                'last_updated': self._status.get('last_updated'),
+                'updated_by': self._status.get('updated_by')
+            }
+
+    def reset(self, active: bool, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the system status (active/inactive) and clear queue when changing status"""
+        with self._lock:
+            # One write, one version bump, as in the other backends
+            cleared_count = self._clear_queue()
+            qso_cleared = self._clear_current_qso() is not None
+
+            self._status = {
+                'active': active,
+                'last_updated': datetime.utcnow().isoformat(),
+                'updated_by': updated_by
+            }
+            document = {'_id': 'system_status', **self._status}
+            self._persist(lambda: self.store.status_collection.replace_one(
+                {'_id': 'system_status'}, document, upsert=True
+            ))
+
+            return {
+                'active': active,
+                'last_updated': self._status['last_updated'],
+                'updated_by': updated_by,
+                'queue_cleared': True,
+                'cleared_count': cleared_count,
+                'qso_cleared': qso_cleared,
+                'version': self._bump_version()
+            }
+
+    def advance(self, include_queue: bool = True) -> Dict[str, Any]:
+        """Move the next queued callsign into the current QSO"""
+        with self._lock:
+            previous, self._current_qso = self._current_qso, None
+            entry = None
+            if self._queue:
+                entry = self._pop(self._order[0])
+                self._current_qso = {
+                    'callsign': entry['callsign'],
+                    'seq': entry['seq'],
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'qrz': entry.get('qrz') or default_qrz_info(entry['callsign'])
+                }
+
+            if entry is None:
+                self._persist(lambda: self.store.currentqso_collection.delete_one({'_id': 'current_qso'}))
+            else:
+                document = {'_id': 'current_qso', **_stored_document(self._current_qso)}
+
+                def write():
+                    # Same order as QueueDatabase.advance: promote first, then drop the entry
+                    self.store.currentqso_collection.replace_one({'_id': 'current_qso'}, document, upsert=True)
+                    self.store.collection.delete_many({'seq': {'$lte': document['seq']}})
+                self._persist(write)
+
+            state = {
+                'previous_qso': self._qso_response(previous),
+                'current_qso': self._qso_response(self._current_qso),
+                'version': self._bump_version()
+            }
+            if include_queue:
+                state['queue'] = self.get_queue_list()
+            return state
+
+    @staticmethod
+    def _qso_response(qso: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if qso is None:
+            return None
+        return {'callsign': qso['callsign'], 'timestamp': qso['timestamp'], 'qrz': dict(qso['qrz'])}
+
+    # Current QSO
+
+    def get_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Get the current callsign in QSO"""
+        with self._lock:
+            return self._qso_response(self._current_qso)
+
+    def set_current_qso(self, callsign: str, qrz_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Set the current callsign in QSO with QRZ information"""
+        with self._lock:
+            self._current_qso = {
+                'callsign': callsign,
+                'timestamp': datetime.utcnow().isoformat(),
+                'qrz': qrz_info or default_qrz_info(callsign)
+            }
+            document = {'_id': 'current_qso', **_stored_document(self._current_qso)}
+            self._persist(lambda: self.store.currentqso_collection.replace_one(
+                {'_id': 'current_qso'}, document, upsert=True
+            ))
+            return {**self._qso_response(self._current_qso), 'version': self._bump_version()}
+
+    def clear_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Clear the current QSO"""
+        with self._lock:
+            cleared = self._clear_current_qso()
+            if cleared is None:
+                return None
+            return {**self._qso_response(cleared), 'version': self._bump_version()}
+
+    def _clear_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Clear the current QSO without bumping the version; must be called while holding the lock"""
+        cleared, self._current_qso = self._current_qso, None
+        if cleared is not None:
+            self._persist(lambda: self.store.currentqso_collection.delete_one({'_id': 'current_qso'}))
+        return cleared
+
+    # Frequency and split
+
+    def get_frequency(self) -> Optional[Dict[str, Any]]:
+        """Get the current transmission frequency"""
+        with self._lock:
+            return dict(self._frequency) if self._frequency else None
+
+    def set_frequency(self, frequency: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current transmission frequency"""
+        return self._set_setting('frequency', frequency, updated_by)
+
+    def clear_frequency(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current transmission frequency"""
+        with self._lock:
+            cleared = self._frequency is not None
+            result = self._clear_setting('frequency', updated_by)
+            result['cleared'] = cleared
+            return result
+
+    def get_split(self) -> Optional[Dict[str, Any]]:
+        """Get the current split value"""
+        with self._lock:
+            return dict(self._split) if self._split else None
+
+    def set_split(self, split: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current split value"""
+        return self._set_setting('split', split, updated_by)
+
+    def clear_split(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current split value"""
+        return self._clear_setting('split', updated_by)
+
+    def _set_setting(self, name: str, value: str, updated_by: str) -> Dict[str, Any]:
+        with self._lock:
+            setting = {
+                name: value,
+                'last_updated': datetime.utcnow().isoformat(),
+                'updated_by': updated_by
+            }
+            setattr(self, f'_{name}', setting)
+            document = {'_id': name, **setting}
+            self._persist(lambda: self.store.status_collection.replace_one({'_id': name}, document, upsert=True))
+            return {**setting, 'version': self._bump_version()}
+
+    def _clear_setting(self, name: str, updated_by: str) -> Dict[str, Any]:
+        with self._lock:
+            setattr(self, f'_{name}', None)
+            self._persist(lambda: self.store.status_collection.delete_one({'_id': name}))
+            return {
+                name: None,
+                'last_updated': datetime.utcnow().isoformat(),
+                'updated_by': updated_by,
+                'version': self._bump_version()
+            }
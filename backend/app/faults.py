@@ -0,0 +1,167 @@
+"""
+Fault and latency injection for the queue store and QRZ lookups
+
+For tests and benchmarks: measuring tail latency honestly needs a slow,
+flaky dependency, and the fallbacks (the status page's try/except blocks,
+QRZ lookups falling back to the local DXCC table) only run when something
+fails. A FaultProfile describes the dependency's behaviour:
+
+    latency_ms=5,jitter_ms=20,tail_rate=0.01,tail_ms=500,error_rate=0.02,timeout_rate=0.005,timeout_ms=5000
+
+- every call is delayed by latency_ms plus a uniform 0..jitter_ms
+- tail_rate of calls take tail_ms longer (the slow tail behind p99)
+- error_rate of calls raise InjectedFault
+- timeout_rate of calls hang for timeout_ms and then raise InjectedTimeout
+- methods=find_callsign|get_queue_list limits injection to those storage methods
+  (authenticate or search for QRZ)
+- seed makes the draws repeatable
+
+Set FAULT_STORAGE and/or FAULT_QRZ to such a spec to inject into the global
+store and QRZ service, e.g. in a backend started by benchmarks.pileup_load
+(--env FAULT_QRZ=...). Never set them in production.
+"""
+import os
+import time
+import random
+import functools
+import logging
+import threading
+from collections import Counter
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InjectedFault(Exception):
+    """Raised by a call chosen to fail"""
+
+
+class InjectedTimeout(InjectedFault, TimeoutError):
+    """Raised by a call chosen to hang, once its timeout has passed"""
+
+
+class FaultProfile:
+    """Latency distribution, timeouts and errors to inject into a dependency"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        tail_rate: float = 0.0,
+        tail: float = 0.0,
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout: float = 5.0,
+        methods: Optional[set] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail = tail
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout = timeout
+        self.methods = set(methods) if methods else None
+        self.random = random.Random(seed)
+        self.injected: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str) -> 'FaultProfile':
+        """Build a profile from "key=value,key=value" (durations in milliseconds)"""
+        durations = {'latency_ms': 'latency', 'jitter_ms': 'jitter', 'tail_ms': 'tail', 'timeout_ms': 'timeout'}
+        rates = ('tail_rate', 'error_rate', 'timeout_rate')
+        options = {}
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            key, _, value = item.partition('=')
+            key = key.strip()
+            if key in durations:
+                options[durations[key]] = float(value) / 1000
+            elif key in rates:
+                options[key] = float(value)
+            elif key == 'methods':
+                options['methods'] = set(value.split('|'))
+            elif key == 'seed':
+                options['seed'] = int(value)
+            else:
+                raise ValueError(f"Unknown fault option {key!r}")
+        return cls(**options)
+
+    def applies_to(self, method: str) -> bool:
+        return self.methods is None or method in self.methods
+
+    def inject(self, method: str):
+        """Delay the calling thread and possibly raise, as drawn for one call"""
+        with self._lock:
+            draw = self.random.random()
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.tail_rate and self.random.random() < self.tail_rate:
+                delay += self.tail
+                self.injected['tail'] += 1
+            self.injected['calls'] += 1
+            if draw < self.timeout_rate:
+                self.injected['timeouts'] += 1
+                outcome = 'timeout'
+            elif draw < self.timeout_rate + self.error_rate:
+                self.injected['errors'] += 1
+                outcome = 'error'
+            else:
+                outcome = None
+
+        if outcome == 'timeout':
+            time.sleep(self.timeout)
+            raise InjectedTimeout(f"{method} timed out after {self.timeout:g}s (injected)")
+        if delay > 0:
+            time.sleep(delay)
+        if outcome == 'error':
+            raise InjectedFault(f"{method} failed (injected)")
+
+
+def fault_profile(variable: str) -> Optional[FaultProfile]:
+    """The profile configured in an environment variable, or None"""
+    spec = os.getenv(variable)
+    if not spec:
+        return None
+    logger.warning(f"Injecting faults from {variable}={spec}")
+    return FaultProfile.parse(spec)
+
+
+def _injected(method: Callable, name: str, profile: FaultProfile) -> Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        profile.inject(name)
+        return method(*args, **kwargs)
+    return wrapper
+
+
+def inject_storage_faults(store, profile: Optional[FaultProfile] = None):
+    """
+    Inject faults into every public QueueStorage method call on a store
+
+    Returns a proxy (see app.database.StorageProxy), so the store's calls to
+    itself are not faulted. Without a profile, FAULT_STORAGE is used; a no-op
+    when neither is given.
+    """
+    profile = profile or fault_profile('FAULT_STORAGE')
+    if profile is None:
+        return store
+    from app.database import wrap_storage
+
+    return wrap_storage(store, lambda name, method: _injected(method, name, profile) if profile.applies_to(name) else method)
+
+
+def inject_qrz_faults(service, profile: Optional[FaultProfile] = None):
+    """
+    Inject faults into a QRZService's round trips to QRZ.com (login and search)
+
+    lookup_callsign itself is left alone, so its fallback handling runs as it
+    would against a failing QRZ.com. Without a profile, FAULT_QRZ is used.
+    """
+    profile = profile or fault_profile('FAULT_QRZ')
+    if profile is None:
+        return service
+    for name in ('authenticate', 'search'):
+        if profile.applies_to(name):
+            setattr(service, f'_{name}', _injected(getattr(service, f'_{name}'), f'qrz.{name}', profile))
+    return service
@@ -0,0 +1,166 @@
+"""
+Structured, low-overhead logging
+
+With thousands of SSE listeners, a log line per connection and per broadcast
+costs real CPU. Hot paths therefore:
+- log at DEBUG with %-style arguments, which are only formatted when the record is emitted
+- add to the activity summary, which logs one aggregated line per LOG_SUMMARY_INTERVAL
+  ("240 broadcasts, 96000 deliveries, +35/-12 connections, 1523 open in the last 60s")
+- send repetitive warnings through a LogSampler, which lets a few per interval through
+  and reports how many it dropped
+
+LOG_FORMAT=json writes one JSON object per line, with the fields passed as
+extra={'fields': {...}} as top-level keys. LOG_LEVEL sets the app's log level.
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The usual text format, with any structured fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+def configure_logging():
+    """
+    Install the app's log handler on the root logger (once)
+
+    Left alone if logging is already configured elsewhere, unless LOG_FORMAT
+    asks for a specific format.
+    """
+    root = logging.getLogger()
+    log_format = os.getenv('LOG_FORMAT')
+    if any(getattr(handler, '_pileup_buster', False) for handler in root.handlers):
+        return
+    if root.handlers and log_format is None:
+        return
+
+    handler = logging.StreamHandler()
+    handler._pileup_buster = True
+    handler.setFormatter(JsonFormatter() if (log_format or '').lower() == 'json' else TextFormatter())
+    root.addHandler(handler)
+    logging.getLogger('app').setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+
+class LogSampler:
+    """
+    Lets at most limit records per key through each interval and counts the rest
+
+    The first record of a new interval reports how many were dropped in the last one.
+    """
+
+    def __init__(self, target: logging.Logger, limit: int = 5, interval: float = 60.0):
+        self.target = target
+        self.limit = limit
+        self.interval = interval
+        self._windows: Dict[str, Tuple[float, int]] = {}  # key -> (window start, records seen)
+
+    def log(self, level: int, key: str, msg: str, *args, **kwargs) -> bool:
+        """Log msg % args unless key is over its limit; returns whether it was logged"""
+        if not self.target.isEnabledFor(level):
+            return False
+        now = time.monotonic()
+        started, seen = self._windows.get(key, (now, 0))
+        if now - started >= self.interval:
+            dropped = seen - self.limit
+            if dropped > 0:
+                self.target.log(level, "Dropped %d similar log records (%s) in the last %.0fs",
+                                dropped, key, now - started)
+            started, seen = now, 0
+        self._windows[key] = (started, seen + 1)
+        if seen >= self.limit:
+            return False
+        self.target.log(level, msg, *args, **kwargs)
+        return True
+
+    def warning(self, key: str, msg: str, *args, **kwargs) -> bool:
+        return self.log(logging.WARNING, key, msg, *args, **kwargs)
+
+
+class ActivitySummary:
+    """Counts hot-path events and logs them as one line per interval"""
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or float(os.getenv('LOG_SUMMARY_INTERVAL', '60'))
+        self._counts: Counter = Counter()
+        self._gauges: Dict[str, Any] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def count(self, name: str, amount: int = 1):
+        """Add to a counter for the current interval"""
+        self._counts[name] += amount
+
+    def gauge(self, name: str, value: Any):
+        """Record the latest value of something (e.g. open connections)"""
+        self._gauges[name] = value
+
+    def flush(self) -> Dict[str, Any]:
+        """Log the counts since the last flush and start over; returns what was logged"""
+        counts, self._counts = self._counts, Counter()
+        fields = {**self._gauges, **counts}
+        if counts:
+            logger.info(
+                "%d broadcasts, %d deliveries, +%d/-%d connections, %s open in the last %.0fs",
+                counts['broadcasts'], counts['deliveries'], counts['connections_added'],
+                counts['connections_removed'], self._gauges.get('connections', 0), self.interval,
+                extra={'fields': fields}
+            )
+        return fields
+
+    async def start(self):
+        """Log a summary every interval on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+
+# Global activity summary
+activity = ActivitySummary()
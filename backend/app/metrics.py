@@ -0,0 +1,227 @@
+"""
+Prometheus metrics for routes, storage, SSE, QRZ and overload protection, served at /metrics
+
+Every metric's label values are known up front (route templates, storage
+method names, event types), so children are bound once and cached; the hot
+path only reads a clock and calls observe() or inc().
+
+prometheus_client is optional. Without it every metric is a no-op and
+/metrics answers 503.
+"""
+import os
+import time
+import functools
+import logging
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+except ImportError:  # prometheus_client is optional; only needed for /metrics
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Most calls are sub-millisecond (in-memory engine) to tens of milliseconds (remote stores)
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Event delivery waits behind the fan-out and the client's socket
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# QRZ lookups cross the internet
+SLOW_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NullMetric:
+    """Stands in for every metric when prometheus_client isn't installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def metrics_available() -> bool:
+    """Whether metrics are collected (prometheus_client installed and METRICS_ENABLED isn't false)"""
+    return prometheus_client is not None and os.getenv('METRICS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+
+if metrics_available():
+    # A registry of our own, so the process-wide default collectors don't depend on import order
+    registry = CollectorRegistry()
+    REQUEST_LATENCY = Histogram(
+        'pileup_http_request_duration_seconds', 'Request latency by route',
+        ['method', 'route'], buckets=FAST_BUCKETS, registry=registry
+    )
+    REQUESTS = Counter(
+        'pileup_http_requests_total', 'Requests by route and status code',
+        ['method', 'route', 'status'], registry=registry
+    )
+    DB_LATENCY = Histogram(
+        'pileup_db_operation_duration_seconds', 'Storage call latency by backend and method',
+        ['backend', 'method'], buckets=FAST_BUCKETS, registry=registry
+    )
+    DB_ERRORS = Counter(
+        'pileup_db_operation_errors_total', 'Storage calls that raised, by backend and method',
+        ['backend', 'method'], registry=registry
+    )
+    SSE_CONNECTIONS = Gauge(
+        'pileup_sse_connections', 'Open SSE connections on this node', registry=registry
+    )
+    SSE_QUEUE_DEPTH_MAX = Gauge(
+        'pileup_sse_queue_depth_max', 'Deepest per-connection event queue at the last broadcast', registry=registry
+    )
+    SSE_QUEUE_DEPTH_TOTAL = Gauge(
+        'pileup_sse_queue_depth_total', 'Events waiting across all connections at the last broadcast', registry=registry
+    )
+    SSE_FANOUT = Histogram(
+        'pileup_sse_fanout_duration_seconds', 'Time to hand an event to every connection on this node',
+        ['event'], buckets=FAST_BUCKETS, registry=registry
+    )
+    SSE_DELIVERY_LAG = Histogram(
+        'pileup_sse_delivery_lag_seconds', 'Time from an event being created to its frame being written to a client',
+        ['event'], buckets=LAG_BUCKETS, registry=registry
+    )
+    QRZ_LATENCY = Histogram(
+        'pileup_qrz_lookup_duration_seconds', 'QRZ.com lookup latency by outcome',
+        ['result'], buckets=SLOW_BUCKETS, registry=registry
+    )
+    QRZ_SESSIONS = Counter(
+        'pileup_qrz_sessions_total', 'QRZ lookups by whether they reused the session key or had to log in',
+        ['result'], registry=registry
+    )
+    IMAGE_CACHE = Counter(
+        'pileup_image_cache_requests_total', 'Profile image thumbnail cache hits and misses',
+        ['result'], registry=registry
+    )
+    BULKHEAD_IN_FLIGHT = Gauge(
+        'pileup_bulkhead_in_flight', 'Requests holding a slot in each concurrency pool', ['pool'], registry=registry
+    )
+    BULKHEAD_WAITING = Gauge(
+        'pileup_bulkhead_waiting', 'Requests queued for a slot in each concurrency pool', ['pool'], registry=registry
+    )
+    BULKHEAD_REJECTIONS = Counter(
+        'pileup_bulkhead_rejections_total', 'Requests turned away because a pool\'s wait queue was full',
+        ['pool'], registry=registry
+    )
+    ADMISSION_REJECTIONS = Counter(
+        'pileup_admission_rejections_total', 'Requests refused by admission control, by limiter and limit',
+        ['limiter', 'reason'], registry=registry
+    )
+else:
+    registry = None
+    REQUEST_LATENCY = REQUESTS = DB_LATENCY = DB_ERRORS = _NullMetric()
+    SSE_CONNECTIONS = SSE_QUEUE_DEPTH_MAX = SSE_QUEUE_DEPTH_TOTAL = SSE_FANOUT = SSE_DELIVERY_LAG = _NullMetric()
+    QRZ_LATENCY = QRZ_SESSIONS = IMAGE_CACHE = _NullMetric()
+    BULKHEAD_IN_FLIGHT = BULKHEAD_WAITING = BULKHEAD_REJECTIONS = ADMISSION_REJECTIONS = _NullMetric()
+
+
+_children: Dict[Tuple[int, Tuple[str, ...]], Any] = {}
+
+
+def bound(metric, *labels):
+    """A metric's child for fixed label values, created once and reused"""
+    key = (id(metric), labels)
+    child = _children.get(key)
+    if child is None:
+        child = _children[key] = metric.labels(*labels)
+    return child
+
+
+def record_qrz_session(reused: bool):
+    """Count a QRZ lookup that reused the session key or had to log in first"""
+    bound(QRZ_SESSIONS, 'reused' if reused else 'login').inc()
+
+
+def record_image_cache(hit: bool):
+    """Count a thumbnail cache hit or miss"""
+    bound(IMAGE_CACHE, 'hit' if hit else 'miss').inc()
+
+
+def instrument_storage(store):
+    """
+    Time every public QueueStorage method on a store and count the ones that raise
+
+    Returns a proxy (see app.database.StorageProxy), so the store's calls to
+    itself are not counted twice. A no-op without prometheus_client.
+    """
+    if not metrics_available():
+        return store
+    from app.database import storage_backend, wrap_storage
+
+    backend = storage_backend(store)
+    return wrap_storage(store, lambda name, method: _timed(method, bound(DB_LATENCY, backend, name), bound(DB_ERRORS, backend, name)))
+
+
+def _timed(method: Callable, latency, errors) -> Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def route_template(scope) -> str:
+    """
+    The matched route's template (/api/queue/status/{callsign}), so label values stay bounded
+
+    Depending on the FastAPI version, the route the router records in the scope
+    has either the full template or one relative to its router's prefix; the
+    prefix is then taken from the request path.
+    """
+    route = scope.get('route')
+    template = getattr(route, 'path', None)
+    if not template:
+        return 'unmatched'
+    path = scope['path']
+    regex = getattr(route, 'path_regex', None)
+    if path.startswith(template + '/') or (regex is not None and regex.match(path)):
+        return template
+    return '/'.join(path.split('/')[:-template.count('/')]) + template
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each request against its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            template = route_template(scope)
+            method = scope['method']
+            bound(REQUEST_LATENCY, method, template).observe(time.perf_counter() - start)
+            bound(REQUESTS, method, template, str(status[0])).inc()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """The exposition text and its content type"""
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -0,0 +1,195 @@
+"""
+On-demand CPU and memory profiling of the live process
+
+CPU: a stack sampler that reads every thread's stack at a fixed interval and
+returns collapsed stacks ("frame;frame;frame count" lines, the input of
+flamegraph.pl and speedscope), or cProfile run on the event loop thread,
+returned as a pstats dump (load it with pstats.Stats or snakeviz).
+
+Memory: tracemalloc snapshots, compared against a baseline to find what keeps
+growing, e.g. in long-running SSE sessions.
+
+Nothing runs until an admin asks, and the endpoints answer 404 unless
+PROFILING_ENABLED=true.
+"""
+import os
+import sys
+import asyncio
+import cProfile
+import logging
+import marshal
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 60
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is already running"""
+
+
+def profiling_enabled() -> bool:
+    """Whether the profiling endpoints are available (PROFILING_ENABLED=true)"""
+    return os.getenv('PROFILING_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+
+
+def _frame_label(code) -> str:
+    # Keyed by the function's first line so samples anywhere in it aggregate
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Samples the stacks of every thread from a background thread"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f'thread-{thread_id}'))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Collapsed stacks, one "root;...;leaf count" line per distinct stack"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Runs one CPU profile at a time and keeps the tracemalloc baseline"""
+
+    def __init__(self):
+        self._running = False
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+
+    async def sample(self, seconds: float, interval: float = 0.005) -> str:
+        """Sample every thread's stack for seconds and return collapsed stacks"""
+        sampler = StackSampler(interval)
+        with self._exclusive():
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+        logger.info(f"Sampled {sampler.samples} times over {seconds}s ({len(sampler.stacks)} distinct stacks)")
+        return sampler.collapsed()
+
+    async def cprofile(self, seconds: float) -> bytes:
+        """
+        Run cProfile on the event loop thread for seconds and return a pstats dump
+
+        Covers every coroutine and async handler; sync handlers running in the
+        threadpool only show up in sample().
+        """
+        profile = cProfile.Profile()
+        with self._exclusive():
+            profile.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profile.disable()
+        profile.create_stats()
+        # The same format as Profile.dump_stats(), which only writes to a file
+        return marshal.dumps(profile.stats)
+
+    @contextmanager
+    def _exclusive(self):
+        if self._running:
+            raise ProfilerBusy('A profile is already running')
+        self._running = True
+        try:
+            yield
+        finally:
+            self._running = False
+
+    def take_snapshot(self) -> Dict[str, Any]:
+        """
+        Start tracemalloc if needed and make a snapshot the new baseline
+
+        Tracing slows allocation-heavy code down, so stop it with stop_tracing()
+        once done.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(int(os.getenv('TRACEMALLOC_FRAMES', '10')))
+            logger.info("Started tracemalloc")
+        self._baseline = self._snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        return {'tracing': True, 'traced_bytes': current, 'peak_bytes': peak}
+
+    def diff(self, limit: int = 20) -> Dict[str, Any]:
+        """Where traced memory grew since the baseline, biggest growth first"""
+        if self._baseline is None or not tracemalloc.is_tracing():
+            raise ValueError('Take a snapshot first')
+        stats = self._snapshot().compare_to(self._baseline, 'traceback')
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            'traced_bytes': current,
+            'peak_bytes': peak,
+            'growth': [self._format(stat) for stat in stats[:limit]]
+        }
+
+    def stop_tracing(self) -> Dict[str, Any]:
+        """Stop tracemalloc and drop the baseline"""
+        self._baseline = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("Stopped tracemalloc")
+        return {'tracing': False}
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        # Leave out tracemalloc's own allocations
+        return tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ])
+
+    @staticmethod
+    def _format(stat) -> Dict[str, Any]:
+        traceback: List[str] = [f'{frame.filename}:{frame.lineno}' for frame in stat.traceback]
+        return {
+            'size_diff': stat.size_diff,
+            'size': stat.size,
+            'count_diff': stat.count_diff,
+            'count': stat.count,
+            'traceback': traceback
+        }
+
+
+def profile_seconds(seconds: float) -> float:
+    """Clamp a requested profile length to (0, PROFILING_MAX_SECONDS]"""
+    limit = float(os.getenv('PROFILING_MAX_SECONDS', str(MAX_PROFILE_SECONDS)))
+    return min(max(seconds, 0.1), limit)
+
+
+# Global profiler instance
+profiler = Profiler()
@@ -0,0 +1,69 @@
+"""
+Large-queue mode: windowed queue views for very long queues.
+
+With MAX_QUEUE_SIZE in the thousands, sending the whole queue on every event
+costs O(queue length) per client per change. In large-queue mode, public
+listings and queue_update events carry only the top of the queue plus the
+total count, and a client asks for its own neighborhood by callsign. Each view
+then costs the same whatever the queue length.
+"""
+from typing import Any, Dict, List, Optional
+from app.database import QueueStorage, max_queue_size, queue_settings
+
+# MAX_QUEUE_SIZE above which large-queue mode switches on by itself
+LARGE_QUEUE_THRESHOLD = 100
+DEFAULT_WINDOW_SIZE = 20
+
+
+def queue_window_size() -> int:
+    """
+    Number of entries at the top of the queue shown in large-queue mode (0 = off)
+
+    QUEUE_WINDOW_SIZE sets it explicitly; otherwise it's on for queues larger
+    than LARGE_QUEUE_THRESHOLD.
+    """
+    if queue_settings.window_size is not None:
+        return queue_settings.window_size
+    return DEFAULT_WINDOW_SIZE if max_queue_size() > LARGE_QUEUE_THRESHOLD else 0
+
+
+def neighborhood_radius() -> int:
+    """Entries shown either side of a station's own position"""
+    return queue_settings.neighborhood_radius
+
+
+def large_queue_mode() -> bool:
+    """Whether listings and events are windowed"""
+    return queue_window_size() > 0
+
+
+def queue_update_payload(store: QueueStorage, queue_list: Optional[List[Dict[str, Any]]] = None,
+                         version: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Build the queue_update event for an active system
+
+    queue_list is the post-mutation snapshot if the store returned one. In large-queue
+    mode the payload holds the top window and the total instead of the whole queue.
+    """
+    window = queue_window_size()
+    if queue_list is not None:
+        total = len(queue_list)
+        if window:
+            queue_list = queue_list[:window]
+    elif window:
+        queue_list = store.get_queue_list(limit=window)
+        total = store.get_queue_count()
+    else:
+        queue_list = store.get_queue_list()
+        total = len(queue_list)
+
+    payload = {
+        'queue': queue_list,
+        'total': total,
+        'max_size': max_queue_size(),
+        'system_active': True,
+        'version': version
+    }
+    if window:
+        payload['windowed'] = True
+    return payload
@@ -0,0 +1,206 @@
+"""
+Traffic recorder: every mutating API call and SSE connect/disconnect, to a file
+
+Set TRAFFIC_RECORD_FILE to record an activation. Each line of the file is one
+compact JSON record (gzip-compressed when the name ends in .gz); after a
+header line, records look like
+
+    {"t":12.031,"m":"POST","p":"/api/queue/register","r":"/api/queue/register","c":"9f2c4a01","b":"{\"callsign\":\"W1AW\"}","s":200,"d":0.014}
+    {"t":12.250,"e":"open","id":7,"c":"51be0d3e"}
+    {"t":95.118,"e":"close","id":7}
+
+t is seconds since recording started, m/p/q the method, path and query
+string, r the route template, c a key for the client address (an HMAC under a
+random secret that lives only as long as the recorder and is never written, so
+a client keeps its key within a recording but addresses can't be recovered by
+hashing candidates), b the request body,
+a whether admin credentials were sent (never the credentials themselves), s
+the status and d the duration. Lines are written in completion order.
+
+benchmarks.replay drives a local instance with a recording at 1x, 10x or 100x
+speed, so a real traffic shape becomes a repeatable benchmark.
+"""
+import os
+import gzip
+import json
+import time
+import hmac
+import hashlib
+import logging
+import threading
+import queue as queue_module
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from fastapi import Request
+from app.admission import client_ip
+from app.metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+FORMAT = 'pileup-traffic'
+FORMAT_VERSION = 1
+MUTATING_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+# Replaying these would start profiles or memory tracing on the target
+NOT_RECORDED = ('/api/admin/profile', '/api/admin/memory')
+MAX_BODY = 4096
+SSE_PATH = '/api/events/stream'
+
+
+def open_traffic_file(path: str, mode: str):
+    """Open a recording for text reading or writing, gzip-compressed when the name ends in .gz"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_traffic(path: str) -> Iterator[Dict[str, Any]]:
+    """The records of a recording, header excluded, in the order they were written"""
+    with open_traffic_file(path, 'r') as source:
+        header = json.loads(source.readline() or '{}')
+        if header.get('format') != FORMAT:
+            raise ValueError(f'{path} is not a traffic recording')
+        for line in source:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TrafficRecorder:
+    """Writes records to a file from a background thread, so requests never wait on disk"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._secret = os.urandom(32)  # Keys client addresses; never written to the recording
+        self._started = time.time()
+        self._next_stream = 0
+        self._records: "queue_module.SimpleQueue[Optional[Dict[str, Any]]]" = queue_module.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._writer is not None
+
+    def start(self):
+        """Open the file, write the header and start the writer thread"""
+        if self._writer is not None:
+            return
+        self._started = time.time()
+        out = open_traffic_file(self.path, 'w')
+        out.write(json.dumps({
+            'format': FORMAT,
+            'version': FORMAT_VERSION,
+            'started': datetime.fromtimestamp(self._started, timezone.utc).isoformat()
+        }) + '\n')
+        self._writer = threading.Thread(target=self._write_loop, args=(out,), name='traffic-recorder', daemon=True)
+        self._writer.start()
+        logger.info(f"Recording traffic to {self.path}")
+
+    def stop(self):
+        """Write out what's left and close the file"""
+        if self._writer is None:
+            return
+        self._records.put(None)
+        self._writer.join()
+        self._writer = None
+        logger.info(f"Recorded {self.recorded} requests and stream events to {self.path}")
+
+    def offset(self, at: Optional[float] = None) -> float:
+        """Seconds since recording started"""
+        return round((at if at is not None else time.time()) - self._started, 3)
+
+    def stream_id(self) -> int:
+        self._next_stream += 1
+        return self._next_stream
+
+    def client_key(self, address: str) -> str:
+        """A key for a client address, stable within this recording"""
+        return hmac.new(self._secret, address.encode(), hashlib.blake2b).hexdigest()[:8]
+
+    def record(self, entry: Dict[str, Any]):
+        """Queue a record for writing"""
+        if self._writer is not None:
+            self._records.put(entry)
+
+    def _write_loop(self, out):
+        with out:
+            while True:
+                entry = self._records.get()
+                if entry is None:
+                    return
+                out.write(json.dumps(entry, separators=(',', ':')) + '\n')
+                self.recorded += 1
+
+
+traffic_recorder: Optional[TrafficRecorder] = None
+if os.getenv('TRAFFIC_RECORD_FILE'):
+    traffic_recorder = TrafficRecorder(os.getenv('TRAFFIC_RECORD_FILE'))
+
+
+class TrafficRecorderMiddleware:
+    """ASGI middleware recording mutating API calls and SSE connects/disconnects"""
+
+    def __init__(self, app, recorder: TrafficRecorder):
+        self.app = app
+        self.recorder = recorder
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.recorder.running:
+            await self.app(scope, receive, send)
+            return
+        path = scope['path']
+        if path == SSE_PATH:
+            await self._stream(scope, receive, send)
+        elif scope['method'] in MUTATING_METHODS and path.startswith('/api/') and not path.startswith(NOT_RECORDED):
+            await self._request(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _stream(self, scope, receive, send):
+        recorder = self.recorder
+        stream_id = recorder.stream_id()
+        recorder.record({'t': recorder.offset(), 'e': 'open', 'id': stream_id,
+                         'c': recorder.client_key(client_ip(Request(scope)))})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            recorder.record({'t': recorder.offset(), 'e': 'close', 'id': stream_id})
+
+    async def _request(self, scope, receive, send):
+        started = time.time()
+        body: List[bytes] = []
+        size = [0]
+        status = [500]
+
+        async def receive_wrapper():
+            message = await receive()
+            if message['type'] == 'http.request':
+                size[0] += len(message.get('body', b''))
+                if size[0] <= MAX_BODY:
+                    body.append(message.get('body', b''))
+            return message
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            request = Request(scope)
+            entry = {
+                't': self.recorder.offset(started),
+                'm': scope['method'],
+                'p': scope['path'],
+                'r': route_template(scope),
+                'c': self.recorder.client_key(client_ip(request))
+            }
+            if scope.get('query_string'):
+                entry['q'] = scope['query_string'].decode('latin-1')
+            if body and size[0] <= MAX_BODY:
+                entry['b'] = b''.join(body).decode('utf-8', 'replace')
+            if 'authorization' in request.headers:
+                entry['a'] = 1
+            entry['s'] = status[0]
+            entry['d'] = round(time.time() - started, 4)
+            self.recorder.record(entry)
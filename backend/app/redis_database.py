@@ -0,0 +1,435 @@
+"""Redis storage backend for multi-node deployments"""
+import os
+import json
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from app.database import QueueStorage, VersionConflict, default_qrz_info, max_queue_size, project_entry
+
+try:
+    import redis
+except ImportError:  # redis is optional; only needed when MONGO_URI is a redis:// URL
+    redis = None
+
+
+# Atomically check status, duplicates and capacity, then append with the next sequence number.
+# Returns {position, seq, version}, or a negative code for the rule that rejected the registration.
+REGISTER_SCRIPT = """
+if redis.call('HGET', KEYS[4], 'active') ~= 'true' then return -1 end
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then return -2 end
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[3]) then return -3 end
+local seq = redis.call('INCR', KEYS[3])
+redis.call('ZADD', KEYS[1], seq, ARGV[1])
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+return {count + 1, seq, redis.call('INCR', KEYS[5])}
+"""
+
+# Remove a callsign (or the head of the queue when none is given) and return {entry, seq, version}
+POP_SCRIPT = """
+local callsign = ARGV[1]
+if callsign == '' then
+  local head = redis.call('ZRANGE', KEYS[1], 0, 0)
+  if #head == 0 then return false end
+  callsign = head[1]
+end
+local entry = redis.call('HGET', KEYS[2], callsign)
+if not entry then return false end
+local seq = redis.call('ZSCORE', KEYS[1], callsign)
+redis.call('ZREM', KEYS[1], callsign)
+redis.call('HDEL', KEYS[2], callsign)
+return {entry, seq, redis.call('INCR', KEYS[3])}
+"""
+
+# Reserve the state version if it still equals ARGV[1] and isn't claimed yet; returns {claimed, version}.
+# The claim doesn't bump the version, and lapses once a write does.
+CLAIM_SCRIPT = """
+local version = tonumber(redis.call('GET', KEYS[1]) or '0')
+if version ~= tonumber(ARGV[1]) or redis.call('GET', KEYS[2]) == ARGV[1] then return {0, version} end
+redis.call('SET', KEYS[2], ARGV[1])
+return {1, version}
+"""
+
+# Drop the claim on ARGV[1] if it is still the current one
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+# Delete the current QSO and bump the state version in one step; returns {qso fields, version}
+CLEAR_QSO_SCRIPT = """
+local qso = redis.call('HGETALL', KEYS[1])
+if #qso == 0 then return false end
+redis.call('DEL', KEYS[1])
+return {qso, redis.call('INCR', KEYS[2])}
+"""
+
+
+class RedisQueueDatabase(QueueStorage):
+    """
+    Redis implementation of the queue storage interface.
+
+    The queue is a sorted set of callsigns scored by a registration sequence number,
+    so a callsign's position is an O(log n) ZRANK. Entries live in a hash keyed by
+    callsign, and status, current QSO, frequency and split each live in their own hash.
+    """
+
+    def __init__(self, client=None, key_prefix: str = 'pileup_buster'):
+        """client must be created with decode_responses=True"""
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required when MONGO_URI is a redis:// URL")
+            client = redis.Redis.from_url(os.getenv('MONGO_URI', 'redis://localhost:6379/0'), decode_responses=True)
+        self.client = client
+        self.queue_key = f"{key_prefix}:queue"
+        self.entries_key = f"{key_prefix}:queue:entries"
+        self.seq_key = f"{key_prefix}:queue:seq"
+        self.version_key = f"{key_prefix}:version"
+        self.claim_key = f"{key_prefix}:version:claim"
+        self.status_key = f"{key_prefix}:system_status"
+        self.current_qso_key = f"{key_prefix}:current_qso"
+        self.setting_keys = {
+            'frequency': f"{key_prefix}:frequency",
+            'split': f"{key_prefix}:split"
+        }
+        self._register = self.client.register_script(REGISTER_SCRIPT)
+        self._pop = self.client.register_script(POP_SCRIPT)
+        self._claim = self.client.register_script(CLAIM_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+        self._clear_qso = self.client.register_script(CLEAR_QSO_SCRIPT)
+
+    def _get_hash(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._decode_hash(self.client.hgetall(key))
+
+    @staticmethod
+    def _decode_hash(data: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        if not data:
+            return None
+        return {k: json.loads(v) for k, v in data.items()}
+
+    @staticmethod
+    def _popped_entry(result) -> Optional[Dict[str, Any]]:
+        if not result:
+            return None
+        entry, seq, version = result
+        return {**json.loads(entry), 'seq': int(seq), 'version': version}
+
+    @staticmethod
+    def _encode_hash(document: Dict[str, Any]) -> Dict[str, str]:
+        """Store each field as JSON so booleans, None and nested dicts survive"""
+        return {k: json.dumps(v) for k, v in document.items()}
+
+    # State version
+
+    def get_state_version(self) -> int:
+        """Get the current state version (0 before the first write)"""
+        return int(self.client.get(self.version_key) or 0)
+
+    def claim_version(self, expected: int) -> int:
+        """Reserve the state version if it still equals expected and isn't claimed yet"""
+        claimed, version = self._claim(keys=[self.version_key, self.claim_key], args=[expected])
+        if not claimed:
+            raise VersionConflict(expected, version)
+        return version
+
+    def release_version(self, expected: int):
+        """Drop an unused claim on expected"""
+        self._release(keys=[self.claim_key], args=[expected])
+
+    # Queue operations
+
+    def register_callsign(self, callsign: str, qrz_info: Dict[str, Any] = None,
+                          include_queue: bool = False) -> Dict[str, Any]:
+        """Register a callsign in the queue with optional QRZ information"""
+        limit = max_queue_size()
+        entry = {
+            'callsign': callsign,
+            'timestamp': datetime.utcnow().isoformat(),
+            'qrz': qrz_info or default_qrz_info(callsign)
+        }
+
+        # MULTI keeps the snapshot consistent with the registration
+        pipe = self.client.pipeline(transaction=True)
+        self._register(
+            keys=[self.queue_key, self.entries_key, self.seq_key, self.status_key, self.version_key],
+            args=[callsign, json.dumps(entry), limit],
+            client=pipe
+        )
+        if include_queue:
+            self._queue_snapshot(pipe)
+        result, *snapshot = pipe.execute()
+
+        if result == -1:
+            raise ValueError("System is currently inactive. Registration is not available.")
+        if result == -2:
+            raise ValueError("Callsign already in queue")
+        if result == -3:
+            raise ValueError(f"Queue is full. Maximum queue size is {limit}")
+
+        entry['position'], entry['seq'], entry['version'] = result
+        if include_queue:
+            entry['queue'] = self._build_queue_list(*snapshot)
+        return entry
+
+    def find_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Find a callsign in the queue and return with updated position"""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrank(self.queue_key, callsign)
+        pipe.zscore(self.queue_key, callsign)
+        pipe.hget(self.entries_key, callsign)
+        rank, seq, entry = pipe.execute()
+        if rank is None or entry is None:
+            return None
+        result = json.loads(entry)
+        result['seq'] = int(seq)
+        result['position'] = rank + 1
+        return result
+
+    def get_queue_list(self, limit: Optional[int] = None, after: Optional[int] = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get the queue list with updated positions, optionally paged and projected"""
+        if limit is None and after is None and fields is None:
+            pipe = self.client.pipeline(transaction=True)
+            self._queue_snapshot(pipe)
+            return self._build_queue_list(*pipe.execute())
+
+        # Read only the requested window of the sorted set, then only those entries
+        lower = f"({after}" if after is not None else '-inf'
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zrangebyscore(self.queue_key, lower, '+inf', start=0, num=-1 if limit is None else limit,
+                           withscores=True)
+        if after is not None:
+            # Entries before the cursor still count towards positions
+            pipe.zcount(self.queue_key, '-inf', after)
+        members, *counted = pipe.execute()
+        offset = counted[0] if counted else 0
+        if not members:
+            return []
+
+        entries = self.client.hmget(self.entries_key, [callsign for callsign, _ in members])
+        queue_list = []
+        for (callsign, seq), entry in zip(members, entries):
+            if entry is None:  # Removed between the two reads
+                continue
+            result = json.loads(entry)
+            result['seq'] = int(seq)
+            result['position'] = offset + len(queue_list) + 1
+            queue_list.append(project_entry(result, fields))
+        return queue_list
+
+    def _queue_snapshot(self, pipe):
+        """Queue the reads that _build_queue_list needs onto a pipeline"""
+        pipe.zrange(self.queue_key, 0, -1, withscores=True)
+        pipe.hgetall(self.entries_key)
+
+    @staticmethod
+    def _build_queue_list(members, entries: Dict[str, str]) -> List[Dict[str, Any]]:
+        queue_list = []
+        for callsign, seq in members:
+            result = json.loads(entries[callsign])
+            result['seq'] = int(seq)
+            result['position'] = len(queue_list) + 1
+            queue_list.append(result)
+        return queue_list
+
+    def get_neighborhood(self, callsign: str, radius: int) -> List[Dict[str, Any]]:
+        """Get a callsign's entry with up to radius entries either side of it"""
+        rank = self.client.zrank(self.queue_key, callsign)
+        if rank is None:
+            return []
+        start = max(0, rank - radius)
+        members = self.client.zrange(self.queue_key, start, rank + radius, withscores=True)
+        entries = self.client.hmget(self.entries_key, [member for member, _ in members])
+
+        window = []
+        for (member, seq), entry in zip(members, entries):
+            if entry is None:  # Removed between the two reads
+                continue
+            result = json.loads(entry)
+            result['seq'] = int(seq)
+            result['position'] = start + len(window) + 1
+            window.append(result)
+        return window
+
+    def remove_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Remove a callsign from the queue"""
+        return self._popped_entry(self._pop(keys=[self.queue_key, self.entries_key, self.version_key], args=[callsign]))
+
+    def clear_queue(self) -> Dict[str, Any]:
+        """Clear the entire queue; returns cleared_count and the state version the clear wrote"""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zcard(self.queue_key)
+        pipe.delete(self.queue_key, self.entries_key)
+        pipe.incr(self.version_key)
+        count, _, version = pipe.execute()
+        return {"cleared_count": count, "version": version}
+
+    def get_next_callsign(self, include_queue: bool = False) -> Optional[Dict[str, Any]]:
+        """Get and remove the next callsign in queue (FIFO)"""
+        pipe = self.client.pipeline(transaction=True)
+        self._pop(keys=[self.queue_key, self.entries_key, self.version_key], args=[''], client=pipe)
+        if include_queue:
+            self._queue_snapshot(pipe)
+        popped, *snapshot = pipe.execute()
+
+        entry = self._popped_entry(popped)
+        if entry is not None and include_queue:
+            entry['queue'] = self._build_queue_list(*snapshot)
+        return entry
+
+    def get_queue_count(self) -> int:
+        """Get the total count of entries in queue"""
+        return self.client.zcard(self.queue_key)
+
+    # System status
+
+    def get_system_status(self) -> Dict[str, Any]:
+        """Get the current system status (active/inactive)"""
+        status = self._get_hash(self.status_key)
+        if status is None:
+            status = {
+                "active": False,
+                "last_updated": datetime.utcnow().isoformat(),
+                "updated_by": "system"
+            }
+            self.client.hset(self.status_key, mapping=self._encode_hash(status))
+        return status
+
+    def reset(self, active: bool, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the system status (active/inactive) and clear queue when changing status"""
+        status = {
+            "active": active,
+            "last_updated": datetime.utcnow().isoformat(),
+            "updated_by": updated_by
+        }
+        pipe = self.client.pipeline(transaction=True)
+        pipe.zcard(self.queue_key)
+        pipe.delete(self.queue_key, self.entries_key)
+        pipe.delete(self.current_qso_key)
+        pipe.hset(self.status_key, mapping=self._encode_hash(status))
+        pipe.incr(self.version_key)
+        cleared_count, _, qso_deleted, _, version = pipe.execute()
+
+        return {
+            **status,
+            "queue_cleared": True,
+            "cleared_count": cleared_count,
+            "qso_cleared": qso_deleted > 0,
+            "version": version
+        }
+
+    def advance(self, include_queue: bool = True) -> Dict[str, Any]:
+        """Move the next queued callsign into the current QSO"""
+        state = {}
+
+        def apply(pipe):
+            # WATCH makes EXEC fail (and redis-py retry) if another admin changes these keys first
+            previous = self._decode_hash(pipe.hgetall(self.current_qso_key))
+            head = pipe.zrange(self.queue_key, 0, 0)
+            entry = json.loads(pipe.hget(self.entries_key, head[0])) if head else None
+
+            current_qso = None
+            pipe.multi()
+            pipe.delete(self.current_qso_key)
+            if entry is not None:
+                current_qso = {
+                    "callsign": entry['callsign'],
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "qrz": entry.get('qrz') or default_qrz_info(entry['callsign'])
+                }
+                pipe.hset(self.current_qso_key, mapping=self._encode_hash(current_qso))
+                pipe.zrem(self.queue_key, entry['callsign'])
+                pipe.hdel(self.entries_key, entry['callsign'])
+            pipe.incr(self.version_key)
+            if include_queue:
+                self._queue_snapshot(pipe)
+            state.update(previous_qso=previous, current_qso=current_qso)
+
+        results = self.client.transaction(apply, self.current_qso_key, self.queue_key)
+        if include_queue:
+            state['version'] = results[-3]
+            state['queue'] = self._build_queue_list(*results[-2:])
+        else:
+            state['version'] = results[-1]
+        return state
+
+    # Current QSO
+
+    def get_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Get the current callsign in QSO"""
+        return self._get_hash(self.current_qso_key)
+
+    def set_current_qso(self, callsign: str, qrz_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Set the current callsign in QSO with QRZ information"""
+        qso = {
+            "callsign": callsign,
+            "timestamp": datetime.utcnow().isoformat(),
+            "qrz": qrz_info or default_qrz_info(callsign)
+        }
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self.current_qso_key)
+        pipe.hset(self.current_qso_key, mapping=self._encode_hash(qso))
+        pipe.incr(self.version_key)
+        *_, version = pipe.execute()
+        return {**qso, "version": version}
+
+    def clear_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Clear the current QSO"""
+        result = self._clear_qso(keys=[self.current_qso_key, self.version_key])
+        if not result:
+            return None
+        fields, version = result
+        qso = self._decode_hash(dict(zip(fields[::2], fields[1::2])))
+        return {**qso, "version": version}
+
+    # Frequency and split
+
+    def get_frequency(self) -> Optional[Dict[str, Any]]:
+        """Get the current transmission frequency"""
+        return self._get_hash(self.setting_keys['frequency'])
+
+    def set_frequency(self, frequency: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current transmission frequency"""
+        return self._set_setting('frequency', frequency, updated_by)
+
+    def clear_frequency(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current transmission frequency"""
+        return self._clear_setting('frequency', updated_by)
+
+    def get_split(self) -> Optional[Dict[str, Any]]:
+        """Get the current split value"""
+        return self._get_hash(self.setting_keys['split'])
+
+    def set_split(self, split: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current split value"""
+        return self._set_setting('split', split, updated_by)
+
+    def clear_split(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current split value"""
+        result = self._clear_setting('split', updated_by)
+        del result['cleared']
+        return result
+
+    def _set_setting(self, name: str, value: str, updated_by: str) -> Dict[str, Any]:
+        setting = {
+            name: value,
+            "last_updated": datetime.utcnow().isoformat(),
+            "updated_by": updated_by
+        }
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self.setting_keys[name], mapping=self._encode_hash(setting))
+        pipe.incr(self.version_key)
+        _, version = pipe.execute()
+        return {**setting, "version": version}
+
+    def _clear_setting(self, name: str, updated_by: str) -> Dict[str, Any]:
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self.setting_keys[name])
+        pipe.incr(self.version_key)
+        deleted, version = pipe.execute()
+        return {
+            name: None,
+            "last_updated": datetime.utcnow().isoformat(),
+            "updated_by": updated_by,
+            "cleared": deleted > 0,
+            "version": version
+        }
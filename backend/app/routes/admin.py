@@ -1,11 +1,17 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Response
 from pydantic import BaseModel
-from app.database import queue_db
+from typing import Optional
+from app.admission import admission_stats
+from app.bulkhead import bulkhead_stats
+from app.database import queue_db, queue_page, max_queue_size
+from app.queue_window import large_queue_mode, queue_update_payload
 from app.auth import verify_admin_credentials
+from app.profiling import ProfilerBusy, profile_seconds, profiler, profiling_enabled
+from app import slow_ops
 from app.services.events import event_broadcaster
+from app.versioning import etag_matches, version_etag, write_if_match
 import asyncio
 import logging
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -21,94 +27,107 @@ class SplitRequest(BaseModel):
     split: str
 
 @admin_router.get('/queue')
-def admin_queue(username: str = Depends(verify_admin_credentials)):
-    """Admin view of the queue"""
+def admin_queue(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[int] = Query(None, ge=0),
+    fields: Optional[str] = Query(None),
+    username: str = Depends(verify_admin_credentials),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Admin view of the queue (paged with limit/after and projected with fields, like /api/queue/list)"""
     try:
-        queue_list = queue_db.get_queue_list()
+        version = queue_db.get_state_version()
+        if etag_matches(if_none_match, version):
+            return Response(status_code=304, headers={'ETag': version_etag(version)})
+        
+        page = queue_page(queue_db, limit, after, fields)
+        response.headers['ETag'] = version_etag(version)
         return {
-            'queue': queue_list,
-            'total': len(queue_list),
-            'admin': True
+            'queue': page['queue'],
+            'total': page['total'],
+            'admin': True,
+            'version': version,
+            'next_cursor': page['next_cursor']
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
 @admin_router.delete('/queue/{callsign}')
-def remove_callsign(callsign: str, username: str = Depends(verify_admin_credentials)):
+def remove_callsign(
+    callsign: str,
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
+):
     """Remove a callsign from the queue"""
     callsign = callsign.upper().strip()
-    
     try:
-        removed_entry = queue_db.remove_callsign(callsign)
+        removed_entry = write_if_match(queue_db, if_match, lambda: queue_db.remove_callsign(callsign))
         if removed_entry:
             return {
                 'message': f'Callsign {callsign} removed from queue',
                 'removed': removed_entry
             }
         raise HTTPException(status_code=404, detail='Callsign not found in queue')
+    except HTTPException:
+        raise
     except Exception as e:
         if "not found" in str(e):
             raise HTTPException(status_code=404, detail='Callsign not found in queue')
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
 @admin_router.post('/queue/clear')
-def clear_queue(username: str = Depends(verify_admin_credentials)):
+def clear_queue(
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
+):
     """Clear the entire queue"""
     try:
-        count = queue_db.clear_queue()
+        cleared = write_if_match(queue_db, if_match, queue_db.clear_queue)
         return {
-            'message': f'Queue cleared. Removed {count} entries.',
-            'cleared_count': count
+            'message': f'Queue cleared. Removed {cleared["cleared_count"]} entries.',
+            **cleared
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
 @admin_router.post('/queue/next')
-async def next_callsign(username: str = Depends(verify_admin_credentials)):
+async def next_callsign(
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
+):
     """Process the next callsign in queue and manage QSO status"""
     try:
-        # Clear any existing current QSO
-        current_qso = queue_db.clear_current_qso()
+        # Clear the current QSO and promote the next callsign in one atomic step
+        state = write_if_match(queue_db, if_match, lambda: queue_db.advance(include_queue=not large_queue_mode()))
+        new_qso = state['current_qso']
+        version = state.get('version')
         
-        # Get the next callsign from queue
-        next_entry = queue_db.get_next_callsign()
-        
-        if not next_entry:
+        if not new_qso:
             # If no one is in queue, return None for current_qso
             # Broadcast that current QSO is now None
             try:
-                await event_broadcaster.broadcast_current_qso(None)
+                await event_broadcaster.broadcast_current_qso(None, version=version)
             except Exception as e:
                 logger.warning(f"Failed to broadcast current QSO event: {e}")
             return None
         
-        # Put the next callsign into QSO status with stored QRZ information
-        qrz_info = next_entry.get('qrz', {
-            'callsign': next_entry["callsign"],
-            'name': None,
-            'address': None,
-            'image': None,
-            'error': 'QRZ information not available'
-        })
-        new_qso = queue_db.set_current_qso(next_entry["callsign"], qrz_info)
-        
         # Broadcast the new current QSO
         try:
-            await event_broadcaster.broadcast_current_qso(new_qso)
+            await event_broadcaster.broadcast_current_qso(new_qso, version=version)
             
             # Broadcast updated queue (since someone was removed)
-            queue_list = queue_db.get_queue_list()
-            max_queue_size = int(os.getenv('MAX_QUEUE_SIZE', '4'))
-            await event_broadcaster.broadcast_queue_update({
-                'queue': queue_list, 
-                'total': len(queue_list), 
-                'max_size': max_queue_size,
-                'system_active': True
-            })
+            await event_broadcaster.broadcast_queue_update(
+                queue_update_payload(queue_db, state.get('queue'), version)
+            )
         except Exception as e:
             logger.warning(f"Failed to broadcast SSE events: {e}")
         
-        return new_qso
+        return {**new_qso, 'version': version}
         
     except HTTPException:
         raise
@@ -116,11 +135,14 @@ async def next_callsign(username: str = Depends(verify_admin_credentials)):
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
 @admin_router.post('/qso/complete')
-async def complete_current_qso(username: str = Depends(verify_admin_credentials)):
+async def complete_current_qso(
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
+):
     """Complete the current QSO without advancing to the next station"""
     try:
         # Clear the current QSO
-        cleared_qso = queue_db.clear_current_qso()
+        cleared_qso = write_if_match(queue_db, if_match, queue_db.clear_current_qso)
         
         if not cleared_qso:
             return {
@@ -130,7 +152,7 @@ async def complete_current_qso(username: str = Depends(verify_admin_credentials)
         
         # Broadcast that current QSO is now None
         try:
-            await event_broadcaster.broadcast_current_qso(None)
+            await event_broadcaster.broadcast_current_qso(None, version=cleared_qso.get('version'))
         except Exception as e:
             logger.warning(f"Failed to broadcast current QSO clear event: {e}")
         
@@ -147,11 +169,12 @@ async def complete_current_qso(username: str = Depends(verify_admin_credentials)
 @admin_router.post('/status')
 async def set_system_status(
     request: SystemStatusRequest, 
-    username: str = Depends(verify_admin_credentials)
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
 ):
     """Set the system status (activate/deactivate)"""
     try:
-        status = queue_db.set_system_status(request.active, username)
+        status = write_if_match(queue_db, if_match, lambda: queue_db.set_system_status(request.active, username))
         action = "activated" if request.active else "deactivated"
         cleared_count = status.get("cleared_count", 0)
         qso_cleared = status.get("qso_cleared", False)
@@ -166,17 +189,17 @@ async def set_system_status(
         # Broadcast system status change
         try:
             await event_broadcaster.broadcast_system_status({
-                'active': request.active
+                'active': request.active,
+                'version': status.get('version')
             })
             
             # If system was deactivated, also broadcast empty queue and no current QSO
             if not request.active:
                 await event_broadcaster.broadcast_current_qso(None)
-                max_queue_size = int(os.getenv('MAX_QUEUE_SIZE', '4'))
                 await event_broadcaster.broadcast_queue_update({
                     'queue': [], 
                     'total': 0, 
-                    'max_size': max_queue_size,
+                    'max_size': max_queue_size(),
                     'system_active': False
                 })
                 
@@ -193,6 +216,8 @@ async def set_system_status(
             'message': message,
             'status': status
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, 
@@ -211,11 +236,12 @@ def get_system_status(username: str = Depends(verify_admin_credentials)):
 @admin_router.post('/frequency')
 async def set_frequency(
     request: FrequencyRequest, 
-    username: str = Depends(verify_admin_credentials)
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
 ):
     """Set the current transmission frequency (admin only)"""
     try:
-        frequency_data = queue_db.set_frequency(request.frequency, username)
+        frequency_data = write_if_match(queue_db, if_match, lambda: queue_db.set_frequency(request.frequency, username))
         
         # Broadcast frequency update
         try:
@@ -227,23 +253,27 @@ async def set_frequency(
             'message': f'Frequency set to {request.frequency}',
             'frequency_data': frequency_data
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
 @admin_router.delete('/frequency')
 async def clear_frequency(
-    username: str = Depends(verify_admin_credentials)
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
 ):
     """Clear the current transmission frequency (admin only)"""
     try:
-        frequency_data = queue_db.clear_frequency(username)
+        frequency_data = write_if_match(queue_db, if_match, lambda: queue_db.clear_frequency(username))
         
         # Broadcast frequency update (with None frequency)
         try:
             await event_broadcaster.broadcast_frequency_update({
                 'frequency': None,
                 'last_updated': frequency_data['last_updated'],
-                'updated_by': frequency_data['updated_by']
+                'updated_by': frequency_data['updated_by'],
+                'version': frequency_data.get('version')
             })
         except Exception as e:
             logger.warning(f"Failed to broadcast frequency clear event: {e}")
@@ -252,17 +282,20 @@ async def clear_frequency(
             'message': 'Frequency cleared successfully',
             'frequency_data': frequency_data
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
 @admin_router.post('/split')
 async def set_split(
     request: SplitRequest, 
-    username: str = Depends(verify_admin_credentials)
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
 ):
     """Set the current split value (admin only)"""
     try:
-        split_data = queue_db.set_split(request.split, username)
+        split_data = write_if_match(queue_db, if_match, lambda: queue_db.set_split(request.split, username))
         
         # Broadcast split update
         try:
@@ -274,16 +307,19 @@ async def set_split(
             'message': f'Split set to {request.split}',
             'split_data': split_data
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
 @admin_router.delete('/split')
 async def clear_split(
-    username: str = Depends(verify_admin_credentials)
+    username: str = Depends(verify_admin_credentials),
+    if_match: Optional[str] = Header(None)
 ):
     """Clear the current split value (admin only)"""
     try:
-        split_data = queue_db.clear_split(username)
+        split_data = write_if_match(queue_db, if_match, lambda: queue_db.clear_split(username))
         
         # Broadcast split update
         try:
@@ -295,6 +331,8 @@ async def clear_split(
             'message': 'Split cleared',
             'split_data': split_data
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
 
@@ -305,4 +343,75 @@ def admin_get_current_qso(username: str = Depends(verify_admin_credentials)):
         current_qso = queue_db.get_current_qso()
         return current_qso
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f'Database error: {str(e)}')
+
+@admin_router.get('/admission')
+async def get_admission_stats(username: str = Depends(verify_admin_credentials)):
+    """Admission control limits, admitted requests and rejections per endpoint (admin only)"""
+    return await admission_stats()
+
+@admin_router.get('/bulkheads')
+def get_bulkhead_stats(username: str = Depends(verify_admin_credentials)):
+    """Admin and public pool sizes, slots in use and queue depths (admin only)"""
+    return bulkhead_stats()
+
+@admin_router.get('/slow-ops')
+def get_slow_ops(username: str = Depends(verify_admin_credentials)):
+    """The slowest storage calls and MongoDB commands of the recent window (admin only)"""
+    if slow_ops.slow_op_log is None:
+        return {'enabled': False, 'slowest': []}
+    return {'enabled': True, **slow_ops.slow_op_log.stats()}
+
+def require_profiling():
+    """The profiling endpoints don't exist unless PROFILING_ENABLED=true"""
+    if not profiling_enabled():
+        raise HTTPException(status_code=404, detail='Not Found')
+
+@admin_router.post('/profile')
+async def run_profile(
+    seconds: float = Query(10, gt=0),
+    mode: str = Query('sample', pattern='^(sample|cprofile)$'),
+    interval: float = Query(0.005, ge=0.001, le=1.0),
+    username: str = Depends(verify_admin_credentials)
+):
+    """Profile the live process for a number of seconds (admin only, needs PROFILING_ENABLED)
+
+    mode=sample returns collapsed stacks for a flamegraph; mode=cprofile returns a pstats dump.
+    """
+    require_profiling()
+    seconds = profile_seconds(seconds)
+    logger.info(f"Admin {username} started a {seconds}s {mode} profile")
+    try:
+        if mode == 'cprofile':
+            content = await profiler.cprofile(seconds)
+            return Response(content=content, media_type='application/octet-stream',
+                            headers={'Content-Disposition': 'attachment; filename="profile.pstats"'})
+        content = await profiler.sample(seconds, interval)
+        return Response(content=content, media_type='text/plain',
+                        headers={'Content-Disposition': 'attachment; filename="profile.folded"'})
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@admin_router.post('/memory/snapshot')
+def take_memory_snapshot(username: str = Depends(verify_admin_credentials)):
+    """Start tracemalloc and take the baseline snapshot (admin only, needs PROFILING_ENABLED)"""
+    require_profiling()
+    return profiler.take_snapshot()
+
+@admin_router.get('/memory/diff')
+def get_memory_diff(
+    limit: int = Query(20, ge=1, le=200),
+    username: str = Depends(verify_admin_credentials)
+):
+    """Memory growth since the baseline snapshot, biggest first (admin only, needs PROFILING_ENABLED)"""
+    require_profiling()
+    try:
+        return profiler.diff(limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@admin_router.delete('/memory')
+def stop_memory_tracing(username: str = Depends(verify_admin_credentials)):
+    """Stop tracemalloc (admin only, needs PROFILING_ENABLED)"""
+    require_profiling()
+    return profiler.stop_tracing()
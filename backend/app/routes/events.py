@@ -2,9 +2,11 @@
 Server-Sent Events (SSE) endpoints for real-time notifications
 """
 import asyncio
-from fastapi import APIRouter
+import anyio
+from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
-from app.services.events import event_broadcaster
+from app.admission import Slot, stream_limiter
+from app.services.events import SSEFrame, event_broadcaster
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,9 +14,32 @@ logger = logging.getLogger(__name__)
 events_router = APIRouter()
 
 
+class EventStreamResponse(StreamingResponse):
+    """
+    A StreamingResponse that gives its admission slot back however the response ends
+
+    The generator's own cleanup only runs if it was started, so a client that
+    disconnects before the first frame would otherwise keep the slot forever.
+    """
+
+    def __init__(self, content, slot: Slot, **kwargs):
+        super().__init__(content, **kwargs)
+        self.slot = slot
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            with anyio.CancelScope(shield=True):
+                await stream_limiter.release(self.slot)
+
+
 @events_router.get('/stream')
-async def events_stream():
+async def events_stream(request: Request):
     """Server-Sent Events endpoint for real-time notifications"""
+    # Per-client reconnect rate and cap on open streams (when admission control is on);
+    # the slot is held until the response ends
+    slot = await stream_limiter.admit(request)
     
     async def event_generator():
         # Create a queue for this connection
@@ -36,9 +61,13 @@ async def events_stream():
                         timeout=30.0  # 30 second keepalive
                     )
                     yield event_data
+                    # The generator resumes once the frame has been written
+                    if isinstance(event_data, SSEFrame):
+                        event_data.delivered()
                 except asyncio.TimeoutError:
                     # Send keepalive
                     yield "event: keepalive\ndata: {}\n\n"
+                    await stream_limiter.renew(slot)
                 except Exception as e:
                     logger.error(f"Error in SSE stream: {e}")
                     break
@@ -49,8 +78,9 @@ async def events_stream():
             # Cleanup connection
             await event_broadcaster.remove_connection(connection_queue)
     
-    return StreamingResponse(
+    return EventStreamResponse(
         event_generator(),
+        slot,
         media_type="text/plain",
         headers={
             "Cache-Control": "no-cache",
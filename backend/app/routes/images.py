@@ -0,0 +1,53 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+from app.database import queue_db
+from app.services.images import profile_image_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+images_router = APIRouter()
+
+# The URL is keyed by callsign and the operator's QRZ photo can change, so clients
+# keep a thumbnail briefly and then revalidate it against the ETag (a content hash)
+IMAGE_CACHE_CONTROL = 'public, max-age=300'
+
+
+def _find_image_url(callsign: str):
+    """Get the stored QRZ image URL for a callsign in the queue or current QSO"""
+    current_qso = queue_db.get_current_qso()
+    if current_qso and current_qso.get('callsign') == callsign:
+        return (current_qso.get('qrz') or {}).get('image')
+
+    entry = queue_db.find_callsign(callsign)
+    if entry:
+        return (entry.get('qrz') or {}).get('image')
+    return None
+
+
+@images_router.get('/{callsign}')
+async def get_profile_image(callsign: str, request: Request):
+    """Serve a cached thumbnail of the QRZ profile image for a queued or active callsign"""
+    callsign = callsign.upper().strip()
+
+    try:
+        # Storage calls block; keep them off the event loop like the image cache's file I/O
+        image_url = await asyncio.to_thread(_find_image_url, callsign)
+    except Exception as e:
+        logger.error(f"Failed to look up profile image for {callsign}: {e}")
+        raise HTTPException(status_code=500, detail='Failed to look up profile image')
+
+    if not image_url:
+        raise HTTPException(status_code=404, detail='No profile image for callsign')
+
+    thumbnail = await profile_image_cache.get_thumbnail(image_url)
+    if not thumbnail:
+        raise HTTPException(status_code=502, detail='Profile image unavailable')
+
+    etag = f'"{thumbnail["etag"]}"'
+    headers = {'Cache-Control': IMAGE_CACHE_CONTROL, 'ETag': etag}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(thumbnail['path'], media_type=thumbnail['media_type'], headers=headers)
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header, Query, Request, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from app.services.qrz import qrz_service
-from app.database import queue_db
+from app.admission import register_limiter
+from app.database import queue_db, queue_page, max_queue_size
+from app.queue_window import large_queue_mode, neighborhood_radius, queue_update_payload, queue_window_size
 from app.validation import validate_callsign
 from app.services.events import event_broadcaster
+from app.services.intake import registration_intake, IntakeFull
+from app.versioning import etag_matches, version_etag
 import logging
 import asyncio
-import os
 
 logger = logging.getLogger(__name__)
 
@@ -36,9 +40,17 @@ class QueueEntry(BaseModel):
     position: int
 
 @queue_router.post('/register')
-async def register_callsign(request: CallsignRequest):
+async def register_callsign(request: CallsignRequest, http_request: Request):
     """Register a callsign in the queue"""
-    callsign = request.callsign.upper().strip()
+    # Per-client rate limit and cap on registrations in flight (when admission control is on)
+    slot = await register_limiter.admit(http_request)
+    try:
+        return await _register(request.callsign)
+    finally:
+        await register_limiter.release(slot)
+
+async def _register(callsign: str):
+    callsign = callsign.upper().strip()
     
     if not callsign:
         raise HTTPException(status_code=400, detail='Callsign is required')
@@ -47,27 +59,35 @@ async def register_callsign(request: CallsignRequest):
         raise HTTPException(status_code=400, detail='Invalid callsign format. Must follow ITU standards (e.g., KC1ABC, W1AW)')
     
     try:
-        # Check if system is active before allowing registration
+        # Check if system is active before allowing registration (or handing out an intake ticket)
         system_status = queue_db.get_system_status()
         if not system_status.get('active', False):
             raise HTTPException(status_code=503, detail='System is currently inactive. Registration is not available.')
         
+        if registration_intake.running:
+            # Intake mode: queue the registration for the intake worker and hand back a ticket
+            try:
+                ticket = registration_intake.submit(callsign)
+            except IntakeFull as e:
+                raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '5'})
+            return JSONResponse(status_code=202, content={
+                'message': 'Registration accepted for processing',
+                'ticket': ticket
+            })
+        
         # Fetch QRZ information at registration time
         qrz_info = qrz_service.lookup_callsign(callsign)
         
-        # Register callsign with QRZ information
-        entry = queue_db.register_callsign(callsign, qrz_info)
+        # Register callsign with QRZ information (the resulting queue comes back with the entry,
+        # except in large-queue mode where the event only needs the top of the queue)
+        entry = queue_db.register_callsign(callsign, qrz_info, include_queue=not large_queue_mode())
         
         # Broadcast updated queue
         try:
-            queue_list = queue_db.get_queue_list()
-            max_queue_size = int(os.getenv('MAX_QUEUE_SIZE', '4'))
-            await event_broadcaster.broadcast_queue_update({
-                'queue': queue_list, 
-                'total': len(queue_list), 
-                'max_size': max_queue_size,
-                'system_active': True
-            })
+            queue_list = entry.pop('queue', None)
+            await event_broadcaster.broadcast_queue_update(
+                queue_update_payload(queue_db, queue_list, entry.get('version'))
+            )
         except Exception as e:
             logger.warning(f"Failed to broadcast queue update event: {e}")
         
@@ -80,6 +100,14 @@ async def register_callsign(request: CallsignRequest):
         logger.error(f"Failed to register callsign: {e}")
         raise HTTPException(status_code=500, detail='Failed to register callsign')
 
+@queue_router.get('/ticket/{ticket_id}')
+def get_ticket(ticket_id: str):
+    """Get the outcome of a registration accepted in intake mode"""
+    ticket = registration_intake.get_ticket(ticket_id)
+    if not ticket:
+        raise HTTPException(status_code=404, detail='Ticket not found')
+    return ticket
+
 @queue_router.get('/status/{callsign}')
 def get_status(callsign: str):
     """Get position of callsign in queue with stored QRZ.com profile information"""
@@ -104,29 +132,59 @@ def get_status(callsign: str):
         raise HTTPException(status_code=500, detail='Failed to get callsign status')
 
 @queue_router.get('/list')
-def list_queue():
-    """Get current queue status"""
+def list_queue(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description='Return at most this many entries'),
+    after: Optional[int] = Query(None, ge=0, description='Cursor: sequence number of the last entry already seen'),
+    fields: Optional[str] = Query(None, description='Comma-separated fields to return, e.g. callsign,qrz.dxcc_name'),
+    callsign: Optional[str] = Query(None, description='Also return the entries around this station (large-queue mode)'),
+    if_none_match: Optional[str] = Header(None)
+):
+    """
+    Get current queue status
+    
+    In large-queue mode an unpaged request returns the top of the queue plus the total,
+    and callsign= adds that station's neighborhood.
+    """
     try:
+        # Read the version first so the ETag never claims newer state than the body holds
+        version = queue_db.get_state_version()
+        if etag_matches(if_none_match, version):
+            return Response(status_code=304, headers={'ETag': version_etag(version)})
+        response.headers['ETag'] = version_etag(version)
+        
         # Check if system is active
         system_status = queue_db.get_system_status()
-        max_queue_size = int(os.getenv('MAX_QUEUE_SIZE', '4'))
         
         if not system_status.get('active', False):
             # Return empty queue if system is inactive
             return {
                 'queue': [], 
                 'total': 0, 
-                'max_size': max_queue_size,
-                'system_active': False
+                'max_size': max_queue_size(),
+                'system_active': False,
+                'version': version
             }
         
-        queue = queue_db.get_queue_list()
-        return {
-            'queue': queue, 
-            'total': len(queue), 
-            'max_size': max_queue_size,
-            'system_active': True
+        window = queue_window_size()
+        if window and limit is None and after is None:
+            limit = window
+        page = queue_page(queue_db, limit, after, fields)
+        result = {
+            'queue': page['queue'], 
+            'total': page['total'], 
+            'max_size': max_queue_size(),
+            'system_active': True,
+            'version': version,
+            'next_cursor': page['next_cursor']
         }
+        if window:
+            result['windowed'] = True
+            if callsign:
+                result['neighborhood'] = queue_db.get_neighborhood(callsign.upper().strip(), neighborhood_radius())
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to get queue list: {e}")
         raise HTTPException(status_code=500, detail='Failed to get queue list')
@@ -0,0 +1,177 @@
+"""
+Local DXCC entity resolver backed by a cty.dat style prefix file
+"""
+import os
+import re
+import threading
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CTY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'cty.dat')
+
+# Portable/mobile designators that never change the DXCC entity
+_IGNORED_SUFFIXES = {'P', 'M', 'MM', 'AM', 'QRP', 'A', 'B', 'LH', 'J', 'R'}
+
+# Per-prefix overrides: (CQ zone) [ITU zone] <lat/long> {continent} ~UTC offset~
+_OVERRIDE_PATTERN = re.compile(r'\((\d+)\)|\[(\d+)\]|<[^>]*>|\{([A-Z]{2})\}|~[^~]*~')
+
+
+class _PrefixTrie:
+    """Character trie mapping callsign prefixes to resolved entity records"""
+
+    __slots__ = ('_root',)
+
+    # Key under which a node stores its value; cannot collide with a callsign character
+    _VALUE = ''
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+
+    def insert(self, prefix: str, value: Dict[str, Any]):
+        node = self._root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[self._VALUE] = value
+
+    def longest_match(self, callsign: str) -> Optional[Dict[str, Any]]:
+        node = self._root
+        match = None
+        for char in callsign:
+            node = node.get(char)
+            if node is None:
+                break
+            match = node.get(self._VALUE, match)
+        return match
+
+
+class DXCCResolver:
+    """Resolve callsigns to DXCC entity, continent and CQ/ITU zones without network calls"""
+
+    def __init__(self, cty_path: Optional[str] = None):
+        self.cty_path = cty_path or os.getenv('CTY_DAT_PATH', DEFAULT_CTY_PATH)
+        self._prefixes: Optional[_PrefixTrie] = None
+        self._exceptions: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, text: Optional[str] = None) -> int:
+        """
+        Load entity data from cty.dat text (or from cty_path when text is None)
+
+        Returns:
+            Number of entities loaded
+        """
+        if text is None:
+            with open(self.cty_path, encoding='latin-1') as cty_file:
+                text = cty_file.read()
+
+        prefixes = _PrefixTrie()
+        exceptions: Dict[str, Dict[str, Any]] = {}
+        entity_count = 0
+
+        # Each record is a header line followed by a prefix list terminated by ';'
+        for record in text.split(';'):
+            header, _, prefix_list = record.strip().partition('\n')
+            fields = [field.strip() for field in header.split(':')]
+            if len(fields) < 8:
+                continue
+
+            entity = {
+                'entity': fields[0],
+                'cq_zone': int(fields[1]),
+                'itu_zone': int(fields[2]),
+                'continent': fields[3],
+                'prefix': fields[7].lstrip('*'),
+            }
+            entity_count += 1
+
+            for token in prefix_list.replace('\n', '').split(','):
+                token = token.strip()
+                if not token:
+                    continue
+                exact = token.startswith('=')
+                base = re.split(r'[(\[<{~]', token.lstrip('='), maxsplit=1)[0]
+                record_value = self._apply_overrides(entity, token)
+                if exact:
+                    exceptions[base] = record_value
+                else:
+                    prefixes.insert(base, record_value)
+
+        # Publish exceptions first: lookups treat a non-None trie as fully loaded
+        self._exceptions = exceptions
+        self._prefixes = prefixes
+
+        logger.info(f"Loaded {entity_count} DXCC entities from cty data")
+        return entity_count
+
+    def lookup(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the DXCC entity for a callsign
+
+        Returns:
+            Dict with entity, continent, cq_zone, itu_zone and prefix, or None if unknown
+        """
+        if self._prefixes is None:
+            self._load_once()
+
+        callsign = callsign.upper().strip()
+        if not callsign:
+            return None
+
+        exception = self._exceptions.get(callsign)
+        if exception is not None:
+            return dict(exception)
+
+        match = self._prefixes.longest_match(self._effective_prefix(callsign))
+        return dict(match) if match is not None else None
+
+    def _load_once(self):
+        """Load the configured prefix file on first use"""
+        with self._lock:
+            if self._prefixes is not None:
+                return
+            try:
+                self.load()
+            except OSError as e:
+                logger.warning(f"DXCC prefix file unavailable: {e}")
+                self._prefixes = _PrefixTrie()
+            except (ValueError, KeyError, IndexError) as e:
+                logger.error(f"DXCC prefix file {self.cty_path} is malformed: {e}")
+                self._prefixes = _PrefixTrie()
+
+    @staticmethod
+    def _apply_overrides(entity: Dict[str, Any], token: str) -> Dict[str, Any]:
+        """Return a copy of the entity with any zone/continent overrides from the token applied"""
+        value = dict(entity)
+        for cq_zone, itu_zone, continent in _OVERRIDE_PATTERN.findall(token):
+            if cq_zone:
+                value['cq_zone'] = int(cq_zone)
+            if itu_zone:
+                value['itu_zone'] = int(itu_zone)
+            if continent:
+                value['continent'] = continent
+        return value
+
+    @staticmethod
+    def _effective_prefix(callsign: str) -> str:
+        """Reduce a possibly portable callsign (e.g. F/W1AW, W1AW/6, W1AW/P) to the part that decides the entity"""
+        if '/' not in callsign:
+            return callsign
+
+        parts: List[str] = [part for part in callsign.split('/') if part and part not in _IGNORED_SUFFIXES]
+        if not parts:
+            return callsign.split('/')[0]
+        if len(parts) == 1:
+            return parts[0]
+
+        base, other = parts[0], parts[1]
+        # W1AW/6 operates from call area 6 of the home entity
+        if len(other) == 1 and other.isdigit():
+            return re.sub(r'\d', other, base, count=1)
+        # Otherwise the shorter part is the operating prefix (F/W1AW, W1AW/KH6)
+        return other if len(other) < len(base) else base
+
+
+# Global instance
+dxcc_resolver = DXCCResolver()
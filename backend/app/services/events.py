@@ -1,14 +1,28 @@
 """
 Server-Sent Events (SSE) service for real-time notifications
 """
+import os
 import json
+import time
 import asyncio
 import logging
 from typing import Dict, Set, Any, Optional
 from datetime import datetime, timezone
 from enum import Enum
+from app.metrics import (
+    SSE_CONNECTIONS, SSE_DELIVERY_LAG, SSE_FANOUT, SSE_QUEUE_DEPTH_MAX, SSE_QUEUE_DEPTH_TOTAL, bound
+)
+from app.logs import LogSampler, activity
+from app.tracing import span
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; only needed for multi-node event relay
+    aioredis = None
 
 logger = logging.getLogger(__name__)
+# A failing connection can fail on every broadcast; a few warnings a minute are enough
+sampled = LogSampler(logger)
 
 
 class EventType(str, Enum):
@@ -18,6 +32,27 @@ class EventType(str, Enum):
     SYSTEM_STATUS = "system_status"
     FREQUENCY_UPDATE = "frequency_update"
     SPLIT_UPDATE = "split_update"
+    REGISTRATION_RESULT = "registration_result"
+
+
+class SSEFrame(str):
+    """
+    A formatted SSE message that remembers when its event was created
+
+    One frame is shared by every connection's queue; the stream calls
+    delivered() once it has written the frame to the client.
+    """
+    __slots__ = ('event_type', 'created')
+
+    def __new__(cls, message: str, event_type: str, created: float):
+        frame = super().__new__(cls, message)
+        frame.event_type = event_type
+        frame.created = created
+        return frame
+
+    def delivered(self):
+        """Record the delay from the event's creation to now"""
+        bound(SSE_DELIVERY_LAG, self.event_type).observe(time.time() - self.created)
 
 
 class EventBroadcaster:
@@ -26,53 +61,107 @@ class EventBroadcaster:
     def __init__(self):
         self._connections: Set[asyncio.Queue] = set()
         self._lock = asyncio.Lock()
+        self._relay: Optional["RedisEventRelay"] = None
     
     async def add_connection(self, queue: asyncio.Queue):
         """Add a new SSE connection"""
         async with self._lock:
             self._connections.add(queue)
-            logger.info(f"Added SSE connection. Total connections: {len(self._connections)}")
+            SSE_CONNECTIONS.set(len(self._connections))
+            activity.count('connections_added')
+            activity.gauge('connections', len(self._connections))
+            logger.debug("Added SSE connection. Total connections: %d", len(self._connections))
     
     async def remove_connection(self, queue: asyncio.Queue):
         """Remove an SSE connection"""
         async with self._lock:
             self._connections.discard(queue)
-            logger.info(f"Removed SSE connection. Total connections: {len(self._connections)}")
+            SSE_CONNECTIONS.set(len(self._connections))
+            activity.count('connections_removed')
+            activity.gauge('connections', len(self._connections))
+            logger.debug("Removed SSE connection. Total connections: %d", len(self._connections))
     
-    async def broadcast_event(self, event_type: EventType, data: Any):
-        """Broadcast an event to all connected clients"""
-        if not self._connections:
-            logger.debug(f"No SSE connections to broadcast {event_type} event")
-            return
-        
+    def attach_relay(self, relay: Optional["RedisEventRelay"]):
+        """Route broadcasts through a relay so every node's clients receive them"""
+        self._relay = relay
+    
+    async def broadcast_event(self, event_type: EventType, data: Any, version: Optional[int] = None):
+        """
+        Broadcast an event to all connected clients
+
+        The state version (given, or taken from the data returned by the store) is
+        sent alongside so clients can drop events older than what they already have.
+        """
+        if version is None and isinstance(data, dict):
+            version = data.get("version")
         event_data = {
             "type": event_type.value,
             "data": data,
+            "version": version,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
-        # Format as SSE message
-        sse_message = f"event: {event_type.value}\ndata: {json.dumps(event_data)}\n\n"
-        
-        # Send to all connections
-        async with self._lock:
-            disconnected = set()
-            for connection_queue in self._connections:
+        with span('sse.broadcast', **{'event.type': event_type.value, 'sse.relay': self._relay is not None}):
+            if self._relay is not None:
+                # The relay hands the event back to deliver_event on every node, this one included
                 try:
-                    await connection_queue.put(sse_message)
+                    await self._relay.publish(event_data)
+                    return
                 except Exception as e:
-                    logger.warning(f"Failed to send event to connection: {e}")
-                    disconnected.add(connection_queue)
+                    logger.warning(f"Failed to publish {event_type} event to relay, delivering locally: {e}")
+        
+            await self.deliver_event(event_data)
+    
+    async def deliver_event(self, event_data: Dict[str, Any]):
+        """Send an event to the clients connected to this node"""
+        event_type = event_data["type"]
+        if not self._connections:
+            activity.count('broadcasts')
+            logger.debug("No SSE connections to broadcast %s event", event_type)
+            return
+        
+        started = time.perf_counter()
+        
+        # Format as SSE message (relayed events carry the originating node's creation time)
+        try:
+            created = datetime.fromisoformat(event_data["timestamp"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            created = time.time()
+        sse_message = SSEFrame(f"event: {event_type}\ndata: {json.dumps(event_data)}\n\n", event_type, created)
+        
+        # Send to all connections
+        with span('sse.fanout', **{'event.type': event_type, 'sse.connections': len(self._connections)}):
+            async with self._lock:
+                disconnected = set()
+                deepest = waiting = 0
+                for connection_queue in self._connections:
+                    try:
+                        await connection_queue.put(sse_message)
+                        depth = connection_queue.qsize()
+                        waiting += depth
+                        deepest = max(deepest, depth)
+                    except Exception as e:
+                        sampled.warning('sse_send_failed', "Failed to send event to connection: %s", e)
+                        disconnected.add(connection_queue)
             
-            # Clean up disconnected connections
-            for queue in disconnected:
-                self._connections.discard(queue)
+                # Clean up disconnected connections
+                for queue in disconnected:
+                    self._connections.discard(queue)
+                SSE_CONNECTIONS.set(len(self._connections))
+        
+        # Slow clients show up as deep queues; a slow fan-out delays every client
+        SSE_QUEUE_DEPTH_MAX.set(deepest)
+        SSE_QUEUE_DEPTH_TOTAL.set(waiting)
+        bound(SSE_FANOUT, event_type).observe(time.perf_counter() - started)
         
-        logger.info(f"Broadcasted {event_type} event to {len(self._connections)} connections")
+        activity.count('broadcasts')
+        activity.count('deliveries', len(self._connections))
+        activity.gauge('connections', len(self._connections))
+        logger.debug("Broadcasted %s event to %d connections", event_type, len(self._connections))
     
-    async def broadcast_current_qso(self, current_qso: Optional[Dict[str, Any]]):
+    async def broadcast_current_qso(self, current_qso: Optional[Dict[str, Any]], version: Optional[int] = None):
         """Broadcast current QSO change event"""
-        await self.broadcast_event(EventType.CURRENT_QSO, current_qso)
+        await self.broadcast_event(EventType.CURRENT_QSO, current_qso, version=version)
     
     async def broadcast_queue_update(self, queue_data: Dict[str, Any]):
         """Broadcast queue update event"""
@@ -89,6 +178,73 @@ class EventBroadcaster:
     async def broadcast_split_update(self, split_data: Dict[str, Any]):
         """Broadcast split update event"""
         await self.broadcast_event(EventType.SPLIT_UPDATE, split_data)
+    
+    async def broadcast_registration_result(self, ticket: Dict[str, Any]):
+        """Broadcast the outcome of a registration accepted through the intake buffer"""
+        await self.broadcast_event(EventType.REGISTRATION_RESULT, ticket)
+
+
+class RedisEventRelay:
+    """Carry broadcast events between nodes over Redis pub/sub"""
+    
+    def __init__(self, broadcaster: EventBroadcaster, client=None, channel: str = 'pileup_buster:events',
+                 retry_delay: float = 1.0):
+        if client is None:
+            if aioredis is None:
+                raise RuntimeError("The redis package is required for the Redis event relay")
+            client = aioredis.from_url(redis_events_url(), decode_responses=True)
+        self.broadcaster = broadcaster
+        self.client = client
+        self.channel = channel
+        self.retry_delay = retry_delay
+        self._task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Subscribe to the channel and route broadcasts through it"""
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._task = asyncio.create_task(self._listen(pubsub))
+        self.broadcaster.attach_relay(self)
+        logger.info(f"Relaying SSE events over Redis channel {self.channel}")
+    
+    async def stop(self):
+        """Stop relaying and fall back to local-only broadcasts"""
+        self.broadcaster.attach_relay(None)
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def publish(self, event_data: Dict[str, Any]):
+        """Publish an event for every node (including this one) to deliver"""
+        await self.client.publish(self.channel, json.dumps(event_data))
+    
+    async def _listen(self, pubsub):
+        try:
+            while True:
+                try:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None:
+                        await self.broadcaster.deliver_event(json.loads(message["data"]))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Redis event relay error: {e}")
+                    await asyncio.sleep(self.retry_delay)
+        finally:
+            await pubsub.aclose()
+
+
+def redis_events_url() -> Optional[str]:
+    """Redis URL for the event relay (REDIS_URL, or MONGO_URI when the queue lives in Redis)"""
+    url = os.getenv('REDIS_URL')
+    if url:
+        return url
+    mongo_uri = os.getenv('MONGO_URI', '')
+    return mongo_uri if mongo_uri.startswith(('redis://', 'rediss://')) else None
 
 
 # Global event broadcaster instance
@@ -0,0 +1,167 @@
+"""
+Profile image proxy with a local, content-addressed thumbnail cache
+"""
+import os
+import io
+import json
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from app.metrics import record_image_cache
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it images are cached at their original size
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'image_cache')
+
+
+class ProfileImageCache:
+    """
+    Fetch each remote profile image once and keep a resized copy on disk
+
+    A thumbnail older than max_age seconds (IMAGE_CACHE_MAX_AGE, default a day)
+    is revalidated against the source, so a photo replaced at the same URL is
+    picked up. The source's ETag/Last-Modified make that a conditional request.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, thumbnail_size: Optional[int] = None, fetch_timeout: float = 10.0,
+                 max_age: Optional[float] = None):
+        self.cache_dir = cache_dir or os.getenv('IMAGE_CACHE_DIR', DEFAULT_CACHE_DIR)
+        self.thumbnail_size = thumbnail_size or int(os.getenv('IMAGE_THUMBNAIL_SIZE', '256'))
+        self.fetch_timeout = fetch_timeout
+        self.max_age = max_age if max_age is not None else float(os.getenv('IMAGE_CACHE_MAX_AGE', '86400'))
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._fetch_locks: Dict[str, asyncio.Lock] = {}
+
+    async def get_thumbnail(self, source_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached thumbnail for a remote image, fetching it on first use
+
+        Returns:
+            Dict with path, etag and media_type, or None if the image can't be fetched
+            (a stale thumbnail is returned while the source is unreachable)
+        """
+        # The index and thumbnails live on disk; keep file I/O off the event loop
+        cached = await asyncio.to_thread(self._lookup, source_url)
+        fresh = cached is not None and self._is_fresh(cached)
+        record_image_cache(fresh)
+        if fresh:
+            return cached
+
+        # Concurrent requests for the same image share a single fetch
+        lock = self._fetch_locks.setdefault(source_url, asyncio.Lock())
+        try:
+            async with lock:
+                cached = await asyncio.to_thread(self._lookup, source_url)
+                if cached and self._is_fresh(cached):
+                    return cached
+                return await self._fetch(source_url, cached)
+        finally:
+            # Only once the thumbnail is stored, so requests arriving meanwhile wait for it
+            if self._fetch_locks.get(source_url) is lock:
+                self._fetch_locks.pop(source_url, None)
+
+    async def _fetch(self, source_url: str, stale: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Fetch, resize and store an image, or revalidate a stale thumbnail of it"""
+        headers = {}
+        if stale and stale.get('source_etag'):
+            headers['If-None-Match'] = stale['source_etag']
+        if stale and stale.get('source_last_modified'):
+            headers['If-Modified-Since'] = stale['source_last_modified']
+
+        try:
+            async with httpx.AsyncClient(timeout=self.fetch_timeout, follow_redirects=True) as client:
+                response = await client.get(source_url, headers=headers)
+                if response.status_code == 304 and stale:
+                    return await asyncio.to_thread(self._refresh, source_url, stale)
+                response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to fetch profile image {source_url}: {e}")
+            # A stale thumbnail beats none while the source is unreachable
+            return stale
+
+        # Resizing is CPU-bound; keep it off the event loop
+        content, media_type = await asyncio.to_thread(
+            self._resize, response.content, response.headers.get('content-type', 'application/octet-stream')
+        )
+        validators = {
+            'source_etag': response.headers.get('etag'),
+            'source_last_modified': response.headers.get('last-modified')
+        }
+        return await asyncio.to_thread(self._store, source_url, content, media_type, validators)
+
+    def _is_fresh(self, entry: Dict[str, Any]) -> bool:
+        return time.time() - entry.get('fetched_at', 0) < self.max_age
+
+    def _lookup(self, source_url: str) -> Optional[Dict[str, Any]]:
+        """Find a cached thumbnail in memory or in the on-disk index"""
+        entry = self._index.get(source_url)
+        if entry is None:
+            try:
+                with open(self._meta_path(source_url)) as meta_file:
+                    entry = json.load(meta_file)
+            except (OSError, ValueError):
+                return None
+
+        if not os.path.exists(entry['path']):
+            self._index.pop(source_url, None)
+            return None
+
+        self._index[source_url] = entry
+        return entry
+
+    def _store(self, source_url: str, content: bytes, media_type: str,
+               validators: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Write the thumbnail under its content hash and record it for the source URL"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        digest = hashlib.sha256(content).hexdigest()
+        extension = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif'}.get(media_type, 'bin')
+        path = os.path.join(self.cache_dir, f"{digest}.{extension}")
+
+        if not os.path.exists(path):
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as image_file:
+                image_file.write(content)
+            os.replace(temp_path, path)
+
+        entry = {'path': path, 'etag': digest, 'media_type': media_type, **(validators or {})}
+        return self._refresh(source_url, entry)
+
+    def _refresh(self, source_url: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Record a thumbnail for the source URL as fetched now"""
+        entry = {**entry, 'fetched_at': time.time()}
+        with open(self._meta_path(source_url), 'w') as meta_file:
+            json.dump(entry, meta_file)
+
+        self._index[source_url] = entry
+        return entry
+
+    def _resize(self, content: bytes, media_type: str):
+        """Shrink the image to the thumbnail size (returns content and media type)"""
+        if Image is None:
+            return content, media_type.split(';')[0]
+
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                output = io.BytesIO()
+                image.convert('RGB').save(output, format='JPEG', quality=85, optimize=True)
+                return output.getvalue(), 'image/jpeg'
+        except Exception as e:
+            logger.warning(f"Failed to resize profile image, caching original: {e}")
+            return content, media_type.split(';')[0]
+
+    def _meta_path(self, source_url: str) -> str:
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(source_url.encode()).hexdigest()}.json")
+
+
+# Global instance
+profile_image_cache = ProfileImageCache()
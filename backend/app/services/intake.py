@@ -0,0 +1,178 @@
+"""
+Registration intake: absorbs registration bursts behind a bounded buffer
+
+In intake mode POST /api/queue/register only validates the callsign, puts it in
+an in-memory buffer and answers 202 with a ticket id. A single worker then does
+the QRZ lookup and the database write for each ticket in arrival order, so a
+spike of registrations becomes a steady stream of writes instead of hundreds of
+concurrent ones. Outcomes are broadcast as registration_result events and can
+be polled at /api/queue/ticket/{ticket_id}.
+
+Tickets still in the buffer when the process stops are lost; clients that never
+see an outcome should register again.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+from app.database import queue_db
+from app.queue_window import large_queue_mode, queue_update_payload
+from app.services.events import event_broadcaster
+from app.services.qrz import qrz_service
+from app.tracing import attached, capture_context, span
+
+logger = logging.getLogger(__name__)
+
+
+class TicketStatus(str, Enum):
+    """Lifecycle of an intake ticket"""
+    PENDING = "pending"
+    REGISTERED = "registered"
+    REJECTED = "rejected"
+
+
+class IntakeFull(Exception):
+    """Raised when the intake buffer has no room for another registration"""
+
+
+def intake_enabled() -> bool:
+    """Whether registrations go through the intake buffer (REGISTRATION_INTAKE=true)"""
+    return os.getenv('REGISTRATION_INTAKE', 'false').lower() in ('1', 'true', 'yes')
+
+
+class RegistrationIntake:
+    """Bounded registration buffer drained in arrival order by one worker"""
+
+    def __init__(self, capacity: Optional[int] = None, ticket_limit: int = 10000):
+        self.capacity = capacity or int(os.getenv('INTAKE_BUFFER_SIZE', '500'))
+        self.ticket_limit = ticket_limit
+        self._buffer: Optional[asyncio.Queue] = None
+        self._tickets: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._pending: Dict[str, str] = {}  # callsign -> ticket id
+        self._trace_contexts: Dict[str, Any] = {}  # ticket id -> submitting request's trace context
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def depth(self) -> int:
+        """Registrations waiting in the buffer"""
+        return self._buffer.qsize() if self._buffer is not None else 0
+
+    async def start(self):
+        """Start the worker on the running event loop"""
+        if self.running:
+            return
+        self._buffer = asyncio.Queue(maxsize=self.capacity)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Registration intake started (buffer of {self.capacity})")
+
+    async def stop(self):
+        """Stop the worker; registrations still buffered are dropped"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self.depth:
+            logger.warning(f"Registration intake stopped with {self.depth} registrations unprocessed")
+
+    def submit(self, callsign: str) -> Dict[str, Any]:
+        """
+        Accept a registration and return its ticket
+
+        A callsign that is already waiting gets its existing ticket back.
+
+        Raises:
+            IntakeFull: if the buffer is full
+        """
+        if callsign in self._pending:
+            return dict(self._tickets[self._pending[callsign]])
+
+        ticket = {
+            'ticket_id': uuid.uuid4().hex,
+            'callsign': callsign,
+            'status': TicketStatus.PENDING.value,
+            'submitted_at': datetime.utcnow().isoformat()
+        }
+        try:
+            self._buffer.put_nowait(ticket['ticket_id'])
+        except asyncio.QueueFull:
+            raise IntakeFull(f"Registration intake is full ({self.capacity} waiting)")
+
+        self._tickets[ticket['ticket_id']] = ticket
+        self._trace_contexts[ticket['ticket_id']] = capture_context()
+        self._pending[callsign] = ticket['ticket_id']
+        self._evict()
+        return dict(ticket)
+
+    def get_ticket(self, ticket_id: str) -> Optional[Dict[str, Any]]:
+        """Get a ticket's current state"""
+        ticket = self._tickets.get(ticket_id)
+        return dict(ticket) if ticket else None
+
+    def _evict(self):
+        # Forget the oldest finished tickets; pending ones are always kept
+        while len(self._tickets) > self.ticket_limit:
+            oldest = next((tid for tid, t in self._tickets.items()
+                           if t['status'] != TicketStatus.PENDING.value), None)
+            if oldest is None:
+                return
+            del self._tickets[oldest]
+
+    async def _run(self):
+        while True:
+            ticket_id = await self._buffer.get()
+            try:
+                # Continue the trace of the request that submitted the registration
+                with attached(self._trace_contexts.pop(ticket_id, None)), \
+                        span('intake.process', callsign=self._tickets[ticket_id]['callsign']):
+                    await self._process(self._tickets[ticket_id])
+            except Exception as e:
+                logger.error(f"Registration intake worker error: {e}")
+            finally:
+                self._buffer.task_done()
+
+    async def _process(self, ticket: Dict[str, Any]):
+        callsign = ticket['callsign']
+        try:
+            # The lookup and the write block, so they run off the event loop
+            entry, queue_update = await asyncio.to_thread(self._commit, callsign)
+            ticket.update(status=TicketStatus.REGISTERED.value, entry=entry)
+        except ValueError as e:
+            queue_update = None
+            ticket.update(status=TicketStatus.REJECTED.value, error=str(e))
+        except Exception as e:
+            logger.error(f"Failed to register callsign {callsign} from intake: {e}")
+            queue_update = None
+            ticket.update(status=TicketStatus.REJECTED.value, error='Failed to register callsign')
+        finally:
+            ticket['completed_at'] = datetime.utcnow().isoformat()
+            self._pending.pop(callsign, None)
+
+        try:
+            if queue_update is not None:
+                await event_broadcaster.broadcast_queue_update(queue_update)
+            await event_broadcaster.broadcast_registration_result(dict(ticket))
+        except Exception as e:
+            logger.warning(f"Failed to broadcast registration result: {e}")
+
+    @staticmethod
+    def _commit(callsign: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Look up and register a callsign; returns the entry and the queue_update event"""
+        qrz_info = qrz_service.lookup_callsign(callsign)
+        entry = queue_db.register_callsign(callsign, qrz_info, include_queue=not large_queue_mode())
+        return entry, queue_update_payload(queue_db, entry.pop('queue', None), entry.get('version'))
+
+
+# Global registration intake instance
+registration_intake = RegistrationIntake()
@@ -1,6 +1,17 @@
 import os
+import time
+import logging
 from typing import Dict, Optional
 from callsignlookuptools import QrzSyncClient
+from app.services.dxcc import dxcc_resolver
+from app.metrics import QRZ_LATENCY, bound, record_qrz_session
+from app.logs import LogSampler
+from app.tracing import traced
+from app.faults import inject_qrz_faults
+
+logger = logging.getLogger(__name__)
+# Without credentials, or while QRZ.com is down, every registration fails the same way
+sampled = LogSampler(logger)
 
 
 class QRZService:
@@ -9,6 +20,8 @@ class QRZService:
     def __init__(self):
         self.username = os.getenv('QRZ_USERNAME')
         self.password = os.getenv('QRZ_PASSWORD')
+        # Alternate XML API endpoint, e.g. the local stand-in in benchmarks/qrz_standin.py
+        self.api_url = os.getenv('QRZ_API_URL')
         self.qrz_client = None
     
     def _authenticate(self) -> bool:
@@ -18,11 +31,15 @@ class QRZService:
             
         try:
             self.qrz_client = QrzSyncClient(username=self.username, password=self.password)
+            if self.api_url:
+                # callsignlookuptools appends the urlencoded query directly to its base URL
+                self.qrz_client._base_url = self.api_url if self.api_url.endswith('?') else f"{self.api_url}?"
             return True
         except Exception as e:
-            print(f"QRZ authentication error: {e}")
+            logger.error("QRZ authentication error: %s", e)
             return False
     
+    @traced('qrz.lookup_callsign')
     def lookup_callsign(self, callsign: str) -> Dict[str, Optional[str]]:
         """
         Look up callsign information from QRZ.com
@@ -30,7 +47,7 @@ class QRZService:
         Returns:
             Dict with callsign info or error placeholder
         """
-        
+        started = time.perf_counter()
         try:
         
             # Check if QRZ credentials are configured if not throw an error
@@ -40,14 +57,15 @@ class QRZService:
                 )
                 
             
-            # Authenticate if we don't have a client
+            # Authenticate if we don't have a client (a reused session saves a login round trip)
+            record_qrz_session(self.qrz_client is not None)
             if not self.qrz_client and not self._authenticate():
                     raise Exception(
                         'QRZ.com authentication failed. Please check your credentials.'
                     )
 
             # Lookup the callsign using callsignlookuptools       
-            result = self.qrz_client.search(callsign)
+            result = self._search(callsign)
             
             # If no results found
             if not result:
@@ -61,18 +79,36 @@ class QRZService:
                 'image': result.image.url if hasattr(result, 'image') and result.image else None,
                 'error': None
             }
+            # QRZ profiles don't always carry the entity; fill it in locally
+            if not response['dxcc_name']:
+                response['dxcc_name'] = self._local_dxcc_name(callsign)
+            bound(QRZ_LATENCY, 'found').observe(time.perf_counter() - started)
             return response
             
         except Exception as e:
-            print(f"QRZ lookup error for {callsign}: {e}")
+            bound(QRZ_LATENCY, 'error').observe(time.perf_counter() - started)
+            sampled.warning('qrz_lookup_error', "QRZ lookup error for %s: %s", callsign, e)
             return {
                 'callsign': callsign,
                 'name': None,
                 'address': None,
-                'dxcc_name': None,
+                'dxcc_name': self._local_dxcc_name(callsign),
                 'error': str(e)
             }
     
+    def _search(self, callsign: str):
+        """Search QRZ.com for a callsign (the round trip to the XML API)"""
+        return self.qrz_client.search(callsign)
+    
+    def _local_dxcc_name(self, callsign: str) -> Optional[str]:
+        """Resolve the DXCC entity name from the local prefix table"""
+        try:
+            entity = dxcc_resolver.lookup(callsign)
+        except Exception as e:
+            sampled.warning('dxcc_lookup_error', "Local DXCC lookup error for %s: %s", callsign, e)
+            return None
+        return entity['entity'] if entity else None
+    
     def _format_address(self, address) -> Optional[str]:
         """Format address from QRZ data"""
         addr = address.line1
@@ -99,5 +135,5 @@ class QRZService:
         return ', '.join(parts) if parts else None
 
 
-# Global instance
-qrz_service = QRZService()
\ No newline at end of file
+# Global instance (with injected faults when FAULT_QRZ is set, for benchmarks)
+qrz_service = inject_qrz_faults(QRZService())
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""
+Slow-operation log: per-call timing for the queue store and MongoDB commands
+
+Opt in with SLOW_OP_THRESHOLD_MS. Every QueueStorage call on the global store
+and every MongoDB command the driver sends is then timed, along with the
+number of documents it returned or touched and the request that made it.
+Calls over the threshold are logged, and the slowest calls of the last
+SLOW_OP_WINDOW seconds (default 15 minutes) are kept for
+GET /api/admin/slow-ops, so a latency spike during an activation can be
+traced to the call behind it.
+"""
+import os
+import time
+import heapq
+import functools
+import itertools
+import logging
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# "POST /api/admin/queue/next" while a request is being handled; set by SlowOpMiddleware
+current_route: ContextVar[Optional[str]] = ContextVar('current_route', default=None)
+
+
+def slow_op_threshold() -> Optional[float]:
+    """Threshold in milliseconds from SLOW_OP_THRESHOLD_MS, or None when the log is off"""
+    configured = os.getenv('SLOW_OP_THRESHOLD_MS')
+    return float(configured) if configured else None
+
+
+def document_count(result: Any) -> int:
+    """Documents in a storage call's result"""
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        for key in ('queue', 'entries'):
+            if isinstance(result.get(key), list):
+                return len(result[key])
+    return 1
+
+
+class SlowOpLog:
+    """Logs operations over the threshold and keeps the slowest of a rolling window"""
+
+    def __init__(self, threshold_ms: float, top_n: int = 20, window: float = 900.0, bucket: float = 60.0):
+        self.threshold_ms = threshold_ms
+        self.top_n = top_n
+        self.window = window
+        self.bucket = bucket
+        # One min-heap of the slowest operations per time bucket; old buckets fall off the left
+        self._buckets: Deque[Tuple[int, List[Tuple[float, int, Dict[str, Any]]]]] = deque()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.slow = 0
+
+    def record(self, kind: str, name: str, duration_ms: float, documents: Optional[int] = None,
+               error: Optional[str] = None):
+        """Record one operation"""
+        is_slow = duration_ms >= self.threshold_ms
+        if is_slow:
+            logger.warning(
+                f"Slow {kind} {name}: {duration_ms:.1f} ms, {documents} documents"
+                f" (route: {current_route.get() or 'none'}){f', error: {error}' if error else ''}"
+            )
+
+        now = time.time()
+        index = int(now // self.bucket)
+        with self._lock:
+            self.recorded += 1
+            self.slow += is_slow
+            if not self._buckets or self._buckets[-1][0] != index:
+                self._buckets.append((index, []))
+                while self._buckets[0][0] < index - self.window / self.bucket:
+                    self._buckets.popleft()
+            heap = self._buckets[-1][1]
+            if len(heap) >= self.top_n and duration_ms <= heap[0][0]:
+                return
+            op = {
+                'kind': kind,
+                'name': name,
+                'duration_ms': round(duration_ms, 3),
+                'documents': documents,
+                'route': current_route.get(),
+                'slow': is_slow,
+                'error': error,
+                'at': datetime.fromtimestamp(now, timezone.utc).isoformat()
+            }
+            item = (duration_ms, next(self._counter), op)
+            if len(heap) < self.top_n:
+                heapq.heappush(heap, item)
+            else:
+                heapq.heapreplace(heap, item)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        """The slowest operations in the window, slowest first"""
+        oldest = int(time.time() // self.bucket) - self.window / self.bucket
+        with self._lock:
+            items = [item for index, heap in self._buckets if index >= oldest for item in heap]
+        return [op for _, _, op in heapq.nlargest(self.top_n, items)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Threshold, window, operation counts and the slowest operations"""
+        return {
+            'threshold_ms': self.threshold_ms,
+            'window_seconds': self.window,
+            'recorded': self.recorded,
+            'slow': self.slow,
+            'slowest': self.slowest()
+        }
+
+
+slow_op_log: Optional[SlowOpLog] = None
+if slow_op_threshold() is not None:
+    slow_op_log = SlowOpLog(
+        slow_op_threshold(),
+        top_n=int(os.getenv('SLOW_OP_TOP_N', '20')),
+        window=float(os.getenv('SLOW_OP_WINDOW', '900'))
+    )
+
+
+def trace_storage(store, log: Optional[SlowOpLog] = None):
+    """
+    Record every public QueueStorage method call on a store in the slow-op log
+
+    Returns a proxy (see app.database.StorageProxy), so the store's calls to
+    itself are not recorded twice. A no-op while the log is off.
+    """
+    log = log or slow_op_log
+    if log is None:
+        return store
+    from app.database import storage_backend, wrap_storage
+
+    backend = storage_backend(store)
+    return wrap_storage(store, lambda name, method: _traced(method, f'{backend}.{name}', log))
+
+
+def _traced(method: Callable, name: str, log: SlowOpLog) -> Callable:
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception as e:
+            log.record('storage', name, (time.perf_counter() - start) * 1000, error=str(e))
+            raise
+        log.record('storage', name, (time.perf_counter() - start) * 1000, document_count(result))
+        return result
+    return wrapper
+
+
+class SlowCommandListener(monitoring.CommandListener):
+    """Records every MongoDB command the driver sends"""
+
+    def __init__(self, log: SlowOpLog):
+        self.log = log
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.log.record('mongo', event.command_name, event.duration_micros / 1000, self._documents(event.reply))
+
+    def failed(self, event):
+        self.log.record('mongo', event.command_name, event.duration_micros / 1000, error=str(event.failure))
+
+    @staticmethod
+    def _documents(reply) -> Optional[int]:
+        # find/aggregate reply with a cursor batch; writes reply with n (matched or inserted)
+        cursor = reply.get('cursor')
+        if cursor is not None:
+            return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+        if 'n' in reply:
+            return reply['n']
+        if 'value' in reply:  # findAndModify
+            return 1 if reply['value'] else 0
+        return None
+
+
+def mongo_event_listeners() -> List[monitoring.CommandListener]:
+    """Command listeners for new MongoClients (none while the log is off)"""
+    return [SlowCommandListener(slow_op_log)] if slow_op_log is not None else []
+
+
+class SlowOpMiddleware:
+    """ASGI middleware noting the request behind each recorded operation"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        token = current_route.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
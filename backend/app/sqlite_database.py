@@ -0,0 +1,395 @@
+"""Embedded SQLite storage backend for single-host deployments"""
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from app.database import QueueStorage, T, VersionConflict, default_qrz_info, max_queue_size, project_entry
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    callsign TEXT NOT NULL UNIQUE,
+    timestamp TEXT NOT NULL,
+    qrz TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS state (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# Statements are kept constant so sqlite3's statement cache reuses the prepared form
+SQL_QUEUE_COUNT = "SELECT COUNT(*) FROM queue"
+SQL_QUEUE_EXISTS = "SELECT 1 FROM queue WHERE callsign = ?"
+SQL_QUEUE_INSERT = "INSERT INTO queue (callsign, timestamp, qrz) VALUES (?, ?, ?)"
+SQL_QUEUE_GET = "SELECT callsign, timestamp, qrz, seq FROM queue WHERE callsign = ?"
+SQL_QUEUE_POSITION = "SELECT COUNT(*) FROM queue WHERE seq < ?"
+SQL_QUEUE_LIST = "SELECT callsign, timestamp, qrz, seq FROM queue ORDER BY seq"
+SQL_QUEUE_PAGE = "SELECT callsign, timestamp, qrz, seq FROM queue WHERE seq > ? ORDER BY seq LIMIT ?"
+SQL_QUEUE_BEFORE = "SELECT callsign, timestamp, qrz, seq FROM queue WHERE seq < ? ORDER BY seq DESC LIMIT ?"
+SQL_QUEUE_AFTER = "SELECT callsign, timestamp, qrz, seq FROM queue WHERE seq > ? ORDER BY seq LIMIT ?"
+SQL_QUEUE_HEAD = "SELECT callsign, timestamp, qrz, seq FROM queue ORDER BY seq LIMIT 1"
+SQL_QUEUE_DELETE = "DELETE FROM queue WHERE callsign = ?"
+SQL_QUEUE_CLEAR = "DELETE FROM queue"
+SQL_STATE_GET = "SELECT data FROM state WHERE id = ?"
+SQL_STATE_PUT = "INSERT OR REPLACE INTO state (id, data) VALUES (?, ?)"
+SQL_STATE_DELETE = "DELETE FROM state WHERE id = ?"
+SQL_VERSION_BUMP = (
+    "INSERT INTO state (id, data) VALUES ('version', '1') "
+    "ON CONFLICT(id) DO UPDATE SET data = CAST(data AS INTEGER) + 1"
+)
+
+
+def sqlite_path_from_uri(uri: str) -> str:
+    """Extract the database file path from a sqlite:///path URI"""
+    # sqlite:///relative.db -> relative.db, sqlite:////abs/path.db -> /abs/path.db
+    path = uri[len('sqlite:///'):]
+    return path or ':memory:'
+
+
+class SQLiteQueueDatabase(QueueStorage):
+    """SQLite (WAL mode) implementation of the queue storage interface"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or sqlite_path_from_uri(os.getenv('MONGO_URI', 'sqlite:///pileup_buster.db'))
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            isolation_level=None,  # explicit BEGIN/COMMIT below
+            cached_statements=64
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """Serialise writers within the process and across processes sharing the file"""
+        with self._lock:
+            if self.conn.in_transaction:
+                # Nested in write_if_version's transaction, which commits or rolls back both
+                yield self.conn
+                return
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+
+    @staticmethod
+    def _row_to_entry(row, position: Optional[int] = None) -> Dict[str, Any]:
+        entry = {'callsign': row[0], 'seq': row[3], 'timestamp': row[1], 'qrz': json.loads(row[2])}
+        if position is not None:
+            entry['position'] = position
+        return entry
+
+    def _bump_version(self, conn) -> int:
+        """Increment the state version inside the caller's transaction"""
+        conn.execute(SQL_VERSION_BUMP)
+        return int(conn.execute(SQL_STATE_GET, ('version',)).fetchone()[0])
+
+    def get_state_version(self) -> int:
+        """Get the current state version (0 before the first write)"""
+        with self._lock:
+            row = self.conn.execute(SQL_STATE_GET, ('version',)).fetchone()
+        return int(row[0]) if row else 0
+
+    def _check_version(self, conn, expected: int):
+        """Raise VersionConflict unless the version equals expected and isn't claimed"""
+        row = conn.execute(SQL_STATE_GET, ('version',)).fetchone()
+        current = int(row[0]) if row else 0
+        claim = conn.execute(SQL_STATE_GET, ('version_claim',)).fetchone()
+        if current != expected or (claim and int(claim[0]) == expected):
+            raise VersionConflict(expected, current)
+
+    def claim_version(self, expected: int) -> int:
+        """Reserve the state version if it still equals expected and isn't claimed yet"""
+        with self._transaction() as conn:
+            self._check_version(conn, expected)
+            conn.execute(SQL_STATE_PUT, ('version_claim', str(expected)))
+            return expected
+
+    def release_version(self, expected: int):
+        """Drop an unused claim on expected"""
+        with self._transaction() as conn:
+            claim = conn.execute(SQL_STATE_GET, ('version_claim',)).fetchone()
+            if claim and int(claim[0]) == expected:
+                conn.execute(SQL_STATE_DELETE, ('version_claim',))
+
+    def write_if_version(self, expected: int, write: Callable[[], T]) -> T:
+        """Run write only if the state version still equals expected, in the same transaction"""
+        with self._transaction() as conn:
+            self._check_version(conn, expected)
+            return write()
+
+    def _get_state(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute(SQL_STATE_GET, (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # Queue operations
+
+    def register_callsign(self, callsign: str, qrz_info: Dict[str, Any] = None,
+                          include_queue: bool = False) -> Dict[str, Any]:
+        """Register a callsign in the queue with optional QRZ information"""
+        with self._transaction() as conn:
+            if not self.is_system_active():
+                raise ValueError("System is currently inactive. Registration is not available.")
+
+            if conn.execute(SQL_QUEUE_EXISTS, (callsign,)).fetchone():
+                raise ValueError("Callsign already in queue")
+
+            current_count = conn.execute(SQL_QUEUE_COUNT).fetchone()[0]
+            limit = max_queue_size()
+            if current_count >= limit:
+                raise ValueError(f"Queue is full. Maximum queue size is {limit}")
+
+            entry = {
+                'callsign': callsign,
+                'timestamp': datetime.utcnow().isoformat(),
+                'position': current_count + 1,
+                'qrz': qrz_info or default_qrz_info(callsign)
+            }
+            cursor = conn.execute(SQL_QUEUE_INSERT, (callsign, entry['timestamp'], json.dumps(entry['qrz'])))
+            # AUTOINCREMENT never reuses a rowid, so this is the monotonic sequence number
+            entry['seq'] = cursor.lastrowid
+            if include_queue:
+                entry['queue'] = self._queue_list(conn)
+            entry['version'] = self._bump_version(conn)
+        return entry
+
+    def find_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Find a callsign in the queue and return with updated position"""
+        with self._lock:
+            row = self.conn.execute(SQL_QUEUE_GET, (callsign,)).fetchone()
+            if not row:
+                return None
+            position = self.conn.execute(SQL_QUEUE_POSITION, (row[3],)).fetchone()[0] + 1
+        return self._row_to_entry(row, position)
+
+    def get_queue_list(self, limit: Optional[int] = None, after: Optional[int] = None,
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get the queue list with updated positions, optionally paged and projected"""
+        if limit is None and after is None and fields is None:
+            with self._lock:
+                return self._queue_list(self.conn)
+
+        # LIMIT -1 means no limit; sequence numbers start at 1
+        after = after or 0
+        with self._lock:
+            rows = self.conn.execute(SQL_QUEUE_PAGE, (after, -1 if limit is None else limit)).fetchall()
+            offset = self.conn.execute(SQL_QUEUE_POSITION, (after + 1,)).fetchone()[0] if after else 0
+
+        # Skip decoding the qrz JSON unless it was asked for
+        wants_qrz = fields is None or any(name == 'qrz' or name.startswith('qrz.') for name in fields)
+        queue_list = []
+        for i, row in enumerate(rows):
+            entry = {'callsign': row[0], 'seq': row[3], 'timestamp': row[1], 'position': offset + i + 1}
+            if wants_qrz:
+                entry['qrz'] = json.loads(row[2])
+            queue_list.append(project_entry(entry, fields))
+        return queue_list
+
+    def _queue_list(self, conn) -> List[Dict[str, Any]]:
+        rows = conn.execute(SQL_QUEUE_LIST).fetchall()
+        return [self._row_to_entry(row, i + 1) for i, row in enumerate(rows)]
+
+    def get_neighborhood(self, callsign: str, radius: int) -> List[Dict[str, Any]]:
+        """Get a callsign's entry with up to radius entries either side of it"""
+        with self._lock:
+            row = self.conn.execute(SQL_QUEUE_GET, (callsign,)).fetchone()
+            if not row:
+                return []
+            position = self.conn.execute(SQL_QUEUE_POSITION, (row[3],)).fetchone()[0] + 1
+            before = self.conn.execute(SQL_QUEUE_BEFORE, (row[3], radius)).fetchall()
+            after = self.conn.execute(SQL_QUEUE_AFTER, (row[3], radius)).fetchall()
+
+        rows = before[::-1] + [row] + after
+        first_position = position - len(before)
+        return [self._row_to_entry(r, first_position + i) for i, r in enumerate(rows)]
+
+    def remove_callsign(self, callsign: str) -> Optional[Dict[str, Any]]:
+        """Remove a callsign from the queue"""
+        with self._transaction() as conn:
+            row = conn.execute(SQL_QUEUE_GET, (callsign,)).fetchone()
+            if not row:
+                return None
+            conn.execute(SQL_QUEUE_DELETE, (callsign,))
+            entry = self._row_to_entry(row)
+            entry['version'] = self._bump_version(conn)
+        return entry
+
+    def clear_queue(self) -> Dict[str, Any]:
+        """Clear the entire queue; returns cleared_count and the state version the clear wrote"""
+        with self._transaction() as conn:
+            count = conn.execute(SQL_QUEUE_CLEAR).rowcount
+            return {"cleared_count": count, "version": self._bump_version(conn)}
+
+    def get_next_callsign(self, include_queue: bool = False) -> Optional[Dict[str, Any]]:
+        """Get and remove the next callsign in queue (FIFO)"""
+        with self._transaction() as conn:
+            row = conn.execute(SQL_QUEUE_HEAD).fetchone()
+            if not row:
+                return None
+            conn.execute(SQL_QUEUE_DELETE, (row[0],))
+            entry = self._row_to_entry(row)
+            if include_queue:
+                entry['queue'] = self._queue_list(conn)
+            entry['version'] = self._bump_version(conn)
+        return entry
+
+    def get_queue_count(self) -> int:
+        """Get the total count of entries in queue"""
+        with self._lock:
+            return self.conn.execute(SQL_QUEUE_COUNT).fetchone()[0]
+
+    # System status
+
+    def get_system_status(self) -> Dict[str, Any]:
+        """Get the current system status (active/inactive)"""
+        status = self._get_state('system_status')
+        if status is None:
+            status = {
+                "active": False,
+                "last_updated": datetime.utcnow().isoformat(),
+                "updated_by": "system"
+            }
+            with self._transaction() as conn:
+                conn.execute(SQL_STATE_PUT, ('system_status', json.dumps(status)))
+        return status
+
+    def reset(self, active: bool, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the system status (active/inactive) and clear queue when changing status"""
+        status = {
+            "active": active,
+            "last_updated": datetime.utcnow().isoformat(),
+            "updated_by": updated_by
+        }
+        with self._transaction() as conn:
+            cleared_count = conn.execute(SQL_QUEUE_CLEAR).rowcount
+            qso_cleared = conn.execute(SQL_STATE_DELETE, ('current_qso',)).rowcount > 0
+            conn.execute(SQL_STATE_PUT, ('system_status', json.dumps(status)))
+            version = self._bump_version(conn)
+
+        return {
+            **status,
+            "queue_cleared": True,
+            "cleared_count": cleared_count,
+            "qso_cleared": qso_cleared,
+            "version": version
+        }
+
+    def advance(self, include_queue: bool = True) -> Dict[str, Any]:
+        """Move the next queued callsign into the current QSO"""
+        with self._transaction() as conn:
+            previous = conn.execute(SQL_STATE_GET, ('current_qso',)).fetchone()
+            head = conn.execute(SQL_QUEUE_HEAD).fetchone()
+
+            current_qso = None
+            if head is None:
+                conn.execute(SQL_STATE_DELETE, ('current_qso',))
+            else:
+                entry = self._row_to_entry(head)
+                current_qso = {
+                    "callsign": entry['callsign'],
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "qrz": entry['qrz'] or default_qrz_info(entry['callsign'])
+                }
+                conn.execute(SQL_QUEUE_DELETE, (entry['callsign'],))
+                conn.execute(SQL_STATE_PUT, ('current_qso', json.dumps(current_qso)))
+
+            state = {
+                "previous_qso": json.loads(previous[0]) if previous else None,
+                "current_qso": current_qso,
+                "version": self._bump_version(conn)
+            }
+            if include_queue:
+                state["queue"] = self._queue_list(conn)
+            return state
+
+    # Current QSO
+
+    def get_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Get the current callsign in QSO"""
+        return self._get_state('current_qso')
+
+    def set_current_qso(self, callsign: str, qrz_info: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Set the current callsign in QSO with QRZ information"""
+        qso = {
+            "callsign": callsign,
+            "timestamp": datetime.utcnow().isoformat(),
+            "qrz": qrz_info or default_qrz_info(callsign)
+        }
+        with self._transaction() as conn:
+            conn.execute(SQL_STATE_PUT, ('current_qso', json.dumps(qso)))
+            version = self._bump_version(conn)
+        return {**qso, "version": version}
+
+    def clear_current_qso(self) -> Optional[Dict[str, Any]]:
+        """Clear the current QSO"""
+        with self._transaction() as conn:
+            row = conn.execute(SQL_STATE_GET, ('current_qso',)).fetchone()
+            if not row:
+                return None
+            conn.execute(SQL_STATE_DELETE, ('current_qso',))
+            version = self._bump_version(conn)
+        return {**json.loads(row[0]), "version": version}
+
+    # Frequency and split
+
+    def get_frequency(self) -> Optional[Dict[str, Any]]:
+        """Get the current transmission frequency"""
+        return self._get_state('frequency')
+
+    def set_frequency(self, frequency: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current transmission frequency"""
+        return self._set_setting('frequency', frequency, updated_by)
+
+    def clear_frequency(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current transmission frequency"""
+        return self._clear_setting('frequency', updated_by)
+
+    def get_split(self) -> Optional[Dict[str, Any]]:
+        """Get the current split value"""
+        return self._get_state('split')
+
+    def set_split(self, split: str, updated_by: str = "admin") -> Dict[str, Any]:
+        """Set the current split value"""
+        return self._set_setting('split', split, updated_by)
+
+    def clear_split(self, updated_by: str = "admin") -> Dict[str, Any]:
+        """Clear the current split value"""
+        result = self._clear_setting('split', updated_by)
+        del result['cleared']
+        return result
+
+    def _set_setting(self, name: str, value: str, updated_by: str) -> Dict[str, Any]:
+        setting = {
+            name: value,
+            "last_updated": datetime.utcnow().isoformat(),
+            "updated_by": updated_by
+        }
+        with self._transaction() as conn:
+            conn.execute(SQL_STATE_PUT, (name, json.dumps(setting)))
+            version = self._bump_version(conn)
+        return {**setting, "version": version}
+
+    def _clear_setting(self, name: str, updated_by: str) -> Dict[str, Any]:
+        with self._transaction() as conn:
+            deleted = conn.execute(SQL_STATE_DELETE, (name,)).rowcount
+            version = self._bump_version(conn)
+        return {
+            name: None,
+            "last_updated": datetime.utcnow().isoformat(),
+            "updated_by": updated_by,
+            "cleared": deleted > 0,
+            "version": version
+        }
@@ -0,0 +1,191 @@
+"""
+OpenTelemetry tracing across requests, storage calls, QRZ lookups and broadcasts
+
+Each request gets a server span (continuing the caller's trace when it sends
+a traceparent header). Inside it, every QueueStorage call on the global
+store, every QRZ lookup and every SSE broadcast gets a child span. Work
+handed to the registration intake worker carries the submitting request's
+trace context, so a registration accepted with 202 and committed later still
+shows up as one trace.
+
+Set TRACING_EXPORTER to turn tracing on:
+- otlp: send spans to OTEL_EXPORTER_OTLP_ENDPOINT (needs opentelemetry-exporter-otlp-proto-http)
+- console: print spans to stdout
+- file: append spans as JSON lines to TRACING_FILE (default traces.jsonl), for offline use
+
+opentelemetry-sdk is optional. Without it, or with TRACING_EXPORTER unset,
+span() is a shared no-op context manager.
+"""
+import os
+import functools
+import logging
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict
+from app.metrics import route_template
+
+try:
+    from opentelemetry import context as otel_context, propagate, trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+except ImportError:  # opentelemetry is optional; only needed for tracing
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+_NOOP = nullcontext()
+_tracer = None
+_provider = None
+
+
+def tracing_enabled() -> bool:
+    """Whether spans are being recorded"""
+    return _tracer is not None
+
+
+def create_exporter(kind: str):
+    """The span exporter for a TRACING_EXPORTER value"""
+    if kind == 'otlp':
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    if kind == 'file':
+        out = open(os.getenv('TRACING_FILE', 'traces.jsonl'), 'a')
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + os.linesep)
+    if kind == 'console':
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {kind!r} (expected otlp, console or file)")
+
+
+def configure_tracing(provider=None):
+    """
+    Start recording spans
+
+    Without a provider, one is built from TRACING_EXPORTER. Does nothing if
+    TRACING_EXPORTER isn't set or opentelemetry-sdk isn't installed.
+    """
+    global _tracer, _provider
+    if provider is None:
+        kind = os.getenv('TRACING_EXPORTER', '').lower()
+        if not kind:
+            return
+        if trace is None:
+            logger.warning("TRACING_EXPORTER is set but opentelemetry-sdk isn't installed; tracing is off")
+            return
+        try:
+            exporter = create_exporter(kind)
+        except (ImportError, ValueError) as e:
+            logger.error(f"Failed to set up the {kind} span exporter, tracing is off: {e}")
+            return
+        provider = TracerProvider(resource=Resource.create({
+            'service.name': os.getenv('OTEL_SERVICE_NAME', 'pileup-buster')
+        }))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        logger.info(f"Tracing with the {kind} exporter")
+    _provider = provider
+    _tracer = provider.get_tracer('pileup_buster')
+
+
+def flush_tracing():
+    """Export spans still waiting in the batch processor"""
+    if _provider is not None:
+        _provider.force_flush()
+
+
+def shutdown_tracing():
+    """Flush buffered spans and stop recording"""
+    global _tracer, _provider
+    if _provider is not None:
+        _provider.shutdown()
+    _tracer = _provider = None
+
+
+def span(name: str, **attributes):
+    """A context manager recording a span under the current one (a no-op while tracing is off)"""
+    if _tracer is None:
+        return _NOOP
+    return _tracer.start_as_current_span(
+        name, attributes={key: value for key, value in attributes.items() if value is not None}
+    )
+
+
+def capture_context():
+    """The current trace context, to continue the trace in work done later"""
+    return otel_context.get_current() if _tracer is not None else None
+
+
+@contextmanager
+def attached(trace_context):
+    """Make a context from capture_context() current for the block"""
+    if trace_context is None:
+        yield
+        return
+    token = otel_context.attach(trace_context)
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+
+def traced(name: str) -> Callable:
+    """Decorator recording a span around each call"""
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def span_storage(store):
+    """
+    Record a span for every public QueueStorage method call on a store
+
+    Returns a proxy (see app.database.StorageProxy), so the store's calls to
+    itself don't open nested spans. A no-op while tracing is off.
+    """
+    if _tracer is None:
+        return store
+    from app.database import storage_backend, wrap_storage
+
+    backend = storage_backend(store)
+    return wrap_storage(store, lambda name, method: traced(f'{backend}.{name}')(method))
+
+
+class TracingMiddleware:
+    """ASGI middleware recording a server span per request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Event streams stay open for hours; a span per stream would never finish
+        if scope['type'] != 'http' or _tracer is None or scope['path'].startswith('/api/events/stream'):
+            await self.app(scope, receive, send)
+            return
+
+        headers: Dict[str, Any] = {key.decode('latin-1'): value.decode('latin-1') for key, value in scope['headers']}
+        status = [500]
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        with attached(propagate.extract(headers)):
+            with _tracer.start_as_current_span(
+                f"{scope['method']} {scope['path']}", kind=trace.SpanKind.SERVER,
+                attributes={'http.request.method': scope['method'], 'url.path': scope['path']}
+            ) as request_span:
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    template = route_template(scope)
+                    request_span.update_name(f"{scope['method']} {template}")
+                    request_span.set_attribute('http.route', template)
+                    request_span.set_attribute('http.response.status_code', status[0])
+                    if status[0] >= 500:
+                        request_span.set_status(trace.Status(trace.StatusCode.ERROR))
+
+
+configure_tracing()
@@ -0,0 +1,55 @@
+"""State version helpers for conditional requests (If-Match / If-None-Match / ETag)"""
+from typing import Callable, Optional
+from fastapi import HTTPException
+from app.database import QueueStorage, T, VersionConflict
+
+
+def parse_version(header: Optional[str]) -> Optional[int]:
+    """Parse a state version from an If-Match or If-None-Match header value"""
+    if header is None:
+        return None
+    value = header.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    value = value.strip('"')
+    if not value.isdigit():
+        raise HTTPException(status_code=400, detail=f'Invalid state version: {header}')
+    return int(value)
+
+
+def version_etag(version: int) -> str:
+    """Format a state version as an ETag"""
+    return f'"{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], version: int) -> bool:
+    """Whether an If-None-Match header already names the current version"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    try:
+        return any(parse_version(tag) == version for tag in if_none_match.split(','))
+    except HTTPException:
+        return False
+
+
+def write_if_match(store: QueueStorage, if_match: Optional[str], write: Callable[[], T]) -> T:
+    """
+    Run an admin mutation under its If-Match precondition (unconditionally without one)
+
+    The check and the write go through store.write_if_version, so when two admins
+    send the same version only the first gets through and the version moves once;
+    the other gets 409 with the version it should reload.
+    """
+    expected = parse_version(if_match)
+    if expected is None:
+        return write()
+    try:
+        return store.write_if_version(expected, write)
+    except VersionConflict as e:
+        if e.current == e.expected:
+            detail = f'Another change to version {e.current} is in progress. Reload and retry.'
+        else:
+            detail = f'State has changed (version {e.current}, expected {e.expected}). Reload and retry.'
+        raise HTTPException(status_code=409, detail=detail, headers={'ETag': version_etag(e.current)})
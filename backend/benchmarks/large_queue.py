@@ -0,0 +1,131 @@
+"""
+Queue operation latency at different queue lengths
+
+Fills a storage backend to each queue length and times the operations behind a
+registration, a status check, the windowed views and an admin "next". The full
+listing is timed too, for comparison with the windowed views whose cost should
+stay flat as the queue grows.
+
+    python -m benchmarks.large_queue --backend memory --sizes 10 1000 10000
+
+--backend sqlite uses a temporary file. --backend mongo and --backend redis use
+MONGO_URI and RESET the queue on that server, so point them at a scratch instance.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+from app.database import QueueDatabase, QueueStorage, queue_settings
+from app.queue_window import queue_update_payload
+
+WINDOW_SIZE = 20
+NEIGHBORHOOD_RADIUS = 5
+
+
+def create_store(backend: str, workdir: str) -> QueueStorage:
+    """Create an empty, active store of the given kind"""
+    if backend == 'memory':
+        from app.engine import InMemoryQueueEngine
+        store = InMemoryQueueEngine(store=None)
+    elif backend == 'sqlite':
+        from app.sqlite_database import SQLiteQueueDatabase
+        store = SQLiteQueueDatabase(os.path.join(workdir, 'benchmark.db'))
+    elif backend == 'redis':
+        from app.redis_database import RedisQueueDatabase
+        store = RedisQueueDatabase()
+    else:
+        store = QueueDatabase()
+    store.reset(True, 'benchmark')
+    return store
+
+
+def benchmark_qrz_info(callsign: str) -> Dict[str, str]:
+    """QRZ information of a realistic size"""
+    return {
+        'callsign': callsign,
+        'name': 'Benchmark Operator',
+        'address': '1 Antenna Road, Newington, CT',
+        'dxcc_name': 'United States',
+        'image': f'https://example.com/images/{callsign.lower()}.jpg'
+    }
+
+
+def fill(store: QueueStorage, size: int) -> List[str]:
+    """Register size stations"""
+    callsigns = [f'W{i // 26 ** 2 % 10}{chr(65 + i // 26 % 26)}{chr(65 + i % 26)}{i // 6760}' for i in range(size)]
+    for callsign in callsigns:
+        store.register_callsign(callsign, benchmark_qrz_info(callsign))
+    return callsigns
+
+
+def time_operation(operation: Callable[[], None], iterations: int) -> Dict[str, float]:
+    """Run operation repeatedly and return p50/p95 latency in milliseconds"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50': statistics.median(samples),
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    }
+
+
+def run(backend: str, sizes: List[int], iterations: int) -> Dict[int, Dict[str, Dict[str, float]]]:
+    """Time each operation at each queue length"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            with patch.multiple(queue_settings, max_size=size + 1, window_size=WINDOW_SIZE):
+                store = create_store(backend, workdir)
+                callsigns = fill(store, size)
+                middle = callsigns[len(callsigns) // 2]
+
+                def register_and_remove():
+                    store.register_callsign('K1BENCH', benchmark_qrz_info('K1BENCH'))
+                    store.remove_callsign('K1BENCH')
+
+                def advance_and_requeue():
+                    # Keeps the queue at the same length: the promoted station re-registers at the back
+                    state = store.advance(include_queue=False)
+                    callsign = state['current_qso']['callsign']
+                    store.register_callsign(callsign, benchmark_qrz_info(callsign))
+
+                operations = {
+                    'register+remove': register_and_remove,
+                    'status (find_callsign)': lambda: store.find_callsign(middle),
+                    'window (top 20)': lambda: store.get_queue_list(limit=WINDOW_SIZE),
+                    'neighborhood (+-5)': lambda: store.get_neighborhood(middle, NEIGHBORHOOD_RADIUS),
+                    'queue_update payload': lambda: queue_update_payload(store),
+                    'advance+requeue': advance_and_requeue,
+                    'full list': store.get_queue_list,
+                }
+                results[size] = {name: time_operation(op, iterations) for name, op in operations.items()}
+                store.reset(False, 'benchmark')
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Queue operation latency at different queue lengths')
+    parser.add_argument('--backend', choices=['memory', 'sqlite', 'mongo', 'redis'], default='memory')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    results = run(args.backend, args.sizes, args.iterations)
+
+    names = list(next(iter(results.values())))
+    print(f'{args.backend} backend, p50 / p95 latency in ms')
+    print(f"{'operation':<24}" + ''.join(f'{size:>20}' for size in args.sizes))
+    for name in names:
+        cells = ''.join(f"{results[size][name]['p50']:>10.3f} /{results[size][name]['p95']:>7.3f}" for size in args.sizes)
+        print(f'{name:<24}{cells}')
+
+
+if __name__ == '__main__':
+    main()
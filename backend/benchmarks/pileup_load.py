@@ -0,0 +1,373 @@
+"""
+End-to-end pileup load test
+
+Starts the QRZ stand-in and a backend server, then simulates a pileup against
+them over HTTP:
+- SSE listeners hold /api/events/stream open and time every event from its
+  timestamp (when the server created it) to its arrival (delivery lag)
+- stations register in bursts, then poll /api/queue/status/{callsign} until
+  they have been worked
+- an admin calls /api/admin/queue/next at contest rate
+
+and reports throughput, p50/p99 latency and errors per endpoint, plus the
+event delivery lag.
+
+    python -m benchmarks.pileup_load --backend memory --listeners 2000 --stations 1000 --duration 60
+
+The backend runs in its own uvicorn process so the load generator doesn't
+share its event loop. --backend memory uses the in-memory engine (persisting
+to MONGO_URI if a mongod answers there, volatile otherwise), --backend sqlite a
+temporary file. --backend mongo and --backend redis use MONGO_URI and the test
+activates the system, which CLEARS the queue, so point them at a scratch
+instance. Pass server settings with --env, e.g. --env REGISTRATION_INTAKE=true.
+
+--url targets a backend that is already running instead; give its admin
+credentials with --admin-user/--admin-password. Thousands of listeners need
+a matching open-file limit (ulimit -n) on both sides.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.qrz_standin import QRZStandinConfig, QRZStandinServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SSE_ENDPOINT = 'GET /api/events/stream'
+
+
+class PileupScenario:
+    """Shape of the simulated pileup"""
+
+    def __init__(
+        self,
+        listeners: int = 500,
+        stations: int = 200,
+        burst_size: int = 50,
+        burst_interval: float = 5.0,
+        poll_interval: float = 10.0,
+        next_interval: float = 2.0,
+        duration: float = 60.0,
+        seed: Optional[int] = None
+    ):
+        self.listeners = listeners
+        self.stations = stations
+        self.burst_size = burst_size
+        self.burst_interval = burst_interval
+        self.poll_interval = poll_interval
+        self.next_interval = next_interval
+        self.duration = duration
+        self.random = random.Random(seed)
+
+
+def pileup_callsigns(count: int) -> List[str]:
+    """Distinct valid callsigns (K1AAA, K2AAA, ...)"""
+    return [f'K{i % 10}{chr(65 + i // 10 // 676 % 26)}{chr(65 + i // 10 // 26 % 26)}{chr(65 + i // 10 % 26)}'
+            for i in range(count)]
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """The given percentile of unsorted samples (0.0 when there are none)"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoadReport:
+    """Latencies and status codes per endpoint, plus SSE delivery lag"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.lags: List[float] = []
+        self.events: Counter = Counter()
+        self.worked = 0
+
+    def record(self, endpoint: str, seconds: float, status: Any):
+        """Record one request; status is the HTTP status or the exception's name"""
+        self.latencies[endpoint].append(seconds)
+        self.statuses[endpoint][status] += 1
+
+    def record_event(self, event_type: str, data: str, received: float):
+        """Record an SSE event, with its delivery lag when it carries a timestamp"""
+        self.events[event_type] += 1
+        try:
+            created = datetime.fromisoformat(json.loads(data)['timestamp']).timestamp()
+        except (ValueError, KeyError, TypeError):
+            return  # connected/keepalive frames carry no timestamp
+        self.lags.append(received - created)
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        """Throughput, p50/p99 latency in ms and errors per endpoint, and the delivery lag"""
+        endpoints = {}
+        for endpoint, samples in sorted(self.latencies.items()):
+            statuses = self.statuses[endpoint]
+            endpoints[endpoint] = {
+                'requests': len(samples),
+                'per_second': len(samples) / elapsed if elapsed else 0.0,
+                'p50_ms': percentile(samples, 0.50) * 1000,
+                'p99_ms': percentile(samples, 0.99) * 1000,
+                'errors': sum(count for status, count in statuses.items()
+                              if not isinstance(status, int) or status >= 500),
+                'statuses': {str(status): count for status, count in statuses.items()}
+            }
+        return {
+            'elapsed_seconds': elapsed,
+            'endpoints': endpoints,
+            'events': dict(self.events),
+            'delivery_lag': {
+                'events': len(self.lags),
+                'p50_ms': percentile(self.lags, 0.50) * 1000,
+                'p99_ms': percentile(self.lags, 0.99) * 1000,
+                'max_ms': max(self.lags, default=0.0) * 1000
+            },
+            'stations_worked': self.worked
+        }
+
+
+async def timed(report: LoadReport, client: httpx.AsyncClient, endpoint: str, method: str, url: str,
+                **kwargs) -> Optional[httpx.Response]:
+    """Make a request, recording its latency under endpoint; None if it failed outright"""
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.HTTPError as e:
+        report.record(endpoint, time.perf_counter() - start, type(e).__name__)
+        return None
+    report.record(endpoint, time.perf_counter() - start, response.status_code)
+    return response
+
+
+async def listen(report: LoadReport, client: httpx.AsyncClient, ready: asyncio.Future):
+    """Hold an event stream open and record every event that arrives; ready is set once connected"""
+    start = time.perf_counter()
+    try:
+        async with client.stream('GET', '/api/events/stream', timeout=httpx.Timeout(10.0, read=None)) as response:
+            report.record(SSE_ENDPOINT, time.perf_counter() - start, response.status_code)
+            if response.status_code != 200:
+                return
+            event_type, data = None, ''
+            async for line in response.aiter_lines():
+                if line.startswith('event: '):
+                    event_type = line[7:]
+                elif line.startswith('data: '):
+                    data = line[6:]
+                elif not line and event_type:
+                    report.record_event(event_type, data, time.time())
+                    if not ready.done():
+                        ready.set_result(True)
+                    event_type, data = None, ''
+    except httpx.HTTPError as e:
+        report.record(SSE_ENDPOINT, time.perf_counter() - start, type(e).__name__)
+    finally:
+        if not ready.done():
+            ready.set_result(False)
+
+
+async def station(report: LoadReport, client: httpx.AsyncClient, callsign: str, scenario: PileupScenario):
+    """Register, then poll the queue position until worked"""
+    response = await timed(report, client, 'POST /api/queue/register', 'POST', '/api/queue/register',
+                           json={'callsign': callsign})
+    if response is None or response.status_code not in (200, 202):
+        return
+    # Stations don't all poll in step
+    await asyncio.sleep(scenario.random.uniform(0, scenario.poll_interval))
+    while True:
+        response = await timed(report, client, 'GET /api/queue/status/{callsign}', 'GET',
+                               f'/api/queue/status/{callsign}')
+        if response is not None and response.status_code == 404:
+            report.worked += 1
+            return
+        await asyncio.sleep(scenario.poll_interval)
+
+
+async def register_bursts(report: LoadReport, client: httpx.AsyncClient, scenario: PileupScenario,
+                          tasks: List[asyncio.Task]):
+    """Start the stations burst by burst"""
+    callsigns = pileup_callsigns(scenario.stations)
+    for first in range(0, len(callsigns), scenario.burst_size):
+        for callsign in callsigns[first:first + scenario.burst_size]:
+            tasks.append(asyncio.create_task(station(report, client, callsign, scenario)))
+        await asyncio.sleep(scenario.burst_interval)
+
+
+async def work_stations(report: LoadReport, client: httpx.AsyncClient, scenario: PileupScenario,
+                        auth: Tuple[str, str]):
+    """Advance to the next station at contest rate"""
+    while True:
+        await asyncio.sleep(scenario.next_interval)
+        await timed(report, client, 'POST /api/admin/queue/next', 'POST', '/api/admin/queue/next', auth=auth)
+
+
+async def run_load(base_url: str, scenario: PileupScenario, auth: Tuple[str, str]) -> Dict[str, Any]:
+    """Activate the system (clearing the queue), run the scenario and return the report summary"""
+    report = LoadReport()
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client, \
+            httpx.AsyncClient(base_url=base_url, limits=limits) as streams:
+        response = await client.post('/api/admin/status', json={'active': True}, auth=auth)
+        response.raise_for_status()
+
+        # Every listener is connected (or has failed to) before the pileup starts
+        loop = asyncio.get_running_loop()
+        ready = [loop.create_future() for _ in range(scenario.listeners)]
+        listeners = [asyncio.create_task(listen(report, streams, future)) for future in ready]
+        if ready:
+            await asyncio.wait(ready, timeout=60.0)
+        stations: List[asyncio.Task] = []
+        drivers = [
+            asyncio.create_task(register_bursts(report, client, scenario, stations)),
+            asyncio.create_task(work_stations(report, client, scenario, auth))
+        ]
+        started = time.perf_counter()
+        await asyncio.sleep(scenario.duration)
+        elapsed = time.perf_counter() - started
+
+        tasks = drivers + stations + listeners
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return report.summary(elapsed)
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class BackendProcess:
+    """Run the backend under uvicorn in a child process"""
+
+    def __init__(self, env: Dict[str, str], port: int = 0):
+        self.port = port or _free_port()
+        self.env = {**os.environ, **env}
+        self._process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self, timeout: float = 30.0) -> 'BackendProcess':
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'app.app:app', '--host', '127.0.0.1', '--port', str(self.port),
+             '--log-level', 'warning'],
+            cwd=BACKEND_DIR, env=self.env
+        )
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                if httpx.get(f'{self.url}/api/queue/status', timeout=1.0).status_code == 200:
+                    return self
+            except httpx.HTTPError:
+                pass
+            if self._process.poll() is not None or time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError('Backend failed to start')
+            time.sleep(0.2)
+
+    def stop(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10.0)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+
+    def __enter__(self) -> 'BackendProcess':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def backend_env(backend: str, workdir: str, qrz_url: str, auth: Tuple[str, str], queue_size: int) -> Dict[str, str]:
+    """Environment for a backend process using the given storage and the QRZ stand-in"""
+    env = {
+        'ADMIN_USERNAME': auth[0],
+        'ADMIN_PASSWORD': auth[1],
+        'QRZ_API_URL': qrz_url,
+        'QRZ_USERNAME': 'standin',
+        'QRZ_PASSWORD': 'standin',
+        'MAX_QUEUE_SIZE': str(queue_size)
+    }
+    if backend == 'memory':
+        env['QUEUE_ENGINE'] = 'memory'
+    elif backend == 'sqlite':
+        env['MONGO_URI'] = f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    return env
+
+
+def print_report(summary: Dict[str, Any]):
+    print(f"{summary['elapsed_seconds']:.0f}s, {summary['stations_worked']} stations worked")
+    print(f"{'endpoint':<36}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for endpoint, stats in summary['endpoints'].items():
+        print(f"{endpoint:<36}{stats['requests']:>10}{stats['per_second']:>10.1f}"
+              f"{stats['p50_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['errors']:>8}")
+    lag = summary['delivery_lag']
+    print(f"delivery lag over {lag['events']} events: p50 {lag['p50_ms']:.1f} ms, "
+          f"p99 {lag['p99_ms']:.1f} ms, max {lag['max_ms']:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end pileup load test')
+    parser.add_argument('--backend', choices=['memory', 'sqlite', 'mongo', 'redis'], default='memory')
+    parser.add_argument('--url', help='Load an already running backend instead of starting one')
+    parser.add_argument('--admin-user', default='loadtest')
+    parser.add_argument('--admin-password', default='loadtest')
+    parser.add_argument('--listeners', type=int, default=500, help='Open SSE streams')
+    parser.add_argument('--stations', type=int, default=200, help='Stations registering over the run')
+    parser.add_argument('--burst-size', type=int, default=50)
+    parser.add_argument('--burst-interval', type=float, default=5.0, help='Seconds between registration bursts')
+    parser.add_argument('--poll-interval', type=float, default=10.0, help='Seconds between status polls per station')
+    parser.add_argument('--next-interval', type=float, default=2.0, help='Seconds per QSO')
+    parser.add_argument('--duration', type=float, default=60.0)
+    parser.add_argument('--qrz-latency', type=float, default=0.15, help='QRZ stand-in latency in seconds')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra setting for the started backend (repeatable)')
+    parser.add_argument('--json', help='Also write the report to this file')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    auth = (args.admin_user, args.admin_password)
+    scenario = PileupScenario(
+        listeners=args.listeners,
+        stations=args.stations,
+        burst_size=args.burst_size,
+        burst_interval=args.burst_interval,
+        poll_interval=args.poll_interval,
+        next_interval=args.next_interval,
+        duration=args.duration,
+        seed=args.seed
+    )
+
+    if args.url:
+        summary = asyncio.run(run_load(args.url, scenario, auth))
+    else:
+        with tempfile.TemporaryDirectory() as workdir, \
+                QRZStandinServer(QRZStandinConfig(latency=args.qrz_latency, seed=args.seed)) as qrz:
+            env = backend_env(args.backend, workdir, qrz.url, auth, args.stations + 10)
+            env.update(setting.split('=', 1) for setting in args.env)
+            with BackendProcess(env) as backend:
+                summary = asyncio.run(run_load(backend.url, scenario, auth))
+
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(summary, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
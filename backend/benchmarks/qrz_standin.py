@@ -0,0 +1,245 @@
+"""
+Local stand-in for the QRZ.com XML API
+
+Serves the subset of the XML interface used by callsignlookuptools (login,
+session check and callsign search) with configurable latency, error rate and
+session expiry, so the registration path can be exercised offline.
+
+Run as a localhost server:
+
+    python -m benchmarks.qrz_standin --port 8100 --latency 0.15 --error-rate 0.02
+
+and point the backend at it with QRZ_API_URL=http://127.0.0.1:8100/xml/current/
+(any QRZ_USERNAME/QRZ_PASSWORD pair is accepted).
+"""
+import argparse
+import asyncio
+import random
+import secrets
+import socket
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+from xml.sax.saxutils import escape
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+from app.services.dxcc import dxcc_resolver
+
+XML_NAMESPACE = "http://xmldata.qrz.com"
+
+FIRST_NAMES = ['John', 'Mary', 'Sean', 'Aoife', 'Hans', 'Yuki', 'Carlos', 'Priya', 'Olga', 'Ahmed']
+LAST_NAMES = ['Smith', 'Murphy', 'Keating', 'Schmidt', 'Tanaka', 'Garcia', 'Patel', 'Ivanova', 'Hassan', 'Brown']
+
+
+class QRZStandinConfig:
+    """Behaviour knobs for the stand-in server"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        session_ttl: float = 3600.0,
+        not_found: Optional[set] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_ttl = session_ttl
+        self.not_found = {callsign.upper() for callsign in (not_found or set())}
+        self.random = random.Random(seed)
+
+
+def _xml(body: str) -> Response:
+    content = f'<?xml version="1.0" encoding="utf-8" ?>\n<QRZDatabase version="1.34" xmlns="{XML_NAMESPACE}">{body}</QRZDatabase>'
+    return Response(content=content, media_type="text/xml")
+
+
+def _session_xml(key: Optional[str] = None, error: Optional[str] = None) -> str:
+    parts = []
+    if error:
+        parts.append(f"<Error>{escape(error)}</Error>")
+    if key:
+        parts.append(f"<Key>{key}</Key>")
+    parts.append(f"<GMTime>{time.strftime('%a %b %d %H:%M:%S %Y', time.gmtime())}</GMTime>")
+    return f"<Session>{''.join(parts)}</Session>"
+
+
+def build_png(callsign: str, width: int = 640, height: int = 480) -> bytes:
+    """Solid-colour PNG standing in for a QRZ profile photo"""
+    seed = sum(ord(char) for char in callsign)
+    pixel = bytes(((seed * 37) % 256, (seed * 73) % 256, (seed * 131) % 256))
+    raw = (b'\x00' + pixel * width) * height
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b'')
+
+
+def build_profile(callsign: str, image_base: str = 'http://127.0.0.1:8100/') -> Dict[str, str]:
+    """Deterministic synthetic QRZ profile for a callsign"""
+    seed = sum(ord(char) * (index + 1) for index, char in enumerate(callsign))
+    first = FIRST_NAMES[seed % len(FIRST_NAMES)]
+    last = LAST_NAMES[(seed // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    entity = dxcc_resolver.lookup(callsign) or {}
+
+    profile = {
+        'call': callsign,
+        'fname': first,
+        'name': last,
+        'name_fmt': f'{first} {last}',
+        'addr1': f'{seed % 900 + 100} Main Street',
+        'addr2': 'Springfield',
+        'country': entity.get('entity', 'Unknown'),
+        'image': f'{image_base}images/{callsign.lower()}.png',
+    }
+    if entity:
+        profile['land'] = entity['entity']
+        profile['cqzone'] = str(entity['cq_zone'])
+        profile['ituzone'] = str(entity['itu_zone'])
+    return profile
+
+
+def create_qrz_standin_app(config: Optional[QRZStandinConfig] = None) -> FastAPI:
+    """Create the ASGI app emulating https://xmldata.qrz.com/xml/current/"""
+    config = config or QRZStandinConfig()
+    app = FastAPI(title="QRZ XML API stand-in")
+    app.state.config = config
+    app.state.sessions = {}
+    app.state.stats = {'logins': 0, 'session_checks': 0, 'searches': 0, 'images': 0, 'images_not_modified': 0, 'injected_errors': 0}
+
+    @app.get('/xml/current/')
+    async def xml_api(request: Request):
+        params = request.query_params
+        sessions = app.state.sessions
+        stats = app.state.stats
+
+        delay = config.latency + (config.random.uniform(0, config.jitter) if config.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if config.error_rate and config.random.random() < config.error_rate:
+            stats['injected_errors'] += 1
+            return Response(content="Service Unavailable", status_code=503)
+
+        # Login
+        if 'username' in params:
+            stats['logins'] += 1
+            if not params.get('password'):
+                return _xml(_session_xml(error='Username/password incorrect'))
+            key = secrets.token_hex(16)
+            sessions[key] = time.monotonic() + config.session_ttl
+            return _xml(_session_xml(key=key))
+
+        key = params.get('s', '')
+        expires = sessions.get(key)
+        if expires is None or expires < time.monotonic():
+            sessions.pop(key, None)
+            return _xml(_session_xml(error='Session Timeout'))
+
+        callsign = params.get('callsign')
+        if callsign is None:
+            stats['session_checks'] += 1
+            return _xml(_session_xml(key=key))
+
+        stats['searches'] += 1
+        callsign = callsign.upper()
+        if callsign in config.not_found:
+            return _xml(_session_xml(key=key, error=f'Not found: {callsign}'))
+
+        profile = build_profile(callsign, image_base=str(request.base_url))
+        fields = ''.join(f'<{name}>{escape(value)}</{name}>' for name, value in profile.items())
+        return _xml(f'<Callsign>{fields}</Callsign>{_session_xml(key=key)}')
+
+    @app.get('/images/{filename}')
+    async def profile_image(filename: str, request: Request):
+        callsign = filename.rsplit('.', 1)[0].upper()
+        app.state.stats['images'] += 1
+        etag = f'"{callsign}"'
+        if request.headers.get('if-none-match') == etag:
+            app.state.stats['images_not_modified'] += 1
+            return Response(status_code=304, headers={'ETag': etag})
+        return Response(content=build_png(callsign), media_type='image/png', headers={'ETag': etag})
+
+    return app
+
+
+class QRZStandinServer:
+    """Run the stand-in on a localhost port in a background thread"""
+
+    def __init__(self, config: Optional[QRZStandinConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.app = create_qrz_standin_app(config)
+        self.host = host
+        self.port = port or self._free_port(host)
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=self.host, port=self.port, log_level='warning'))
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to use as QRZ_API_URL"""
+        return f'http://{self.host}:{self.port}/xml/current/'
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return self.app.state.stats
+
+    def start(self, timeout: float = 5.0) -> 'QRZStandinServer':
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError('QRZ stand-in failed to start')
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    def __enter__(self) -> 'QRZStandinServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @staticmethod
+    def _free_port(host: str) -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind((host, 0))
+            return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local QRZ.com XML API stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', type=float, default=0.0, help='Base response latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Extra uniform random latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 503')
+    parser.add_argument('--session-ttl', type=float, default=3600.0, help='Session key lifetime in seconds')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    config = QRZStandinConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        session_ttl=args.session_ttl,
+        seed=args.seed
+    )
+    print(f'QRZ stand-in listening on http://{args.host}:{args.port}/xml/current/')
+    uvicorn.run(create_qrz_standin_app(config), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
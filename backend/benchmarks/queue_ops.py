@@ -0,0 +1,245 @@
+"""
+Microbenchmarks for every QueueStorage method at several queue lengths
+
+Each method is timed on a store filled to each queue length, with untimed
+setup and cleanup around the call so the queue keeps its length (a timed
+register is followed by an untimed remove, and so on). Methods that empty the
+queue (clear_queue, reset, set_system_status) refill it between their fewer
+runs.
+
+    python -m benchmarks.queue_ops --backend mongomock --sizes 10 1000 --json results.json
+    python -m benchmarks.queue_ops --backend mongomock --sizes 10 1000 --baseline results.json
+
+--baseline compares p50 latencies against an earlier --json file and exits
+with status 1 if any method got slower by more than --tolerance (a fraction,
+0.25 by default) and by more than --floor-ms, so a data-layer change can come
+with its numbers. Compare runs made on the same machine.
+
+--backend mongomock runs the MongoDB code against mongomock's in-memory
+stand-in (needs the mongomock package). --backend mongo and --backend redis
+use MONGO_URI and RESET the queue on that server, so point them at a scratch
+instance.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from unittest.mock import patch
+
+from app.database import QueueDatabase, QueueStorage, queue_settings
+from benchmarks.large_queue import benchmark_qrz_info, create_store, fill
+
+NEIGHBORHOOD_RADIUS = 5
+WINDOW_SIZE = 20
+# Methods that clear the queue are refilled before every run, so they get fewer runs
+DESTRUCTIVE_ITERATIONS = 5
+
+# (timed call, untimed setup before it, untimed cleanup after it)
+Operation = Tuple[Callable[[], Any], Optional[Callable[[], Any]], Optional[Callable[[], Any]]]
+
+
+def create_benchmark_store(backend: str, workdir: str) -> QueueStorage:
+    """Create an empty, active store; mongomock runs QueueDatabase on an in-memory MongoDB"""
+    if backend == 'mongomock':
+        import mongomock
+        with patch('app.database.MongoClient', mongomock.MongoClient):
+            store = QueueDatabase()
+        store.reset(True, 'benchmark')
+        return store
+    return create_store(backend, workdir)
+
+
+def time_calls(operation: Operation, iterations: int) -> Dict[str, float]:
+    """Time the call of an operation repeatedly; p50/p95/mean latency in milliseconds"""
+    call, before, after = operation
+    samples = []
+    for _ in range(iterations):
+        if before:
+            before()
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+        if after:
+            after()
+    samples.sort()
+    return {
+        'p50': statistics.median(samples),
+        'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        'mean': statistics.fmean(samples)
+    }
+
+
+def queue_operations(store: QueueStorage, callsigns: List[str]) -> Dict[str, Operation]:
+    """The operations to time on a filled store, keyed by method (and variant)"""
+    middle = callsigns[len(callsigns) // 2]
+    info = benchmark_qrz_info('K1BENCH')
+    last = {}
+
+    def remember(entry):
+        # advance() returns the state with the promoted entry under current_qso
+        last['entry'] = entry.get('current_qso') if entry and 'current_qso' in entry else entry
+
+    def requeue():
+        # The station taken off the front goes back on the end, keeping the length
+        if last.get('entry'):
+            callsign = last['entry']['callsign']
+            store.register_callsign(callsign, benchmark_qrz_info(callsign))
+
+    return {
+        'register_callsign': (lambda: store.register_callsign('K1BENCH', info),
+                              None, lambda: store.remove_callsign('K1BENCH')),
+        'register_callsign (include_queue)': (lambda: store.register_callsign('K1BENCH', info, include_queue=True),
+                                              None, lambda: store.remove_callsign('K1BENCH')),
+        'remove_callsign': (lambda: store.remove_callsign('K1BENCH'),
+                            lambda: store.register_callsign('K1BENCH', info), None),
+        'find_callsign': (lambda: store.find_callsign(middle), None, None),
+        'get_queue_list': (store.get_queue_list, None, None),
+        'get_queue_list (window)': (lambda: store.get_queue_list(limit=WINDOW_SIZE), None, None),
+        'get_neighborhood': (lambda: store.get_neighborhood(middle, NEIGHBORHOOD_RADIUS), None, None),
+        'get_queue_count': (store.get_queue_count, None, None),
+        'get_next_callsign': (lambda: remember(store.get_next_callsign()), None, requeue),
+        'advance': (lambda: remember(store.advance(include_queue=False)), None, requeue),
+        'advance (include_queue)': (lambda: remember(store.advance()), None, requeue),
+        'get_current_qso': (store.get_current_qso, None, None),
+        'set_current_qso': (lambda: store.set_current_qso('K1BENCH', info), None, None),
+        'clear_current_qso': (store.clear_current_qso, lambda: store.set_current_qso('K1BENCH', info), None),
+        'get_system_status': (store.get_system_status, None, None),
+        'is_system_active': (store.is_system_active, None, None),
+        'get_frequency': (store.get_frequency, None, None),
+        'set_frequency': (lambda: store.set_frequency('14.025', 'benchmark'), None, None),
+        'clear_frequency': (lambda: store.clear_frequency('benchmark'), None, None),
+        'get_split': (store.get_split, None, None),
+        'set_split': (lambda: store.set_split('UP 5', 'benchmark'), None, None),
+        'clear_split': (lambda: store.clear_split('benchmark'), None, None),
+        'get_state_version': (store.get_state_version, None, None),
+        'claim_version': (lambda: store.claim_version(store.get_state_version()), None,
+                          lambda: store.release_version(store.get_state_version())),
+        'release_version': (lambda: store.release_version(store.get_state_version()),
+                            lambda: store.claim_version(store.get_state_version()), None),
+        'write_if_version': (lambda: store.write_if_version(store.get_state_version(), lambda: store.set_split('UP 5', 'benchmark')),
+                             None, None),
+    }
+
+
+def destructive_operations(store: QueueStorage, callsigns: List[str]) -> Dict[str, Operation]:
+    """Operations that empty the queue; each run starts from a refilled store"""
+    def refill():
+        store.reset(True, 'benchmark')
+        fill(store, len(callsigns))
+
+    return {
+        'clear_queue': (store.clear_queue, refill, None),
+        'reset': (lambda: store.reset(True, 'benchmark'), refill, None),
+        'set_system_status': (lambda: store.set_system_status(True, 'benchmark'), refill, None),
+    }
+
+
+def run(backend: str, sizes: List[int], iterations: int) -> Dict[str, Any]:
+    """Time every operation at every queue length; the result is what --json writes"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        store = create_benchmark_store(backend, workdir)
+        for size in sizes:
+            with patch.object(queue_settings, 'max_size', size + 2):
+                store.reset(True, 'benchmark')
+                callsigns = fill(store, size)
+                timings = {name: time_calls(op, iterations) for name, op in queue_operations(store, callsigns).items()}
+                for name, op in destructive_operations(store, callsigns).items():
+                    timings[name] = time_calls(op, min(iterations, DESTRUCTIVE_ITERATIONS))
+                results[str(size)] = timings
+        store.reset(False, 'benchmark')
+    return {
+        'backend': backend,
+        'iterations': iterations,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'results': results
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25,
+            floor_ms: float = 0.05) -> List[Dict[str, Any]]:
+    """
+    p50 changes against a baseline run, for every method and size the two runs share
+
+    A change is a regression when the p50 grew by more than tolerance (a fraction
+    of the baseline) and by more than floor_ms, which keeps noise on sub-0.1 ms
+    calls from being flagged.
+    """
+    changes = []
+    for size, timings in current['results'].items():
+        for name, timing in timings.items():
+            before = baseline['results'].get(size, {}).get(name)
+            if before is None:
+                continue
+            delta = timing['p50'] - before['p50']
+            ratio = delta / before['p50'] if before['p50'] else 0.0
+            changes.append({
+                'size': size,
+                'operation': name,
+                'baseline_p50': before['p50'],
+                'p50': timing['p50'],
+                'change': ratio,
+                'regression': ratio > tolerance and delta > floor_ms
+            })
+    return changes
+
+
+def print_results(run_results: Dict[str, Any]):
+    sizes = list(run_results['results'])
+    names = list(run_results['results'][sizes[0]])
+    print(f"{run_results['backend']} backend, p50 / p95 latency in ms")
+    print(f"{'operation':<36}" + ''.join(f'{size:>20}' for size in sizes))
+    for name in names:
+        cells = ''.join(f"{run_results['results'][size][name]['p50']:>10.3f} /{run_results['results'][size][name]['p95']:>7.3f}"
+                        for size in sizes)
+        print(f'{name:<36}{cells}')
+
+
+def print_comparison(changes: List[Dict[str, Any]]):
+    print(f"{'operation':<36}{'size':>8}{'baseline':>12}{'p50':>12}{'change':>10}")
+    for change in changes:
+        flag = '  REGRESSION' if change['regression'] else ''
+        print(f"{change['operation']:<36}{change['size']:>8}{change['baseline_p50']:>12.3f}"
+              f"{change['p50']:>12.3f}{change['change']:>+10.1%}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for every queue storage method')
+    parser.add_argument('--backend', choices=['mongomock', 'memory', 'sqlite', 'mongo', 'redis'], default='mongomock')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--baseline', help='Compare against results written earlier with --json')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed p50 slowdown as a fraction')
+    parser.add_argument('--floor-ms', type=float, default=0.05, help='Ignore p50 slowdowns smaller than this')
+    args = parser.parse_args()
+
+    results = run(args.backend, args.sizes, args.iterations)
+    print_results(results)
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as source:
+            baseline = json.load(source)
+        if baseline.get('backend') != results['backend']:
+            print(f"Warning: the baseline was run on the {baseline.get('backend')} backend")
+        changes = compare(results, baseline, args.tolerance, args.floor_ms)
+        print()
+        print_comparison(changes)
+        regressions = [change for change in changes if change['regression']]
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) over {args.tolerance:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
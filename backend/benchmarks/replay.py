@@ -0,0 +1,151 @@
+"""
+Replay a traffic recording against a local instance, optionally time-compressed
+
+Takes a file written with TRAFFIC_RECORD_FILE (see app/recorder.py) and
+re-issues every recorded call and SSE connect/disconnect at its recorded
+offset divided by --speed, so a real activation (say, the pileup after a
+spot) can be replayed at 1x, 10x or 100x as a repeatable benchmark:
+
+    python -m benchmarks.replay activation.jsonl.gz --speed 10 --backend memory
+
+Like benchmarks.pileup_load, it starts the QRZ stand-in and a backend process
+unless --url points at a running instance, and reports throughput, p50/p99
+latency and errors per route plus the event delivery lag over the replayed
+streams. Recorded admin calls are sent with --admin-user/--admin-password.
+Each recorded client is sent from its own X-Forwarded-For address, so
+per-client admission control sees the recorded clients when the target runs
+with TRUST_PROXY_HEADERS=true.
+
+Polling (GET) isn't recorded; add it with --poll-interval, which has every
+registered station poll its status as in benchmarks.pileup_load.
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from app.recorder import read_traffic
+from benchmarks.pileup_load import (
+    BackendProcess, LoadReport, PileupScenario, backend_env, listen, print_report, station, timed
+)
+from benchmarks.qrz_standin import QRZStandinConfig, QRZStandinServer
+
+
+def client_address(key: str) -> str:
+    """A private address standing in for a recorded client"""
+    value = int(key, 16)
+    return f'10.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}'
+
+
+def load_recording(path: str) -> List[Dict[str, Any]]:
+    """The records of a recording in time order"""
+    return sorted(read_traffic(path), key=lambda record: record['t'])
+
+
+def registered_callsign(record: Dict[str, Any]) -> Optional[str]:
+    """The callsign of a recorded registration that succeeded"""
+    if record.get('r') != '/api/queue/register' or record.get('s') not in (200, 202):
+        return None
+    try:
+        return json.loads(record.get('b') or '{}').get('callsign')
+    except ValueError:
+        return None
+
+
+async def replay(base_url: str, records: List[Dict[str, Any]], speed: float, auth: Tuple[str, str],
+                 poll_interval: Optional[float] = None, drain: float = 1.0) -> Dict[str, Any]:
+    """Re-issue the records at speed times their recorded pace and return the report summary"""
+    report = LoadReport()
+    loop = asyncio.get_running_loop()
+    streams: Dict[int, asyncio.Task] = {}
+    tasks: List[asyncio.Task] = []
+    scenario = PileupScenario(poll_interval=poll_interval or 0.0)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client, \
+            httpx.AsyncClient(base_url=base_url, limits=limits) as stream_client:
+
+        async def request(record: Dict[str, Any]):
+            headers = {'X-Forwarded-For': client_address(record['c'])} if 'c' in record else {}
+            if 'b' in record:
+                headers['Content-Type'] = 'application/json'
+            url = record['p'] + (f"?{record['q']}" if record.get('q') else '')
+            await timed(report, client, f"{record['m']} {record.get('r', record['p'])}", record['m'], url,
+                        content=record.get('b'), headers=headers, auth=auth if record.get('a') else None)
+
+        started = time.perf_counter()
+        for record in records:
+            delay = record['t'] / speed - (time.perf_counter() - started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            event = record.get('e')
+            if event == 'open':
+                streams[record['id']] = asyncio.create_task(listen(report, stream_client, loop.create_future()))
+            elif event == 'close':
+                stream = streams.pop(record['id'], None)  # Streams opened before recording began are skipped
+                if stream is not None:
+                    stream.cancel()
+            elif poll_interval and registered_callsign(record):
+                tasks.append(asyncio.create_task(station(report, client, registered_callsign(record), scenario)))
+            else:
+                tasks.append(asyncio.create_task(request(record)))
+
+        await asyncio.sleep(drain)
+        elapsed = time.perf_counter() - started
+        pending = tasks + list(streams.values())
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return report.summary(elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a traffic recording, optionally time-compressed')
+    parser.add_argument('recording', help='File written with TRAFFIC_RECORD_FILE')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed-up (e.g. 10 or 100)')
+    parser.add_argument('--backend', choices=['memory', 'sqlite', 'mongo', 'redis'], default='memory')
+    parser.add_argument('--url', help='Replay against an already running backend instead of starting one')
+    parser.add_argument('--admin-user', default='loadtest')
+    parser.add_argument('--admin-password', default='loadtest')
+    parser.add_argument('--poll-interval', type=float, default=None,
+                        help='Have registered stations poll their status this often (seconds, replay time)')
+    parser.add_argument('--activate', action='store_true', help='Activate the system (clearing the queue) first')
+    parser.add_argument('--qrz-latency', type=float, default=0.15, help='QRZ stand-in latency in seconds')
+    parser.add_argument('--env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra setting for the started backend (repeatable)')
+    parser.add_argument('--json', help='Also write the report to this file')
+    args = parser.parse_args()
+
+    auth = (args.admin_user, args.admin_password)
+    records = load_recording(args.recording)
+    registrations = sum(1 for record in records if record.get('r') == '/api/queue/register')
+    print(f"{len(records)} records over {records[-1]['t'] if records else 0:.0f}s, replaying at {args.speed:g}x")
+
+    async def run(base_url: str) -> Dict[str, Any]:
+        if args.activate:
+            async with httpx.AsyncClient(base_url=base_url) as client:
+                (await client.post('/api/admin/status', json={'active': True}, auth=auth)).raise_for_status()
+        return await replay(base_url, records, args.speed, auth, args.poll_interval)
+
+    if args.url:
+        summary = asyncio.run(run(args.url))
+    else:
+        with tempfile.TemporaryDirectory() as workdir, \
+                QRZStandinServer(QRZStandinConfig(latency=args.qrz_latency)) as qrz:
+            env = backend_env(args.backend, workdir, qrz.url, auth, registrations + 10)
+            env.update(setting.split('=', 1) for setting in args.env)
+            with BackendProcess(env) as backend:
+                summary = asyncio.run(run(backend.url))
+
+    print_report(summary)
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(summary, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
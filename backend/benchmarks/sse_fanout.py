@@ -0,0 +1,120 @@
+"""
+SSE fan-out cost at different subscriber counts
+
+Attaches simulated subscribers (one asyncio queue and one consumer task each,
+like the /api/events/stream handler) to an EventBroadcaster and broadcasts
+queue_update events of a realistic size. For each subscriber count it reports:
+- fan-out: how long broadcast_event takes to hand the event to every queue
+- last delivery: from the broadcast starting until the last subscriber has it
+- delivery lag: from the event's creation to each subscriber receiving it
+  (what pileup_sse_delivery_lag_seconds measures in production)
+- memory per event: bytes allocated while the event sits in every queue
+
+    python -m benchmarks.sse_fanout --subscribers 1000 10000 50000 --events 20
+
+The payload is built from a queue of --queue-size stations; --window limits it
+to the top of the queue as large-queue mode does. End-to-end numbers over real
+sockets come from benchmarks.pileup_load.
+"""
+import argparse
+import asyncio
+import gc
+import statistics
+import time
+import tracemalloc
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+from app.database import queue_settings
+from app.engine import InMemoryQueueEngine
+from app.queue_window import queue_update_payload
+from app.services.events import EventBroadcaster, EventType
+from benchmarks.large_queue import fill
+from benchmarks.pileup_load import percentile
+
+
+def build_payload(queue_size: int, window: int) -> Dict[str, Any]:
+    """A queue_update payload for a queue of queue_size stations"""
+    with patch.multiple(queue_settings, max_size=queue_size + 1, window_size=window):
+        store = InMemoryQueueEngine(store=None)
+        store.set_system_status(True, 'benchmark')
+        fill(store, queue_size)
+        return queue_update_payload(store, version=store.get_state_version())
+
+
+async def measure(subscribers: int, payload: Dict[str, Any], events: int) -> Dict[str, float]:
+    """Fan-out, last-delivery and lag timings (ms) and memory per event (bytes) for one subscriber count"""
+    broadcaster = EventBroadcaster()
+    queues = [asyncio.Queue() for _ in range(subscribers)]
+    for queue in queues:
+        await broadcaster.add_connection(queue)
+
+    # Memory: allocations while one event is queued for every subscriber
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    await broadcaster.broadcast_event(EventType.QUEUE_UPDATE, payload)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for queue in queues:
+        queue.get_nowait()
+
+    lags: List[float] = []
+    state = {'delivered': 0, 'done': asyncio.Event()}
+
+    async def consume(queue: asyncio.Queue):
+        while True:
+            frame = await queue.get()
+            lags.append(time.time() - frame.created)
+            state['delivered'] += 1
+            if state['delivered'] == subscribers:
+                state['done'].set()
+
+    consumers = [asyncio.create_task(consume(queue)) for queue in queues]
+    await asyncio.sleep(0)  # Let every consumer start waiting
+
+    fanouts, last_deliveries = [], []
+    for _ in range(events):
+        state['delivered'], state['done'] = 0, asyncio.Event()
+        start = time.perf_counter()
+        await broadcaster.broadcast_event(EventType.QUEUE_UPDATE, payload)
+        fanouts.append(time.perf_counter() - start)
+        await state['done'].wait()
+        last_deliveries.append(time.perf_counter() - start)
+
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
+
+    return {
+        'fanout_p50_ms': statistics.median(fanouts) * 1000,
+        'fanout_max_ms': max(fanouts) * 1000,
+        'last_delivery_p50_ms': statistics.median(last_deliveries) * 1000,
+        'lag_p50_ms': percentile(lags, 0.50) * 1000,
+        'lag_p99_ms': percentile(lags, 0.99) * 1000,
+        'memory_per_event_bytes': memory,
+        'memory_per_subscriber_bytes': memory / subscribers
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE fan-out cost at different subscriber counts')
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--events', type=int, default=20, help='Broadcasts per subscriber count')
+    parser.add_argument('--queue-size', type=int, default=200, help='Stations in the queue_update payload')
+    parser.add_argument('--window', type=int, default=0, help='Top-of-queue window (0 sends the whole queue)')
+    args = parser.parse_args()
+
+    payload = build_payload(args.queue_size, args.window)
+    print(f"queue_update of {len(payload['queue'])} entries, {args.events} broadcasts per row")
+    print(f"{'subscribers':>12}{'fan-out p50':>14}{'fan-out max':>14}{'last p50':>12}"
+          f"{'lag p50':>10}{'lag p99':>10}{'KiB/event':>12}{'B/sub':>8}")
+    for subscribers in args.subscribers:
+        result = asyncio.run(measure(subscribers, payload, args.events))
+        print(f"{subscribers:>12}{result['fanout_p50_ms']:>11.2f} ms{result['fanout_max_ms']:>11.2f} ms"
+              f"{result['last_delivery_p50_ms']:>9.2f} ms{result['lag_p50_ms']:>7.2f} ms{result['lag_p99_ms']:>7.2f} ms"
+              f"{result['memory_per_event_bytes'] / 1024:>12.1f}{result['memory_per_subscriber_bytes']:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Test per-IP rate limiting and concurrency caps on registration and event streams"""
+import os
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+from app.app import create_app
+from app.admission import (
+    AdmissionLimiter, MemoryCounterStore, RedisCounterStore, admission_stats, client_ip,
+    register_limiter, set_admission_store, stream_limiter
+)
+from app.routes.events import events_stream
+
+
+def fake_request(host='203.0.113.5', headers=None):
+    request = Mock()
+    request.client.host = host
+    request.headers = headers or {}
+    return request
+
+
+@pytest.fixture(autouse=True)
+def admission_on():
+    """Admission control on, with fresh in-process counters for every test"""
+    set_admission_store(MemoryCounterStore())
+    with patch.dict(os.environ, {'ADMISSION_CONTROL': 'true'}):
+        yield
+    set_admission_store(None)
+
+
+class TestAdmissionLimiter:
+    """Test the token bucket and the concurrency cap"""
+
+    @pytest.mark.asyncio
+    async def test_burst_then_rate_limited_with_retry_after(self):
+        limiter = AdmissionLimiter('test', rate=0.5, burst=2, max_concurrent=10)
+        for _ in range(2):
+            await limiter.release(await limiter.admit(fake_request()))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await limiter.admit(fake_request())
+        assert exc_info.value.status_code == 429
+        assert exc_info.value.headers['Retry-After'] == '2'
+        assert limiter.rejections['rate'] == 1
+
+        # Another client has its own bucket
+        await limiter.admit(fake_request('198.51.100.7'))
+
+    @pytest.mark.asyncio
+    async def test_concurrency_cap_until_released(self):
+        limiter = AdmissionLimiter('test', rate=100, burst=100, max_concurrent=2)
+        first = await limiter.admit(fake_request('192.0.2.1'))
+        await limiter.admit(fake_request('192.0.2.2'))
+
+        with pytest.raises(HTTPException) as exc_info:
+            await limiter.admit(fake_request('192.0.2.3'))
+        assert exc_info.value.status_code == 429
+        assert limiter.rejections['concurrency'] == 1
+
+        await limiter.release(first)
+        await limiter.admit(fake_request('192.0.2.3'))
+        assert (await limiter.stats())['in_use'] == 2
+
+    @pytest.mark.asyncio
+    async def test_disabled_admits_everything(self):
+        limiter = AdmissionLimiter('test', rate=0.01, burst=1, max_concurrent=1)
+        with patch.dict(os.environ, {'ADMISSION_CONTROL': 'false'}):
+            for _ in range(5):
+                await limiter.admit(fake_request())
+        assert limiter.admitted == 0
+
+    @pytest.mark.asyncio
+    async def test_store_failure_admits(self):
+        store = Mock()
+        store.take_token.side_effect = ConnectionError('redis down')
+        limiter = AdmissionLimiter('test', rate=0.01, burst=1, max_concurrent=1, store=store)
+        slot = await limiter.admit(fake_request())
+        assert slot.token is None
+
+    def test_forwarded_for_only_when_trusted(self):
+        request = fake_request('10.0.0.1', {'x-forwarded-for': '203.0.113.9, 10.0.0.1'})
+        assert client_ip(request) == '10.0.0.1'
+        with patch.dict(os.environ, {'TRUST_PROXY_HEADERS': 'true'}):
+            assert client_ip(request) == '203.0.113.9'
+
+
+class TestRedisCounterStore:
+    """Test the shared counters against fakeredis"""
+
+    @pytest.mark.asyncio
+    async def test_limits_are_shared_between_store_instances(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')  # fakeredis needs lupa to run the Lua scripts
+        server = fakeredis.FakeServer()
+        workers = [RedisCounterStore(fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+                   for _ in range(2)]
+
+        assert await workers[0].take_token('register:192.0.2.1', 1, 1) == 0
+        assert await workers[1].take_token('register:192.0.2.1', 1, 1) > 0
+
+        token = await workers[0].acquire_slot('stream', 1, 60)
+        assert token is not None
+        assert await workers[1].acquire_slot('stream', 1, 60) is None
+        assert await workers[1].slots_in_use('stream') == 1
+        await workers[0].release_slot('stream', token)
+        assert await workers[1].acquire_slot('stream', 1, 60) is not None
+
+    @pytest.mark.asyncio
+    async def test_unreleased_slot_expires(self):
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')
+        store = RedisCounterStore(fakeredis.FakeAsyncRedis(decode_responses=True))
+        assert await store.acquire_slot('stream', 1, 0.05) is not None
+        await asyncio.sleep(0.1)
+        assert await store.acquire_slot('stream', 1, 60) is not None
+
+
+class TestAdmissionEndpoints:
+    """Test the 429 responses from the guarded endpoints"""
+
+    @patch('app.routes.queue.qrz_service')
+    @patch('app.routes.queue.queue_db')
+    def test_register_rate_limited_per_client(self, mock_db, mock_qrz):
+        mock_db.get_system_status.return_value = {'active': True}
+        mock_db.register_callsign.side_effect = lambda callsign, qrz_info, include_queue: {
+            'callsign': callsign, 'position': 1, 'version': 1
+        }
+        mock_db.get_queue_list.return_value = []
+        mock_qrz.lookup_callsign.return_value = {}
+        client = TestClient(create_app())
+
+        statuses = [client.post('/api/queue/register', json={'callsign': f'W{i}AW'}).status_code
+                    for i in range(register_limiter.burst + 1)]
+
+        assert statuses[:-1] == [200] * register_limiter.burst
+        assert statuses[-1] == 429
+        assert mock_db.register_callsign.call_count == register_limiter.burst
+
+    @pytest.mark.asyncio
+    async def test_stream_slot_released_when_never_iterated(self):
+        response = await events_stream(fake_request())
+        assert (await stream_limiter.stats())['in_use'] == 1
+
+        async def disconnected(message):
+            raise OSError('client went away')
+
+        # The client is gone before the first frame, so the generator never starts
+        with pytest.raises(Exception):
+            await response({'type': 'http', 'asgi': {'spec_version': '2.4'}}, Mock(), disconnected)
+
+        assert (await stream_limiter.stats())['in_use'] == 0
+
+    def test_stats_endpoint(self):
+        with patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret'}):
+            response = TestClient(create_app()).get('/api/admin/admission', auth=('admin', 'secret'))
+        assert response.status_code == 200
+        assert set(response.json()['limiters']) == {'register', 'stream'}
+
+    @pytest.mark.asyncio
+    async def test_stats_report_rejections(self):
+        limiter = AdmissionLimiter('test', rate=1, burst=1, max_concurrent=1)
+        with patch.dict('app.admission.limiters', {'test': limiter}, clear=True):
+            await limiter.admit(fake_request())
+            with pytest.raises(HTTPException):
+                await limiter.admit(fake_request())
+            stats = await admission_stats()
+        assert stats['enabled'] is True
+        assert stats['limiters']['test']['admitted'] == 1
+        assert stats['limiters']['test']['rejected'] == {'rate': 1}
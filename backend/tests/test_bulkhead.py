@@ -0,0 +1,128 @@
+"""Test the admin and public concurrency pools"""
+import os
+import asyncio
+import threading
+import anyio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.app import create_app
+from app.bulkhead import Bulkhead, BulkheadFull, pool_for_path, reserve_threads
+
+
+class TestBulkhead:
+    """Test the pool and its wait queue"""
+
+    @pytest.mark.asyncio
+    async def test_waiters_admitted_in_order(self):
+        pool = Bulkhead('test', 1)
+        await pool.acquire()
+        order = []
+
+        async def wait(name):
+            await pool.acquire()
+            order.append(name)
+
+        waiters = [asyncio.create_task(wait(name)) for name in ('first', 'second')]
+        await asyncio.sleep(0)
+        assert pool.waiting == 2
+        assert pool.in_flight == 1
+
+        pool.release()
+        await asyncio.sleep(0)
+        assert order == ['first']
+        pool.release()
+        await asyncio.gather(*waiters)
+        assert order == ['first', 'second']
+        pool.release()
+
+        stats = pool.stats()
+        assert stats['in_flight'] == 0
+        assert stats['peak_waiting'] == 2
+        assert stats['admitted'] == 3
+
+    @pytest.mark.asyncio
+    async def test_full_wait_queue_rejects(self):
+        pool = Bulkhead('test', 1, max_waiting=1)
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(BulkheadFull):
+            await pool.acquire()
+        assert pool.rejected == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert pool.waiting == 0
+        pool.release()
+        assert pool.in_flight == 0
+
+    def test_pool_for_path(self):
+        assert pool_for_path('/api/admin/queue/next').name == 'admin'
+        assert pool_for_path('/api/queue/list').name == 'public'
+        assert pool_for_path('/status').name == 'public'
+        assert pool_for_path('/api/events/stream') is None
+        assert pool_for_path('/static/logo.png') is None
+
+
+class TestBulkheadMiddleware:
+    """Test that admin requests get through a public storm"""
+
+    @pytest.mark.asyncio
+    async def test_admin_served_while_public_pool_is_saturated(self):
+        public_pool = Bulkhead('public', 2, max_waiting=10)
+        admin_pool = Bulkhead('admin', 1)
+        released = threading.Event()
+
+        def slow_status():
+            released.wait(5)
+            return {'active': True}
+
+        with patch('app.bulkhead.public_pool', public_pool), \
+             patch('app.bulkhead.admin_pool', admin_pool), \
+             patch.dict('app.bulkhead.pools', {'public': public_pool, 'admin': admin_pool}), \
+             patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret'}), \
+             patch('app.routes.queue.queue_db') as public_db, \
+             patch('app.routes.admin.queue_db') as admin_db:
+            public_db.get_system_status.side_effect = slow_status
+            admin_db.get_system_status.return_value = {'active': True}
+
+            # Only enough threads for the two pools: without the pools the public storm would take all 3
+            anyio.to_thread.current_default_thread_limiter().total_tokens = 1
+            reserve_threads()
+            assert anyio.to_thread.current_default_thread_limiter().total_tokens == 3
+
+            transport = httpx.ASGITransport(app=create_app())
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                storm = [asyncio.create_task(client.get('/api/queue/status')) for _ in range(5)]
+                while public_pool.waiting < 3:
+                    await asyncio.sleep(0.01)
+
+                response = await asyncio.wait_for(
+                    client.get('/api/admin/status', auth=('admin', 'secret')), timeout=2
+                )
+                assert response.status_code == 200
+                assert public_pool.in_flight == 2
+
+                released.set()
+                responses = await asyncio.gather(*storm)
+
+        assert [r.status_code for r in responses] == [200] * 5
+        assert public_pool.stats()['peak_waiting'] == 3
+        assert admin_pool.stats()['admitted'] == 1
+
+    def test_full_public_pool_answers_503(self):
+        with patch('app.bulkhead.public_pool', Bulkhead('public', 0, max_waiting=0)):
+            response = TestClient(create_app()).get('/api/queue/status')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+    def test_stats_endpoint(self):
+        with patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret'}):
+            response = TestClient(create_app()).get('/api/admin/bulkheads', auth=('admin', 'secret'))
+        assert response.status_code == 200
+        assert response.json()['admin']['in_flight'] == 1
+        assert set(response.json()['public']) >= {'size', 'waiting', 'peak_waiting', 'rejected'}
@@ -57,7 +57,7 @@ class TestDXCCNameExtraction:
         
         # Verify QRZ service was called and database was updated with DXCC name
         mock_qrz_service.lookup_callsign.assert_called_once_with('KC1ABC')
-        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info)
+        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info, include_queue=True)
 
     @patch('app.routes.queue.queue_db')
     @patch('app.routes.queue.qrz_service')
@@ -96,4 +96,4 @@ class TestDXCCNameExtraction:
         
         # Verify QRZ service was called and database was updated with dxcc_name: None
         mock_qrz_service.lookup_callsign.assert_called_once_with('KC1ABC')
-        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info)
\ No newline at end of file
+        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info, include_queue=True)
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""Tests for the local DXCC prefix resolver"""
+import os
+import pytest
+from unittest.mock import patch
+from app.services.dxcc import DXCCResolver, DEFAULT_CTY_PATH
+from app.services.qrz import QRZService
+
+
+SAMPLE_CTY = """United States:            05:  08:  NA:   37.53:    91.67:     5.0:  K:
+    AA,K,N,W,
+    K6(3)[6],W6(3)[6];
+Hawaii:                   31:  61:  OC:   21.12:   157.48:    10.0:  KH6:
+    KH6,KH7,WH6;
+Antarctica:               13:  74:  SA:  -90.00:     0.00:     0.0:  CE9:
+    CE9,=KC4AAA;
+Switzerland:              14:  28:  EU:   46.87:    -8.12:    -1.0:  HB:
+    HB,HE;
+Liechtenstein:            14:  28:  EU:   47.13:    -9.57:    -1.0:  HB0:
+    HB0,HE0;
+Ireland:                  14:  27:  EU:   53.13:     8.02:     0.0:  EI:
+    EI,EJ{AF};
+"""
+
+
+@pytest.fixture
+def resolver():
+    resolver = DXCCResolver(cty_path='/nonexistent/cty.dat')
+    resolver.load(SAMPLE_CTY)
+    return resolver
+
+
+class TestDXCCResolver:
+    """Test prefix matching, overrides and exception callsigns"""
+
+    def test_load_counts_entities(self):
+        resolver = DXCCResolver(cty_path='/nonexistent/cty.dat')
+        assert resolver.load(SAMPLE_CTY) == 6
+
+    def test_basic_lookup(self, resolver):
+        result = resolver.lookup('KC1ABC')
+        assert result == {
+            'entity': 'United States',
+            'cq_zone': 5,
+            'itu_zone': 8,
+            'continent': 'NA',
+            'prefix': 'K'
+        }
+
+    def test_longest_prefix_wins(self, resolver):
+        assert resolver.lookup('KH6ABC')['entity'] == 'Hawaii'
+        assert resolver.lookup('HB0XX')['entity'] == 'Liechtenstein'
+        assert resolver.lookup('HB9ABC')['entity'] == 'Switzerland'
+
+    def test_zone_and_continent_overrides(self, resolver):
+        result = resolver.lookup('W6ABC')
+        assert result['entity'] == 'United States'
+        assert result['cq_zone'] == 3
+        assert result['itu_zone'] == 6
+        assert resolver.lookup('EJ1AB')['continent'] == 'AF'
+
+    def test_exception_callsign(self, resolver):
+        assert resolver.lookup('KC4AAA')['entity'] == 'Antarctica'
+        # Exceptions match the whole callsign only
+        assert resolver.lookup('KC4AAB')['entity'] == 'United States'
+
+    def test_portable_callsigns(self, resolver):
+        assert resolver.lookup('KH6/W1AW')['entity'] == 'Hawaii'
+        assert resolver.lookup('W1AW/P')['entity'] == 'United States'
+        assert resolver.lookup('W1AW/6')['cq_zone'] == 3
+
+    def test_unknown_prefix(self, resolver):
+        assert resolver.lookup('ZZ1ABC') is None
+        assert resolver.lookup('') is None
+
+    def test_lowercase_input(self, resolver):
+        assert resolver.lookup('ei0irts')['entity'] == 'Ireland'
+
+    def test_missing_file_resolves_nothing(self):
+        resolver = DXCCResolver(cty_path='/nonexistent/cty.dat')
+        assert resolver.lookup('KC1ABC') is None
+
+    def test_malformed_file_resolves_nothing(self, tmp_path):
+        cty_path = tmp_path / 'cty.dat'
+        cty_path.write_text('Broken:  xx:  08:  NA:  37.53:  91.67:  5.0:  K:\n    K;', encoding='latin-1')
+        resolver = DXCCResolver(cty_path=str(cty_path))
+
+        with patch.object(resolver, 'load', wraps=resolver.load) as load:
+            assert resolver.lookup('KC1ABC') is None
+            assert resolver.lookup('W1AW') is None
+        load.assert_called_once()
+
+    def test_bundled_prefix_file(self):
+        resolver = DXCCResolver(cty_path=DEFAULT_CTY_PATH)
+        assert resolver.lookup('EI0IRTS')['entity'] == 'Ireland'
+        assert resolver.lookup('2E0JFS')['entity'] == 'England'
+        assert resolver.lookup('W1AW')['entity'] == 'United States'
+
+
+class TestQRZFallback:
+    """Test that QRZService falls back to the local resolver"""
+
+    def test_dxcc_name_filled_when_qrz_unconfigured(self):
+        with patch.dict(os.environ, {}, clear=True):
+            service = QRZService()
+        result = service.lookup_callsign('EI0IRTS')
+        assert result['error'] is not None
+        assert result['dxcc_name'] == 'Ireland'
@@ -0,0 +1,164 @@
+"""Test fault injection and the fallbacks it exercises"""
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+from app.app import create_app
+from app.engine import InMemoryQueueEngine
+from app.faults import FaultProfile, InjectedFault, InjectedTimeout, inject_qrz_faults, inject_storage_faults
+from app.services.qrz import QRZService
+from benchmarks.pileup_load import percentile
+from app.database import queue_settings
+
+
+def faulty_store(**options) -> InMemoryQueueEngine:
+    store = InMemoryQueueEngine(store=None)
+    store.set_system_status(True, 'admin')
+    store.set_frequency('14.025', 'admin')
+    return inject_storage_faults(store, FaultProfile(**options))
+
+
+def faulty_qrz(**options) -> QRZService:
+    with patch.dict(os.environ, {'QRZ_USERNAME': 'standin', 'QRZ_PASSWORD': 'standin'}):
+        service = QRZService()
+    # Calls that get through find no profile
+    service.qrz_client = Mock()
+    service.qrz_client.search.return_value = None
+    return inject_qrz_faults(service, FaultProfile(**options))
+
+
+class TestFaultProfile:
+    """Test the profile spec and the injected behaviour"""
+
+    def test_parse(self):
+        profile = FaultProfile.parse('latency_ms=5,jitter_ms=20,tail_rate=0.01,tail_ms=500,'
+                                     'error_rate=0.02,timeout_ms=250,methods=find_callsign|advance,seed=3')
+        assert profile.latency == 0.005
+        assert profile.jitter == 0.02
+        assert profile.tail == 0.5
+        assert profile.error_rate == 0.02
+        assert profile.timeout == 0.25
+        assert profile.methods == {'find_callsign', 'advance'}
+        with pytest.raises(ValueError, match='Unknown fault option'):
+            FaultProfile.parse('latency=5')
+
+    def test_rates_are_repeatable(self):
+        def run():
+            profile = FaultProfile(error_rate=0.3, seed=7)
+            outcomes = []
+            for _ in range(200):
+                try:
+                    profile.inject('find_callsign')
+                    outcomes.append(True)
+                except InjectedFault:
+                    outcomes.append(False)
+            return outcomes, profile.injected
+
+        outcomes, injected = run()
+        assert outcomes == run()[0]
+        assert 40 <= injected['errors'] <= 80
+        assert injected['calls'] == 200
+
+    def test_storage_latency_and_method_filter(self):
+        store = faulty_store(latency=0.02, methods={'find_callsign'})
+        store.register_callsign('W1AW')
+
+        started = time.perf_counter()
+        assert store.find_callsign('W1AW')['position'] == 1
+        assert time.perf_counter() - started >= 0.02
+        assert store.get_queue_count == store._store.get_queue_count
+
+    def test_self_calls_not_faulted(self):
+        store = faulty_store(error_rate=1.0, methods={'get_system_status', 'is_system_active', 'clear_queue'})
+        # register_callsign checks is_system_active and reset clears the queue on the store itself
+        assert store.register_callsign('W1AW')['position'] == 1
+        assert store.reset(True, 'admin')['cleared_count'] == 1
+        with pytest.raises(InjectedFault):
+            store.clear_queue()
+
+    def test_storage_timeout(self):
+        store = faulty_store(timeout_rate=1.0, timeout=0.01)
+        with pytest.raises(InjectedTimeout, match='timed out') as raised:
+            store.get_queue_list()
+        assert isinstance(raised.value, TimeoutError)
+
+    def test_not_injected_unless_configured(self):
+        store = InMemoryQueueEngine(store=None)
+        with patch.dict(os.environ, {'FAULT_STORAGE': ''}):
+            assert inject_storage_faults(store) is store
+        with patch.dict(os.environ, {'FAULT_STORAGE': 'error_rate=1'}):
+            faulty = inject_storage_faults(store)
+        with pytest.raises(InjectedFault):
+            faulty.find_callsign('W1AW')
+        assert store.find_callsign('W1AW') is None
+        assert 'find_callsign' not in vars(store)
+
+
+class TestStatusPageFallbacks:
+    """The status page renders what it can when parts of the store fail"""
+
+    def test_optional_sections_fall_back(self):
+        store = faulty_store(error_rate=1.0, methods={'get_current_qso', 'get_queue_list', 'get_frequency', 'get_split'})
+        with patch('app.database.queue_db', store):
+            response = TestClient(create_app()).get('/status')
+
+        assert response.status_code == 200
+        assert 'ACTIVE' in response.text
+        assert 'No active QSO' in response.text
+        assert 'No users in queue' in response.text
+
+    def test_status_failure_gives_error_page(self):
+        store = faulty_store(error_rate=1.0, methods={'get_system_status'})
+        with patch('app.database.queue_db', store):
+            response = TestClient(create_app()).get('/status')
+
+        assert response.status_code == 500
+        assert 'Status Page Unavailable' in response.text
+
+
+class TestQRZFallbacks:
+    """Lookups fall back to the local DXCC table when QRZ.com fails"""
+
+    def test_error_falls_back_to_local_dxcc(self):
+        result = faulty_qrz(error_rate=1.0).lookup_callsign('EI0IRTS')
+        assert result['error'] == 'qrz.search failed (injected)'
+        assert result['name'] is None
+        assert result['dxcc_name'] == 'Ireland'
+
+    def test_login_timeout_falls_back(self):
+        service = faulty_qrz(timeout_rate=1.0, timeout=0.01, methods={'authenticate'})
+        service.qrz_client = None
+
+        result = service.lookup_callsign('W1AW')
+        assert 'timed out' in result['error']
+        assert result['dxcc_name'] == 'United States'
+
+    def test_registration_survives_failing_qrz(self):
+        store = faulty_store()
+        with patch('app.routes.queue.queue_db', store), \
+                patch('app.routes.queue.qrz_service', faulty_qrz(error_rate=1.0)), \
+                patch.object(queue_settings, 'max_size', 10):
+            response = TestClient(create_app()).post('/api/queue/register', json={'callsign': 'KC1ABC'})
+
+        assert response.status_code == 200
+        assert response.json()['entry']['qrz']['error'] == 'qrz.search failed (injected)'
+        assert store.find_callsign('KC1ABC') is not None
+
+    def test_registration_p99_bounded_by_qrz_timeout(self):
+        # A fifth of all lookups hang until their timeout; registration latency must stay
+        # within the timeout plus the (fast) store
+        store = faulty_store(latency=0.001)
+        qrz = faulty_qrz(timeout_rate=0.2, timeout=0.3, seed=1)
+        latencies = []
+        with patch('app.routes.queue.queue_db', store), patch('app.routes.queue.qrz_service', qrz), \
+                patch.object(queue_settings, 'max_size', 100):
+            client = TestClient(create_app())
+            for i in range(30):
+                started = time.perf_counter()
+                response = client.post('/api/queue/register', json={'callsign': f'K{i % 10}AA{chr(65 + i // 10)}'})
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+
+        assert percentile(latencies, 0.50) < 0.3
+        assert 0.3 <= percentile(latencies, 0.99) < 1.3
@@ -0,0 +1,137 @@
+"""Tests for the QRZ profile image proxy"""
+import io
+import time
+import asyncio
+import pytest
+from unittest.mock import Mock, patch
+from fastapi.testclient import TestClient
+from app.app import create_app
+from app.database import QueueDatabase
+from app.services.images import ProfileImageCache
+from benchmarks.qrz_standin import QRZStandinServer
+
+
+@pytest.fixture
+def image_server():
+    with QRZStandinServer() as server:
+        yield server
+
+
+@pytest.fixture
+def test_client(tmp_path, image_server):
+    """Create a test client with a mocked database and a temporary image cache"""
+    mock_db = Mock(spec=QueueDatabase)
+    mock_db.get_current_qso.return_value = None
+    mock_db.find_callsign.return_value = {
+        'callsign': 'EI0IRTS',
+        'position': 1,
+        'qrz': {'callsign': 'EI0IRTS', 'image': f'http://{image_server.host}:{image_server.port}/images/ei0irts.png'}
+    }
+    cache = ProfileImageCache(cache_dir=str(tmp_path), thumbnail_size=128)
+
+    with patch('app.routes.images.queue_db', mock_db):
+        with patch('app.routes.images.profile_image_cache', cache):
+            yield TestClient(create_app()), mock_db, image_server
+
+
+class TestImageProxy:
+    """Test fetching, resizing and caching of profile images"""
+
+    def test_serves_resized_thumbnail(self, test_client):
+        Image = pytest.importorskip('PIL.Image')
+        client, _, _ = test_client
+        response = client.get('/api/images/EI0IRTS')
+
+        assert response.status_code == 200
+        assert response.headers['content-type'] == 'image/jpeg'
+        assert response.headers['cache-control'] == 'public, max-age=300'
+        with Image.open(io.BytesIO(response.content)) as image:
+            assert max(image.size) <= 128
+
+    def test_fetches_remote_image_once(self, test_client):
+        client, _, server = test_client
+        first = client.get('/api/images/EI0IRTS')
+        second = client.get('/api/images/ei0irts')
+
+        assert first.content == second.content
+        assert server.stats['images'] == 1
+
+    def test_stale_thumbnail_revalidated_with_source(self, test_client):
+        client, _, server = test_client
+        first = client.get('/api/images/EI0IRTS')
+
+        # The cached thumbnail has passed max_age
+        with patch.object(ProfileImageCache, '_is_fresh', return_value=False):
+            second = client.get('/api/images/EI0IRTS')
+
+        assert second.status_code == 200
+        assert second.content == first.content
+        assert server.stats['images'] == 2
+        assert server.stats['images_not_modified'] == 1
+
+    def test_conditional_request_returns_304(self, test_client):
+        client, _, _ = test_client
+        etag = client.get('/api/images/EI0IRTS').headers['etag']
+
+        response = client.get('/api/images/EI0IRTS', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+
+    def test_current_qso_image(self, test_client):
+        client, mock_db, server = test_client
+        mock_db.get_current_qso.return_value = {
+            'callsign': 'W1AW',
+            'qrz': {'image': f'http://{server.host}:{server.port}/images/w1aw.png'}
+        }
+
+        response = client.get('/api/images/W1AW')
+        assert response.status_code == 200
+        mock_db.find_callsign.assert_not_called()
+
+    def test_unknown_callsign_returns_404(self, test_client):
+        client, mock_db, _ = test_client
+        mock_db.find_callsign.return_value = None
+
+        response = client.get('/api/images/K1ABC')
+        assert response.status_code == 404
+
+    def test_unreachable_image_returns_502(self, test_client):
+        client, mock_db, _ = test_client
+        mock_db.find_callsign.return_value = {
+            'callsign': 'K1ABC',
+            'qrz': {'image': 'http://127.0.0.1:1/missing.jpg'}
+        }
+
+        response = client.get('/api/images/K1ABC')
+        assert response.status_code == 502
+
+
+class TestProfileImageCache:
+    """Test the cache on its own"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_fetch_during_slow_resize(self, tmp_path, image_server):
+        cache = ProfileImageCache(cache_dir=str(tmp_path), thumbnail_size=128)
+        resize = cache._resize
+
+        def slow_resize(content, media_type):
+            time.sleep(0.2)
+            return resize(content, media_type)
+
+        url = f'http://{image_server.host}:{image_server.port}/images/ei0irts.png'
+        with patch.object(cache, '_resize', slow_resize):
+            first = asyncio.create_task(cache.get_thumbnail(url))
+            # Let the first request get past its fetch and into the resize
+            while image_server.stats['images'] == 0:
+                await asyncio.sleep(0.01)
+            thumbnails = await asyncio.gather(first, *(cache.get_thumbnail(url) for _ in range(5)))
+
+        assert image_server.stats['images'] == 1
+        assert len({thumbnail['etag'] for thumbnail in thumbnails}) == 1
+
+    @pytest.mark.asyncio
+    async def test_stale_thumbnail_served_when_source_unreachable(self, tmp_path):
+        cache = ProfileImageCache(cache_dir=str(tmp_path), max_age=0)
+        url = 'http://127.0.0.1:1/missing.jpg'
+        stored = cache._store(url, b'thumbnail', 'image/jpeg')
+
+        assert (await cache.get_thumbnail(url))['path'] == stored['path']
@@ -0,0 +1,123 @@
+"""Test structured logging, sampling and activity summaries"""
+import os
+import json
+import asyncio
+import logging
+import pytest
+from unittest.mock import patch
+from app.logs import ActivitySummary, JsonFormatter, LogSampler, TextFormatter, configure_logging
+from app.services.events import EventBroadcaster, EventType
+from app.services.qrz import QRZService
+
+
+def make_record(msg='Broadcast %s', args=('queue_update',), fields=None):
+    record = logging.LogRecord('app.services.events', logging.INFO, __file__, 1, msg, args, None)
+    if fields is not None:
+        record.fields = fields
+    return record
+
+
+class TestFormatters:
+    """Test JSON and text output"""
+
+    def test_json_lines_with_fields(self):
+        entry = json.loads(JsonFormatter().format(make_record(fields={'connections': 12})))
+        assert entry['message'] == 'Broadcast queue_update'
+        assert entry['level'] == 'INFO'
+        assert entry['logger'] == 'app.services.events'
+        assert entry['connections'] == 12
+
+    def test_text_appends_fields(self):
+        assert TextFormatter().format(make_record(fields={'connections': 12})).endswith('Broadcast queue_update connections=12')
+
+    def test_configure_json_output(self):
+        root = logging.getLogger()
+        before = list(root.handlers)
+        try:
+            with patch.dict(os.environ, {'LOG_FORMAT': 'json'}):
+                configure_logging()
+                configure_logging()
+            added = [handler for handler in root.handlers if handler not in before]
+            assert len(added) == 1
+            assert isinstance(added[0].formatter, JsonFormatter)
+        finally:
+            root.handlers[:] = before
+
+
+class TestLogSampler:
+    """Test rate-limited logging"""
+
+    def test_limits_per_key_and_reports_drops(self, caplog):
+        sampler = LogSampler(logging.getLogger('app.test'), limit=2, interval=60)
+        with caplog.at_level(logging.WARNING, logger='app.test'), \
+             patch('app.logs.time.monotonic', return_value=100.0):
+            logged = [sampler.warning('qrz', 'Lookup failed for %s', n) for n in range(5)]
+            assert sampler.warning('other', 'Different problem')
+        assert logged == [True, True, False, False, False]
+
+        with caplog.at_level(logging.WARNING, logger='app.test'), \
+             patch('app.logs.time.monotonic', return_value=161.0):
+            sampler.warning('qrz', 'Lookup failed for %s', 5)
+        messages = [record.getMessage() for record in caplog.records]
+        assert messages == ['Lookup failed for 0', 'Lookup failed for 1', 'Different problem',
+                            'Dropped 3 similar log records (qrz) in the last 61s', 'Lookup failed for 5']
+
+    def test_disabled_level_is_not_formatted(self):
+        class Expensive:
+            def __str__(self):
+                raise AssertionError('formatted')
+
+        target = logging.getLogger('app.quiet')
+        target.setLevel(logging.ERROR)
+        try:
+            assert not LogSampler(target).warning('key', 'Value %s', Expensive())
+        finally:
+            target.setLevel(logging.NOTSET)
+
+
+class TestActivitySummary:
+    """Test the aggregated summary of SSE activity"""
+
+    @pytest.mark.asyncio
+    async def test_broadcaster_counts_instead_of_logging(self, caplog):
+        summary = ActivitySummary(interval=60)
+        broadcaster = EventBroadcaster()
+        with patch('app.services.events.activity', summary), \
+             caplog.at_level(logging.INFO, logger='app'):
+            connections = [asyncio.Queue() for _ in range(3)]
+            for connection in connections:
+                await broadcaster.add_connection(connection)
+            await broadcaster.broadcast_event(EventType.QUEUE_UPDATE, {'queue': []})
+            await broadcaster.broadcast_event(EventType.CURRENT_QSO, None)
+            await broadcaster.remove_connection(connections[0])
+            assert caplog.records == []
+
+            fields = summary.flush()
+
+        assert fields == {'connections': 2, 'connections_added': 3, 'broadcasts': 2,
+                          'deliveries': 6, 'connections_removed': 1}
+        assert caplog.records[-1].getMessage() == \
+            '2 broadcasts, 6 deliveries, +3/-1 connections, 2 open in the last 60s'
+        assert summary.flush() == {'connections': 2}
+
+    @pytest.mark.asyncio
+    async def test_periodic_summary(self, caplog):
+        summary = ActivitySummary(interval=0.01)
+        summary.count('broadcasts')
+        with caplog.at_level(logging.INFO, logger='app.logs'):
+            await summary.start()
+            await asyncio.sleep(0.05)
+            await summary.stop()
+        assert any('1 broadcasts' in record.getMessage() for record in caplog.records)
+
+
+class TestQRZLogging:
+    """Test that QRZ errors go through logging instead of print"""
+
+    def test_lookup_error_logged_not_printed(self, caplog, capsys):
+        with patch.dict(os.environ, {'QRZ_USERNAME': '', 'QRZ_PASSWORD': ''}), \
+             patch('app.services.qrz.sampled', LogSampler(logging.getLogger('app.services.qrz'))), \
+             caplog.at_level(logging.WARNING, logger='app.services.qrz'):
+            QRZService().lookup_callsign('W1AW')
+        assert capsys.readouterr().out == ''
+        assert any('QRZ lookup error for W1AW' in record.getMessage() for record in caplog.records)
@@ -0,0 +1,198 @@
+"""Test the Prometheus metrics for routes, storage, SSE, QRZ and overload protection"""
+import os
+import asyncio
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+
+pytest.importorskip('prometheus_client')
+
+from app.admission import AdmissionLimiter, MemoryCounterStore
+from app.app import create_app
+from app.bulkhead import Bulkhead, BulkheadFull
+from app.engine import InMemoryQueueEngine
+from app.faults import FaultProfile, inject_storage_faults
+from app.metrics import MetricsMiddleware, instrument_storage, registry, route_template
+from app.routes.queue import queue_router
+from app.services.events import EventBroadcaster, EventType
+from app.services.qrz import QRZService
+from app.database import queue_settings
+
+
+def sample(name, **labels):
+    return registry.get_sample_value(name, labels) or 0
+
+
+class TestRouteMetrics:
+    """Test the request middleware and the /metrics endpoint"""
+
+    @patch('app.routes.queue.queue_db')
+    def test_requests_labelled_by_route_template(self, mock_db):
+        mock_db.get_system_status.return_value = {'active': True}
+        mock_db.find_callsign.return_value = {'callsign': 'W1AW', 'position': 1}
+        labels = {'method': 'GET', 'route': '/api/queue/status/{callsign}'}
+        before = sample('pileup_http_request_duration_seconds_count', **labels)
+
+        client = TestClient(create_app())
+        client.get('/api/queue/status/W1AW')
+        client.get('/api/queue/status/KC1ABC')
+
+        assert sample('pileup_http_request_duration_seconds_count', **labels) == before + 2
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert 'pileup_http_requests_total{method="GET",route="/api/queue/status/{callsign}",status="200"}' in response.text
+
+    def test_route_template_with_full_or_relative_route_path(self):
+        route = next(r for r in queue_router.routes if r.path == '/status/{callsign}')
+        scope = {'path': '/api/queue/status/W1AW', 'route': route}
+        assert route_template(scope) == '/api/queue/status/{callsign}'
+        route.path = '/api/queue/status/{callsign}'
+        try:
+            assert route_template(scope) == '/api/queue/status/{callsign}'
+        finally:
+            route.path = '/status/{callsign}'
+        assert route_template({'path': '/nope'}) == 'unmatched'
+
+    def test_middleware_is_outermost(self):
+        # Added last, so request timings include every other middleware
+        assert create_app().user_middleware[0].cls is MetricsMiddleware
+
+    def test_unavailable_without_prometheus_client(self):
+        with patch('app.metrics.metrics_available', return_value=False):
+            response = TestClient(create_app()).get('/metrics')
+        assert response.status_code == 503
+
+
+class TestStorageMetrics:
+    """Test the per-method storage timings"""
+
+    def test_calls_timed_and_errors_counted(self):
+        store = instrument_storage(InMemoryQueueEngine(store=None))
+        store.set_system_status(True, 'admin')
+        labels = {'backend': 'InMemoryQueueEngine', 'method': 'register_callsign'}
+        calls = sample('pileup_db_operation_duration_seconds_count', **labels)
+        errors = sample('pileup_db_operation_errors_total', **labels)
+
+        with patch.object(queue_settings, 'max_size', 10):
+            store.register_callsign('W1AW')
+            with pytest.raises(ValueError):
+                store.register_callsign('W1AW')
+
+        assert sample('pileup_db_operation_duration_seconds_count', **labels) == calls + 2
+        assert sample('pileup_db_operation_errors_total', **labels) == errors + 1
+        assert store.find_callsign('W1AW')['callsign'] == 'W1AW'
+
+    def test_self_calls_counted_once(self):
+        store = instrument_storage(InMemoryQueueEngine(store=None))
+        labels = {'backend': 'InMemoryQueueEngine', 'method': 'clear_queue'}
+        calls = sample('pileup_db_operation_duration_seconds_count', **labels)
+        resets = sample('pileup_db_operation_duration_seconds_count', backend='InMemoryQueueEngine', method='reset')
+
+        # reset clears the queue on the store itself, which isn't a separate sample
+        store.reset(True, 'admin')
+
+        assert sample('pileup_db_operation_duration_seconds_count', **labels) == calls
+        assert sample('pileup_db_operation_duration_seconds_count', backend='InMemoryQueueEngine', method='reset') == resets + 1
+
+    def test_stacked_proxies_label_the_backend(self):
+        store = instrument_storage(inject_storage_faults(InMemoryQueueEngine(store=None), FaultProfile()))
+        calls = sample('pileup_db_operation_duration_seconds_count', backend='InMemoryQueueEngine', method='get_queue_count')
+        assert store.get_queue_count() == 0
+        assert sample('pileup_db_operation_duration_seconds_count', backend='InMemoryQueueEngine', method='get_queue_count') == calls + 1
+
+
+class TestEventMetrics:
+    """Test the SSE connection gauge, queue depths and fan-out timing"""
+
+    @pytest.mark.asyncio
+    async def test_connections_and_fanout(self):
+        broadcaster = EventBroadcaster()
+        connections = [asyncio.Queue() for _ in range(3)]
+        for connection in connections:
+            await broadcaster.add_connection(connection)
+        assert sample('pileup_sse_connections') == 3
+        fanouts = sample('pileup_sse_fanout_duration_seconds_count', event='queue_update')
+
+        await broadcaster.broadcast_event(EventType.QUEUE_UPDATE, {'queue': []})
+        await broadcaster.broadcast_event(EventType.QUEUE_UPDATE, {'queue': []})
+        connections[0].get_nowait()
+
+        assert sample('pileup_sse_fanout_duration_seconds_count', event='queue_update') == fanouts + 2
+        assert sample('pileup_sse_queue_depth_max') == 2
+        assert sample('pileup_sse_queue_depth_total') == 6
+
+        await broadcaster.remove_connection(connections[0])
+        assert sample('pileup_sse_connections') == 2
+
+    @pytest.mark.asyncio
+    async def test_delivery_lag_observed_when_frame_written(self):
+        broadcaster = EventBroadcaster()
+        connection = asyncio.Queue()
+        await broadcaster.add_connection(connection)
+        before = sample('pileup_sse_delivery_lag_seconds_count', event='split_update')
+
+        await broadcaster.broadcast_event(EventType.SPLIT_UPDATE, {'split': 'UP 5'})
+        frame = connection.get_nowait()
+        assert frame.startswith('event: split_update\n')
+        assert sample('pileup_sse_delivery_lag_seconds_count', event='split_update') == before
+
+        frame.created -= 0.2
+        frame.delivered()
+        assert sample('pileup_sse_delivery_lag_seconds_count', event='split_update') == before + 1
+        assert sample('pileup_sse_delivery_lag_seconds_bucket', event='split_update', le='0.1') == 0
+
+
+class TestQRZMetrics:
+    """Test the lookup timings and session reuse"""
+
+    def test_failed_lookup_timed_as_error(self):
+        before = sample('pileup_qrz_lookup_duration_seconds_count', result='error')
+        with patch.dict(os.environ, {'QRZ_USERNAME': '', 'QRZ_PASSWORD': ''}):
+            QRZService().lookup_callsign('W1AW')
+        assert sample('pileup_qrz_lookup_duration_seconds_count', result='error') == before + 1
+
+    def test_session_reuse_counted(self):
+        with patch.dict(os.environ, {'QRZ_USERNAME': 'standin', 'QRZ_PASSWORD': 'standin'}):
+            service = QRZService()
+        service.qrz_client = Mock()
+        service.qrz_client.search.return_value = None
+        before = sample('pileup_qrz_sessions_total', result='reused')
+
+        service.lookup_callsign('W1AW')
+        assert sample('pileup_qrz_sessions_total', result='reused') == before + 1
+
+
+class TestOverloadMetrics:
+    """Test the bulkhead and admission control metrics"""
+
+    @pytest.mark.asyncio
+    async def test_bulkhead_depth_and_rejections(self):
+        pool = Bulkhead('metrics_test', 1, max_waiting=1)
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+
+        assert sample('pileup_bulkhead_in_flight', pool='metrics_test') == 1
+        assert sample('pileup_bulkhead_waiting', pool='metrics_test') == 1
+        with pytest.raises(BulkheadFull):
+            await pool.acquire()
+        assert sample('pileup_bulkhead_rejections_total', pool='metrics_test') == 1
+
+        pool.release()
+        await waiter
+        assert sample('pileup_bulkhead_waiting', pool='metrics_test') == 0
+        pool.release()
+        assert sample('pileup_bulkhead_in_flight', pool='metrics_test') == 0
+
+    @pytest.mark.asyncio
+    async def test_admission_rejections_counted(self):
+        limiter = AdmissionLimiter('metrics_test', rate=0.01, burst=1, max_concurrent=10, store=MemoryCounterStore())
+        request = Mock()
+        request.client.host = '203.0.113.5'
+        request.headers = {}
+        with patch.dict(os.environ, {'ADMISSION_CONTROL': 'true'}):
+            await limiter.admit(request)
+            with pytest.raises(HTTPException):
+                await limiter.admit(request)
+        assert sample('pileup_admission_rejections_total', limiter='metrics_test', reason='rate') == 1
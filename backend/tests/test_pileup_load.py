@@ -0,0 +1,102 @@
+"""Test the pileup load-test harness"""
+import os
+import json
+import asyncio
+import threading
+import time
+import pytest
+import uvicorn
+from datetime import datetime, timezone
+from unittest.mock import patch
+from app.app import create_app
+from app.database import queue_settings
+from app.engine import InMemoryQueueEngine
+from app.services.qrz import QRZService
+from app.validation import validate_callsign
+from benchmarks.pileup_load import LoadReport, PileupScenario, backend_env, percentile, pileup_callsigns, run_load
+from benchmarks.qrz_standin import QRZStandinServer
+
+
+class TestLoadReport:
+    """Test the latency and delivery-lag bookkeeping"""
+
+    def test_percentile(self):
+        samples = [float(i) for i in range(100, 0, -1)]
+        assert percentile(samples, 0.50) == 51.0
+        assert percentile(samples, 0.99) == 100.0
+        assert percentile([], 0.99) == 0.0
+
+    def test_summary_counts_server_errors_and_failures(self):
+        report = LoadReport()
+        report.record('POST /api/queue/register', 0.010, 200)
+        report.record('POST /api/queue/register', 0.020, 400)
+        report.record('POST /api/queue/register', 0.030, 503)
+        report.record('POST /api/queue/register', 0.040, 'ConnectTimeout')
+
+        stats = report.summary(2.0)['endpoints']['POST /api/queue/register']
+        assert stats['requests'] == 4
+        assert stats['per_second'] == 2.0
+        assert stats['errors'] == 2
+        assert stats['statuses'] == {'200': 1, '400': 1, '503': 1, 'ConnectTimeout': 1}
+
+    def test_delivery_lag_from_event_timestamp(self):
+        report = LoadReport()
+        created = time.time()
+        event = {'type': 'queue_update', 'timestamp': datetime.fromtimestamp(created, timezone.utc).isoformat()}
+        report.record_event('queue_update', json.dumps(event), created + 0.25)
+        report.record_event('connected', '{"message": "SSE connection established"}', created)
+
+        summary = report.summary(1.0)
+        assert summary['events'] == {'queue_update': 1, 'connected': 1}
+        assert summary['delivery_lag']['events'] == 1
+        assert summary['delivery_lag']['p50_ms'] == pytest.approx(250, abs=1)
+
+    def test_callsigns_distinct_and_valid(self):
+        callsigns = pileup_callsigns(5000)
+        assert len(set(callsigns)) == 5000
+        assert all(validate_callsign(callsign) for callsign in callsigns)
+
+    def test_backend_env(self):
+        env = backend_env('sqlite', '/tmp/load', 'http://127.0.0.1:8100/xml/current/', ('u', 'p'), 500)
+        assert env['MONGO_URI'] == 'sqlite:////tmp/load/loadtest.db'
+        assert env['MAX_QUEUE_SIZE'] == '500'
+        assert backend_env('memory', '/tmp/load', '', ('u', 'p'), 5)['QUEUE_ENGINE'] == 'memory'
+
+
+class TestPileupRun:
+    """Run a small pileup against the app and the QRZ stand-in"""
+
+    @pytest.fixture
+    def base_url(self):
+        store = InMemoryQueueEngine(store=None)
+        with QRZStandinServer() as qrz, patch.dict(os.environ, {
+            'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret',
+            'QRZ_USERNAME': 'standin', 'QRZ_PASSWORD': 'standin', 'QRZ_API_URL': qrz.url
+        }), patch.object(queue_settings, 'max_size', 100), \
+                patch('app.routes.queue.queue_db', store), patch('app.routes.admin.queue_db', store), \
+                patch('app.routes.queue.qrz_service', QRZService()):
+            server = uvicorn.Server(uvicorn.Config(create_app(), host='127.0.0.1', port=0, log_level='warning'))
+            thread = threading.Thread(target=server.run, daemon=True)
+            thread.start()
+            while not server.started:
+                time.sleep(0.01)
+            port = server.servers[0].sockets[0].getsockname()[1]
+            yield f'http://127.0.0.1:{port}'
+            server.should_exit = True
+            thread.join(timeout=5.0)
+
+    def test_small_pileup(self, base_url):
+        scenario = PileupScenario(listeners=5, stations=6, burst_size=3, burst_interval=0.2,
+                                  poll_interval=0.2, next_interval=0.3, duration=2.0, seed=1)
+        summary = asyncio.run(run_load(base_url, scenario, ('admin', 'secret')))
+
+        endpoints = summary['endpoints']
+        assert endpoints['GET /api/events/stream']['requests'] == 5
+        assert endpoints['POST /api/queue/register']['statuses'] == {'200': 6}
+        assert endpoints['POST /api/admin/queue/next']['errors'] == 0
+        assert endpoints['GET /api/queue/status/{callsign}']['requests'] > 0
+        assert summary['stations_worked'] > 0
+        # Every listener saw the registrations and the QSOs
+        assert summary['events']['queue_update'] >= 5 * 6
+        assert summary['events']['current_qso'] >= 5
+        assert summary['delivery_lag']['events'] > 0
@@ -0,0 +1,104 @@
+"""Test the on-demand profiling endpoints"""
+import os
+import marshal
+import threading
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.app import create_app
+from app.profiling import Profiler, ProfilerBusy, StackSampler
+
+ADMIN_ENV = {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret'}
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(100))
+
+
+class TestProfiler:
+    """Test the sampler, cProfile and tracemalloc diffs"""
+
+    def test_sampler_collapses_stacks_per_thread(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,), name='busy-worker')
+        worker.start()
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+        try:
+            stop.wait(0.1)
+        finally:
+            sampler.stop()
+            stop.set()
+            worker.join()
+
+        lines = sampler.collapsed().splitlines()
+        assert sampler.samples > 0
+        busy = [line for line in lines if line.startswith('busy-worker;')]
+        assert busy and all('busy_loop (test_profiling.py:' in line for line in busy)
+        assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+        assert not any('stack-sampler' in line for line in lines)
+
+    @pytest.mark.asyncio
+    async def test_one_profile_at_a_time(self):
+        profiler = Profiler()
+        with profiler._exclusive():
+            with pytest.raises(ProfilerBusy):
+                await profiler.sample(0.01)
+        assert (await profiler.sample(0.01)) is not None
+
+    def test_memory_diff_shows_growth(self):
+        profiler = Profiler()
+        with pytest.raises(ValueError):
+            profiler.diff()
+        try:
+            profiler.take_snapshot()
+            leak = [bytearray(1024) for _ in range(200)]
+            growth = profiler.diff(limit=5)['growth']
+        finally:
+            profiler.stop_tracing()
+        assert growth[0]['size_diff'] >= 200 * 1024
+        assert any('test_profiling.py' in frame for frame in growth[0]['traceback'])
+        assert len(leak) == 200
+
+
+class TestProfilingEndpoints:
+    """Test the admin endpoints"""
+
+    def test_off_by_default(self):
+        with patch.dict(os.environ, ADMIN_ENV):
+            client = TestClient(create_app())
+            assert client.post('/api/admin/profile?seconds=0.1', auth=('admin', 'secret')).status_code == 404
+            assert client.post('/api/admin/memory/snapshot', auth=('admin', 'secret')).status_code == 404
+
+    def test_sample_profile(self):
+        with patch.dict(os.environ, {**ADMIN_ENV, 'PROFILING_ENABLED': 'true'}):
+            response = TestClient(create_app()).post('/api/admin/profile?seconds=0.1', auth=('admin', 'secret'))
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/plain')
+        assert 'profile.folded' in response.headers['content-disposition']
+
+    def test_cprofile_returns_pstats_dump(self):
+        with patch.dict(os.environ, {**ADMIN_ENV, 'PROFILING_ENABLED': 'true'}):
+            response = TestClient(create_app()).post(
+                '/api/admin/profile?seconds=0.1&mode=cprofile', auth=('admin', 'secret')
+            )
+        assert response.status_code == 200
+        stats = marshal.loads(response.content)
+        assert any(function[2] == 'sleep' for function in stats)
+
+    def test_memory_endpoints(self):
+        with patch.dict(os.environ, {**ADMIN_ENV, 'PROFILING_ENABLED': 'true'}):
+            client = TestClient(create_app())
+            auth = ('admin', 'secret')
+            assert client.get('/api/admin/memory/diff', auth=auth).status_code == 400
+            try:
+                assert client.post('/api/admin/memory/snapshot', auth=auth).json()['tracing'] is True
+                diff = client.get('/api/admin/memory/diff?limit=3', auth=auth).json()
+                assert len(diff['growth']) <= 3
+            finally:
+                assert client.delete('/api/admin/memory', auth=auth).json() == {'tracing': False}
+
+    def test_requires_admin(self):
+        with patch.dict(os.environ, {**ADMIN_ENV, 'PROFILING_ENABLED': 'true'}):
+            assert TestClient(create_app()).post('/api/admin/profile?seconds=0.1').status_code == 401
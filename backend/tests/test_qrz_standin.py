@@ -0,0 +1,91 @@
+"""Tests for QRZService against the local QRZ XML API stand-in"""
+import os
+import time
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.services.qrz import QRZService
+from benchmarks.qrz_standin import QRZStandinConfig, QRZStandinServer, create_qrz_standin_app
+
+
+def make_service(url: str) -> QRZService:
+    """Create a QRZService pointed at the stand-in"""
+    with patch.dict(os.environ, {
+        'QRZ_USERNAME': 'standin',
+        'QRZ_PASSWORD': 'standin',
+        'QRZ_API_URL': url
+    }):
+        return QRZService()
+
+
+class TestQRZStandinApp:
+    """Test the stand-in XML protocol directly"""
+
+    def test_login_and_search(self):
+        client = TestClient(create_qrz_standin_app())
+
+        login = client.get('/xml/current/', params={'username': 'u', 'password': 'p'})
+        assert '<Key>' in login.text
+        key = login.text.split('<Key>')[1].split('</Key>')[0]
+
+        search = client.get('/xml/current/', params={'s': key, 'callsign': 'EI0IRTS'})
+        assert '<call>EI0IRTS</call>' in search.text
+        assert '<land>Ireland</land>' in search.text
+
+    def test_unknown_session_times_out(self):
+        client = TestClient(create_qrz_standin_app())
+        response = client.get('/xml/current/', params={'s': 'bogus', 'callsign': 'W1AW'})
+        assert '<Error>Session Timeout</Error>' in response.text
+
+    def test_error_rate_returns_503(self):
+        client = TestClient(create_qrz_standin_app(QRZStandinConfig(error_rate=1.0)))
+        response = client.get('/xml/current/', params={'username': 'u', 'password': 'p'})
+        assert response.status_code == 503
+
+
+class TestQRZServiceWithStandin:
+    """Test the real QRZService code path end to end against the stand-in"""
+
+    @pytest.fixture
+    def server(self):
+        with QRZStandinServer(QRZStandinConfig(seed=1, not_found={'W1XYZ'})) as server:
+            yield server
+
+    def test_lookup_success(self, server):
+        result = make_service(server.url).lookup_callsign('EI0IRTS')
+
+        assert result['error'] is None
+        assert result['callsign'] == 'EI0IRTS'
+        assert result['name']
+        assert result['dxcc_name'] == 'Ireland'
+        assert result['image'].startswith(f'http://{server.host}:{server.port}/images/')
+
+    def test_session_reused_between_lookups(self, server):
+        service = make_service(server.url)
+        service.lookup_callsign('W1AW')
+        service.lookup_callsign('KC1ABC')
+
+        assert server.stats['logins'] == 1
+        assert server.stats['searches'] == 2
+
+    def test_not_found(self, server):
+        result = make_service(server.url).lookup_callsign('W1XYZ')
+        assert result['error'] is not None
+        assert result['name'] is None
+
+    def test_session_expiry_triggers_relogin(self):
+        with QRZStandinServer(QRZStandinConfig(session_ttl=0.05)) as server:
+            service = make_service(server.url)
+            service.lookup_callsign('W1AW')
+            time.sleep(0.1)
+            result = service.lookup_callsign('W1AW')
+
+            assert result['error'] is None
+            assert server.stats['logins'] == 2
+
+    def test_injected_errors_fall_back(self):
+        with QRZStandinServer(QRZStandinConfig(error_rate=1.0)) as server:
+            result = make_service(server.url).lookup_callsign('EI0IRTS')
+
+            assert result['error'] is not None
+            assert result['dxcc_name'] == 'Ireland'
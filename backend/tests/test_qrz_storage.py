@@ -61,7 +61,7 @@ class TestQRZStorageAtRegistration:
         mock_qrz_service.lookup_callsign.assert_called_once_with('KC1ABC')
         
         # Verify database was called with QRZ information
-        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info)
+        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info, include_queue=True)
     
     @patch('app.routes.queue.queue_db')
     def test_get_status_uses_stored_qrz_info(self, mock_db, test_client):
@@ -226,7 +226,7 @@ class TestQRZStorageAtRegistration:
         
         # Verify QRZ service was called and database was updated with error info
         mock_qrz_service.lookup_callsign.assert_called_once_with('KC1ABC')
-        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info)
+        mock_db.register_callsign.assert_called_once_with('KC1ABC', mock_qrz_info, include_queue=True)
 
 
 class TestQRZRedundancyElimination:
@@ -0,0 +1,130 @@
+"""Tests for the in-memory queue engine and its write-behind persistence"""
+import time
+import pytest
+from unittest.mock import Mock, patch
+from pymongo.errors import AutoReconnect, DuplicateKeyError
+from app.database import QueueDatabase, queue_settings
+from app.engine import InMemoryQueueEngine
+
+
+@pytest.fixture
+def engine():
+    """Engine without persistence, active and with room for a few stations"""
+    engine = InMemoryQueueEngine(store=None)
+    engine.set_system_status(True, 'admin')
+    with patch.object(queue_settings, 'max_size', 4):
+        yield engine
+
+
+@pytest.fixture
+def mongo_store():
+    """QueueDatabase backed by mongomock collections"""
+    mongomock = pytest.importorskip('mongomock')
+    client = mongomock.MongoClient()
+    store = Mock(spec=QueueDatabase)
+    store.collection = client.db.queue
+    store.status_collection = client.db.status
+    store.currentqso_collection = client.db.currentqso
+    return store
+
+
+class TestInMemoryQueueEngine:
+    """Test engine specifics (shared semantics are in test_storage_backends)"""
+
+    def test_returned_entries_are_copies(self, engine):
+        entry = engine.register_callsign('W1AW', {'callsign': 'W1AW', 'name': 'Hiram'})
+        entry['qrz']['name'] = 'Changed'
+        assert engine.find_callsign('W1AW')['qrz']['name'] == 'Hiram'
+
+
+class TestWriteBehindPersistence:
+    """Test that mutations reach MongoDB in order and state survives a restart"""
+
+    def test_mutations_are_persisted(self, mongo_store):
+        engine = InMemoryQueueEngine(mongo_store)
+        engine.set_system_status(True, 'admin')
+        engine.register_callsign('W1AW')
+        engine.register_callsign('KC1ABC')
+        engine.get_next_callsign()
+        engine.set_current_qso('W1AW')
+        engine.set_frequency('14.205', 'admin')
+        engine.close()
+
+        assert [doc['callsign'] for doc in mongo_store.collection.find()] == ['KC1ABC']
+        assert mongo_store.currentqso_collection.find_one({'_id': 'current_qso'})['callsign'] == 'W1AW'
+        assert mongo_store.status_collection.find_one({'_id': 'system_status'})['active'] is True
+        assert mongo_store.status_collection.find_one({'_id': 'frequency'})['frequency'] == '14.205'
+
+    def test_restart_recovers_state(self, mongo_store):
+        engine = InMemoryQueueEngine(mongo_store)
+        engine.set_system_status(True, 'admin')
+        engine.register_callsign('W1AW')
+        engine.register_callsign('KC1ABC')
+        engine.set_split('up 5', 'admin')
+        engine.close()
+
+        restarted = InMemoryQueueEngine(mongo_store)
+
+        assert restarted.is_system_active()
+        assert [e['callsign'] for e in restarted.get_queue_list()] == ['W1AW', 'KC1ABC']
+        assert restarted.get_split()['split'] == 'up 5'
+        # The sequence continues after a restart
+        assert restarted.register_callsign('W2AW')['seq'] == 3
+        restarted.close()
+
+    def test_flush_waits_for_pending_writes(self, mongo_store):
+        engine = InMemoryQueueEngine(mongo_store)
+        engine.set_system_status(True, 'admin')
+        engine.register_callsign('W1AW')
+        engine.flush()
+
+        assert engine.pending_writes == 0
+        assert mongo_store.collection.count_documents({}) == 1
+        engine.close()
+
+    def test_retried_write_is_idempotent(self, mongo_store):
+        # The first insert commits but the acknowledgement is lost
+        replace_one = mongo_store.collection.replace_one
+        attempts = []
+
+        def flaky_replace_one(*args, **kwargs):
+            result = replace_one(*args, **kwargs)
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise AutoReconnect('connection lost')
+            return result
+
+        engine = InMemoryQueueEngine(mongo_store, retry_delay=0.01)
+        engine.set_system_status(True, 'admin')
+        with patch.object(mongo_store.collection, 'replace_one', side_effect=flaky_replace_one):
+            engine.register_callsign('W1AW')
+            engine.flush()
+
+        assert len(attempts) == 2
+        assert [doc['callsign'] for doc in mongo_store.collection.find()] == ['W1AW']
+        engine.close()
+
+    def test_failing_write_does_not_stop_the_writer(self, mongo_store):
+        engine = InMemoryQueueEngine(mongo_store, retry_delay=0.01)
+        engine.set_system_status(True, 'admin')
+        with engine._lock:
+            engine._persist(Mock(side_effect=DuplicateKeyError('E11000 duplicate key')))
+            engine._persist(Mock(side_effect=KeyError('bug')))
+        engine.register_callsign('W1AW')
+        engine.flush()
+
+        assert engine._writer.is_alive()
+        assert mongo_store.collection.count_documents({}) == 1
+        engine.close()
+
+    def test_close_gives_up_on_unreachable_mongodb(self, mongo_store):
+        engine = InMemoryQueueEngine(mongo_store, retry_delay=0.01, close_timeout=0.2)
+        with patch.object(mongo_store.status_collection, 'replace_one', side_effect=AutoReconnect('unreachable')):
+            engine.set_system_status(True, 'admin')
+            engine.register_callsign('W1AW')
+
+            started = time.perf_counter()
+            engine.close()
+
+        assert time.perf_counter() - started < 1
+        assert not engine._writer.is_alive()
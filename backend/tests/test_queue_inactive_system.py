@@ -13,6 +13,7 @@ from app.database import QueueDatabase
 def mock_database():
     """Create a mock database for testing"""
     mock_db = Mock(spec=QueueDatabase)
+    mock_db.get_state_version.return_value = 1
     return mock_db
 
 
@@ -0,0 +1,68 @@
+"""Test the queue storage microbenchmarks"""
+import pytest
+from unittest.mock import patch
+from app.database import QueueStorage, queue_settings
+from app.engine import InMemoryQueueEngine
+from benchmarks.large_queue import fill
+from benchmarks.queue_ops import compare, destructive_operations, queue_operations, run, time_calls
+
+
+def timings(p50):
+    return {'p50': p50, 'p95': p50, 'mean': p50}
+
+
+class TestQueueOps:
+    """Test which operations are timed and that they leave the queue as they found it"""
+
+    @pytest.fixture
+    def store(self):
+        store = InMemoryQueueEngine(store=None)
+        store.set_system_status(True, 'admin')
+        with patch.object(queue_settings, 'max_size', 20):
+            yield store
+
+    def test_every_storage_method_covered(self, store):
+        callsigns = fill(store, 5)
+        names = {name.split(' ')[0] for name in queue_operations(store, callsigns)}
+        names |= set(destructive_operations(store, callsigns))
+        public = {name for name in dir(QueueStorage) if not name.startswith('_')}
+        assert public <= names
+
+    def test_queue_length_kept(self, store):
+        callsigns = fill(store, 5)
+        for operation in queue_operations(store, callsigns).values():
+            time_calls(operation, 3)
+            assert store.get_queue_count() == 5
+
+        for operation in destructive_operations(store, callsigns).values():
+            time_calls(operation, 2)
+        assert store.get_queue_count() == 0
+
+    def test_run_writes_every_size(self):
+        max_size = queue_settings.max_size
+        results = run('memory', [3, 10], 2)
+        # The queue sizes set for the run don't leak into later code
+        assert queue_settings.max_size == max_size
+        assert results['backend'] == 'memory'
+        assert set(results['results']) == {'3', '10'}
+        assert results['results']['10']['find_callsign']['p50'] >= 0
+
+
+class TestCompare:
+    """Test the baseline comparison"""
+
+    def test_flags_regressions_over_tolerance_and_floor(self):
+        baseline = {'results': {'100': {'find_callsign': timings(1.0), 'get_split': timings(0.01),
+                                        'advance': timings(2.0)}}}
+        current = {'results': {'100': {'find_callsign': timings(1.5), 'get_split': timings(0.03),
+                                       'advance': timings(2.2), 'reset': timings(5.0)}}}
+
+        changes = {change['operation']: change for change in compare(current, baseline, tolerance=0.25, floor_ms=0.05)}
+
+        assert changes['find_callsign']['regression'] is True
+        assert changes['find_callsign']['change'] == pytest.approx(0.5)
+        # Tripled, but by less than the floor
+        assert changes['get_split']['regression'] is False
+        assert changes['advance']['regression'] is False
+        # Not in the baseline
+        assert 'reset' not in changes
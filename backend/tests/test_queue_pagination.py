@@ -0,0 +1,72 @@
+"""Test paging and projection of the queue listing endpoints"""
+import os
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.app import create_app
+from app.database import parse_queue_fields, queue_settings
+from app.sqlite_database import SQLiteQueueDatabase
+
+AUTH = ('admin', 'admin')
+
+
+@pytest.fixture
+def test_client(tmp_path):
+    """Create a test client backed by a real SQLite store holding five stations"""
+    store = SQLiteQueueDatabase(str(tmp_path / 'queue.db'))
+    store.set_system_status(True, 'admin')
+    with patch.object(queue_settings, 'max_size', 10):
+        for callsign in ['W1AW', 'W2AW', 'W3AW', 'W4AW', 'W5AW']:
+            store.register_callsign(callsign)
+    app = create_app()
+
+    with patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'admin'}), \
+         patch.object(queue_settings, 'max_size', 10), \
+         patch('app.routes.admin.queue_db', store), \
+         patch('app.routes.queue.queue_db', store):
+        with TestClient(app) as client:
+            yield client
+
+
+class TestParseQueueFields:
+    """Test the fields= projection parser"""
+
+    def test_accepts_fields_and_qrz_subfields(self):
+        assert parse_queue_fields('callsign, qrz.name,timestamp') == ['callsign', 'qrz.name', 'timestamp']
+        assert parse_queue_fields(None) is None
+
+    def test_whole_qrz_replaces_subfields(self):
+        assert parse_queue_fields('qrz.name,qrz') == ['qrz']
+
+    def test_rejects_unknown_fields(self):
+        with pytest.raises(ValueError, match='Unknown queue field'):
+            parse_queue_fields('callsign,_id')
+
+
+class TestQueuePagination:
+    """Test limit, after and fields on the listing endpoints"""
+
+    def test_public_list_walks_pages(self, test_client):
+        first = test_client.get('/api/queue/list', params={'limit': 2, 'fields': 'callsign'}).json()
+        assert [e['callsign'] for e in first['queue']] == ['W1AW', 'W2AW']
+        assert first['total'] == 5
+        assert set(first['queue'][0]) == {'callsign', 'seq', 'position'}
+
+        second = test_client.get('/api/queue/list', params={'limit': 3, 'after': first['next_cursor']}).json()
+        assert [e['position'] for e in second['queue']] == [3, 4, 5]
+        assert second['next_cursor'] is None
+
+    def test_unpaged_list_is_unchanged(self, test_client):
+        body = test_client.get('/api/queue/list').json()
+        assert len(body['queue']) == 5
+        assert body['next_cursor'] is None
+        assert 'qrz' in body['queue'][0]
+
+    def test_admin_queue_pages(self, test_client):
+        body = test_client.get('/api/admin/queue', params={'limit': 1}, auth=AUTH).json()
+        assert [e['callsign'] for e in body['queue']] == ['W1AW']
+        assert body['next_cursor'] == body['queue'][0]['seq']
+
+    def test_unknown_field_is_rejected(self, test_client):
+        response = test_client.get('/api/queue/list', params={'fields': 'password'})
+        assert response.status_code == 400
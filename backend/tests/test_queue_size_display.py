@@ -6,13 +6,14 @@ import os
 from unittest.mock import Mock, patch
 from fastapi.testclient import TestClient
 from app.app import create_app
-from app.database import QueueDatabase
+from app.database import QueueDatabase, QueueSettings, queue_settings
 
 
 @pytest.fixture
 def mock_database():
     """Create a mock database for testing"""
     mock_db = Mock(spec=QueueDatabase)
+    mock_db.get_state_version.return_value = 1
     return mock_db
 
 
@@ -49,7 +50,7 @@ class TestQueueSizeDisplay:
         mock_db.get_queue_list.return_value = mock_queue
         
         # Test with default MAX_QUEUE_SIZE
-        with patch.dict(os.environ, {'MAX_QUEUE_SIZE': '4'}):
+        with patch.object(queue_settings, 'max_size', 4):
             response = client.get('/api/queue/list')
         
         assert response.status_code == 200
@@ -79,7 +80,7 @@ class TestQueueSizeDisplay:
         }
         
         # Test with custom MAX_QUEUE_SIZE
-        with patch.dict(os.environ, {'MAX_QUEUE_SIZE': '6'}):
+        with patch.object(queue_settings, 'max_size', 6):
             response = client.get('/api/queue/list')
         
         assert response.status_code == 200
@@ -112,6 +113,8 @@ class TestQueueSizeDisplay:
         
         # Test without MAX_QUEUE_SIZE env var (should default to 4)
         with patch.dict(os.environ, {}, clear=True):
+            defaults = QueueSettings.from_env()
+        with patch.object(queue_settings, 'max_size', defaults.max_size):
             response = client.get('/api/queue/list')
         
         assert response.status_code == 200
@@ -2,17 +2,17 @@
 Integration test to demonstrate queue size display functionality
 """
 import pytest
-import os
 from unittest.mock import Mock, patch
 from fastapi.testclient import TestClient
 from app.app import create_app
-from app.database import QueueDatabase
+from app.database import QueueDatabase, queue_settings
 
 
 @pytest.fixture
 def mock_database():
     """Create a mock database for testing"""
     mock_db = Mock(spec=QueueDatabase)
+    mock_db.get_state_version.return_value = 1
     return mock_db
 
 
@@ -42,7 +42,7 @@ class TestQueueSizeIntegration:
         }
         
         # Test with custom queue size limit
-        with patch.dict(os.environ, {'MAX_QUEUE_SIZE': '3'}):
+        with patch.object(queue_settings, 'max_size', 3):
             # Test empty queue
             mock_db.get_queue_list.return_value = []
             response = client.get('/api/queue/list')
@@ -105,7 +105,7 @@ class TestQueueSizeIntegration:
         
         # Test with different queue size limits
         for queue_size in ['2', '4', '6', '10']:
-            with patch.dict(os.environ, {'MAX_QUEUE_SIZE': queue_size}):
+            with patch.object(queue_settings, 'max_size', int(queue_size)):
                 response = client.get('/api/queue/list')
                 assert response.status_code == 200
                 data = response.json()
@@ -0,0 +1,76 @@
+"""Test large-queue mode and its windowed views"""
+import os
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.app import create_app
+from app.database import QueueSettings, queue_settings
+from app.engine import InMemoryQueueEngine
+from app.queue_window import large_queue_mode, queue_update_payload, queue_window_size
+
+LARGE_QUEUE_SETTINGS = {'max_size': 5000, 'window_size': 3, 'neighborhood_radius': 1}
+
+
+@pytest.fixture
+def large_store():
+    """An in-memory store holding 50 stations"""
+    store = InMemoryQueueEngine(store=None)
+    store.set_system_status(True, 'admin')
+    with patch.multiple(queue_settings, **LARGE_QUEUE_SETTINGS):
+        for i in range(50):
+            store.register_callsign(f'W{i}AW')
+        yield store
+
+
+class TestWindowSettings:
+    """Test when large-queue mode is on"""
+
+    def test_off_for_small_queues(self):
+        with patch.multiple(queue_settings, max_size=4, window_size=None):
+            assert not large_queue_mode()
+
+    def test_on_for_large_queues(self):
+        with patch.multiple(queue_settings, max_size=5000, window_size=None):
+            assert queue_window_size() == 20
+
+    def test_explicit_window_size_wins(self):
+        with patch.multiple(queue_settings, max_size=5000, window_size=0):
+            assert not large_queue_mode()
+
+    def test_settings_read_from_environment(self):
+        with patch.dict(os.environ, {'MAX_QUEUE_SIZE': '5000', 'QUEUE_WINDOW_SIZE': '-1',
+                                     'QUEUE_NEIGHBORHOOD_RADIUS': '2'}):
+            settings = QueueSettings.from_env()
+        assert (settings.max_size, settings.window_size, settings.neighborhood_radius) == (5000, 0, 2)
+
+        with patch.dict(os.environ, {}, clear=True):
+            settings = QueueSettings.from_env()
+        assert (settings.max_size, settings.window_size, settings.neighborhood_radius) == (4, None, 5)
+
+
+class TestWindowedViews:
+    """Test that views carry the top of the queue, not the whole queue"""
+
+    def test_event_payload_is_windowed(self, large_store):
+        payload = queue_update_payload(large_store, version=7)
+
+        assert [e['position'] for e in payload['queue']] == [1, 2, 3]
+        assert payload['total'] == 50
+        assert payload['windowed'] is True
+        assert payload['version'] == 7
+
+    def test_snapshot_is_trimmed_to_window(self, large_store):
+        payload = queue_update_payload(large_store, large_store.get_queue_list())
+        assert len(payload['queue']) == 3
+        assert payload['total'] == 50
+
+    def test_public_list_returns_top_and_neighborhood(self, large_store):
+        with patch('app.routes.queue.queue_db', large_store):
+            with TestClient(create_app()) as client:
+                body = client.get('/api/queue/list', params={'callsign': 'w20aw'}).json()
+
+        assert [e['callsign'] for e in body['queue']] == ['W0AW', 'W1AW', 'W2AW']
+        assert body['total'] == 50
+        assert [(e['callsign'], e['position']) for e in body['neighborhood']] == \
+            [('W19AW', 20), ('W20AW', 21), ('W21AW', 22)]
+        assert body['next_cursor'] == body['queue'][-1]['seq']
@@ -0,0 +1,148 @@
+"""Test the traffic recorder and the replay harness"""
+import os
+import json
+import asyncio
+import threading
+import time
+import pytest
+import uvicorn
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.app import create_app
+from app.engine import InMemoryQueueEngine
+from app.recorder import TrafficRecorder, TrafficRecorderMiddleware, read_traffic
+from benchmarks.replay import client_address, load_recording, registered_callsign, replay
+from app.database import queue_settings
+
+
+@pytest.fixture
+def admin_env():
+    with patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret'}), \
+            patch.object(queue_settings, 'max_size', 50):
+        yield
+
+
+@pytest.fixture
+def store(admin_env):
+    store = InMemoryQueueEngine(store=None)
+    store.set_system_status(True, 'admin')
+    with patch('app.routes.queue.queue_db', store), patch('app.routes.admin.queue_db', store), \
+            patch('app.routes.queue.qrz_service.lookup_callsign', return_value={}):
+        yield store
+
+
+class TestTrafficRecorder:
+    """Test what gets recorded and the file format"""
+
+    @pytest.mark.parametrize('filename', ['traffic.jsonl', 'traffic.jsonl.gz'])
+    def test_records_mutating_calls_only(self, store, tmp_path, filename):
+        path = str(tmp_path / filename)
+        recorder = TrafficRecorder(path)
+        with patch('app.recorder.traffic_recorder', recorder):
+            with TestClient(create_app()) as client:
+                client.post('/api/queue/register', json={'callsign': 'W1AW'})
+                client.get('/api/queue/status/W1AW')
+                client.post('/api/admin/queue/next', auth=('admin', 'secret'))
+                client.post('/api/admin/profile', auth=('admin', 'secret'))
+                client.delete('/api/admin/queue/KC1ABC', auth=('admin', 'secret'))
+
+        records = list(read_traffic(path))
+        assert [(r['m'], r['r'], r['s']) for r in records] == [
+            ('POST', '/api/queue/register', 200),
+            ('POST', '/api/admin/queue/next', 200),
+            ('DELETE', '/api/admin/queue/{callsign}', 404),
+        ]
+        register, advance, delete = records
+        assert json.loads(register['b']) == {'callsign': 'W1AW'}
+        assert 'a' not in register
+        assert advance['a'] == 1
+        assert delete['p'] == '/api/admin/queue/KC1ABC'
+        assert register['c'] == recorder.client_key('testclient')
+        # Keys are tied to the recording's secret, not just the address
+        assert TrafficRecorder(path).client_key('testclient') != register['c']
+        assert 0 <= register['t'] <= advance['t']
+        # Credentials are never written
+        assert 'secret' not in open(path, 'rb').read().decode('latin-1')
+
+    def test_stream_open_and_close(self, tmp_path):
+        recorder = TrafficRecorder(str(tmp_path / 'traffic.jsonl'))
+        recorder.start()
+
+        async def run():
+            async def stream(scope, receive, send):
+                await asyncio.sleep(0.05)
+
+            scope = {'type': 'http', 'method': 'GET', 'path': '/api/events/stream', 'headers': [],
+                     'client': ('10.0.0.1', 1234), 'query_string': b''}
+            await TrafficRecorderMiddleware(stream, recorder)(scope, None, None)
+
+        asyncio.run(run())
+        recorder.stop()
+
+        opened, closed = read_traffic(recorder.path)
+        assert opened['e'] == 'open' and closed['e'] == 'close'
+        assert opened['id'] == closed['id']
+        assert opened['c'] == recorder.client_key('10.0.0.1')
+        assert closed['t'] >= opened['t'] + 0.04
+
+    def test_not_a_recording(self, tmp_path):
+        path = tmp_path / 'other.jsonl'
+        path.write_text('{"hello": "world"}\n')
+        with pytest.raises(ValueError):
+            list(read_traffic(str(path)))
+
+
+class TestReplay:
+    """Test replaying a recording against the app"""
+
+    @pytest.fixture
+    def base_url(self, store):
+        server = uvicorn.Server(uvicorn.Config(create_app(), host='127.0.0.1', port=0, log_level='warning'))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            time.sleep(0.01)
+        yield f"http://127.0.0.1:{server.servers[0].sockets[0].getsockname()[1]}"
+        server.should_exit = True
+        thread.join(timeout=5.0)
+
+    def recording(self, tmp_path):
+        recorder = TrafficRecorder(str(tmp_path / 'traffic.jsonl'))
+        recorder.start()
+        for record in [
+            {'t': 0.0, 'e': 'open', 'id': 1, 'c': 'aaaaaaaa'},
+            {'t': 0.0, 'e': 'open', 'id': 2, 'c': 'bbbbbbbb'},
+            {'t': 6.0, 'm': 'POST', 'p': '/api/queue/register', 'r': '/api/queue/register', 'c': '00000001',
+             'b': '{"callsign":"W1AW"}', 's': 200},
+            {'t': 5.0, 'm': 'POST', 'p': '/api/queue/register', 'r': '/api/queue/register', 'c': '00000002',
+             'b': '{"callsign":"KC1ABC"}', 's': 200},
+            {'t': 7.0, 'm': 'POST', 'p': '/api/admin/queue/next', 'r': '/api/admin/queue/next', 'c': 'ffffffff',
+             'a': 1, 's': 200},
+            {'t': 8.0, 'e': 'close', 'id': 2},
+            {'t': 8.5, 'e': 'close', 'id': 99},
+        ]:
+            recorder.record(record)
+        recorder.stop()
+        return load_recording(recorder.path)
+
+    def test_helpers(self, tmp_path):
+        records = self.recording(tmp_path)
+        assert [record['t'] for record in records] == sorted(record['t'] for record in records)
+        assert registered_callsign(records[2]) == 'KC1ABC'
+        assert registered_callsign(records[4]) is None
+        assert client_address('00010203') == '10.1.2.3'
+
+    def test_replay_time_compressed(self, tmp_path, base_url, store):
+        records = self.recording(tmp_path)
+        started = time.perf_counter()
+        summary = asyncio.run(replay(base_url, records, speed=10.0, auth=('admin', 'secret'), drain=0.5))
+
+        # 8.5s of recorded traffic at 10x, plus the drain time
+        assert time.perf_counter() - started < 4.0
+        endpoints = summary['endpoints']
+        assert endpoints['POST /api/queue/register']['statuses'] == {'200': 2}
+        assert endpoints['POST /api/admin/queue/next']['statuses'] == {'200': 1}
+        assert endpoints['GET /api/events/stream']['requests'] == 2
+        assert store.get_current_qso()['callsign'] == 'KC1ABC'
+        assert summary['events']['queue_update'] >= 3
+        assert summary['delivery_lag']['events'] > 0
@@ -0,0 +1,127 @@
+"""
+Tests for the Redis queue backend and the Redis pub/sub event relay
+"""
+import os
+import json
+import asyncio
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.app import create_app
+from app.database import create_queue_db, queue_settings
+from app.redis_database import RedisQueueDatabase
+from app.services.events import EventBroadcaster, EventType, RedisEventRelay, redis_events_url
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def redis_store():
+    pytest.importorskip('lupa')  # fakeredis needs lupa to run the Lua scripts
+    store = RedisQueueDatabase(fakeredis.FakeRedis(decode_responses=True))
+    store.set_system_status(True, 'admin')
+    with patch.object(queue_settings, 'max_size', 10):
+        yield store
+
+
+class TestRedisQueueDatabase:
+    """Test Redis specifics"""
+
+    def test_queue_is_sorted_set_scored_by_sequence(self, redis_store):
+        redis_store.register_callsign('W1AW')
+        redis_store.register_callsign('KC1ABC')
+        redis_store.get_next_callsign()
+        redis_store.register_callsign('W1AW')
+
+        scores = redis_store.client.zrange(redis_store.queue_key, 0, -1, withscores=True)
+        assert scores == [('KC1ABC', 2.0), ('W1AW', 3.0)]
+        assert redis_store.find_callsign('W1AW')['position'] == 2
+
+    def test_status_is_stored_in_a_hash(self, redis_store):
+        assert redis_store.client.hget(redis_store.status_key, 'active') == 'true'
+
+    def test_nodes_sharing_redis_see_the_same_queue(self, redis_store):
+        other_node = RedisQueueDatabase(redis_store.client)
+        redis_store.register_callsign('W1AW')
+
+        with pytest.raises(ValueError, match='already in queue'):
+            other_node.register_callsign('W1AW')
+        assert other_node.get_next_callsign()['callsign'] == 'W1AW'
+        assert redis_store.get_queue_count() == 0
+
+    def test_clearing_qso_bumps_version_atomically(self, redis_store):
+        redis_store.set_current_qso('W1AW')
+        version = redis_store.get_state_version()
+
+        cleared = redis_store.clear_current_qso()
+        assert cleared['callsign'] == 'W1AW'
+        assert cleared['version'] == version + 1 == redis_store.get_state_version()
+        assert redis_store.get_current_qso() is None
+        # Nothing to clear, nothing written
+        assert redis_store.clear_current_qso() is None
+        assert redis_store.get_state_version() == version + 1
+
+    def test_redis_uri_selects_redis(self):
+        with patch.dict(os.environ, {'MONGO_URI': 'redis://localhost:6379/0'}), \
+             patch('app.redis_database.redis.Redis.from_url', return_value=fakeredis.FakeRedis(decode_responses=True)):
+            store = create_queue_db()
+        assert isinstance(store, RedisQueueDatabase)
+
+
+class TestRedisEventRelay:
+    """Test that events published on one node reach clients on every node"""
+
+    def test_events_url_falls_back_to_redis_mongo_uri(self):
+        with patch.dict(os.environ, {'MONGO_URI': 'redis://cache:6379/0'}, clear=True):
+            assert redis_events_url() == 'redis://cache:6379/0'
+        with patch.dict(os.environ, {'MONGO_URI': 'mongodb://localhost:27017'}, clear=True):
+            assert redis_events_url() is None
+
+    @pytest.mark.asyncio
+    async def test_event_reaches_other_node(self):
+        server = fakeredis.FakeServer()
+        node_a, node_b = EventBroadcaster(), EventBroadcaster()
+        relay_a = RedisEventRelay(node_a, fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        relay_b = RedisEventRelay(node_b, fakeredis.FakeAsyncRedis(server=server, decode_responses=True))
+        await relay_a.start()
+        await relay_b.start()
+
+        queue_a, queue_b = asyncio.Queue(), asyncio.Queue()
+        await node_a.add_connection(queue_a)
+        await node_b.add_connection(queue_b)
+
+        try:
+            await node_a.broadcast_event(EventType.QUEUE_UPDATE, {'total': 1})
+
+            for connection_queue in (queue_a, queue_b):
+                message = await asyncio.wait_for(connection_queue.get(), timeout=5)
+                payload = json.loads(message.split('data: ')[1])
+                assert message.startswith('event: queue_update')
+                assert payload['data'] == {'total': 1}
+            # Delivered once per node, not once locally and again via Redis
+            assert queue_a.empty()
+        finally:
+            await relay_a.stop()
+            await relay_b.stop()
+
+    @pytest.mark.asyncio
+    async def test_stop_restores_local_delivery(self):
+        broadcaster = EventBroadcaster()
+        relay = RedisEventRelay(broadcaster, fakeredis.FakeAsyncRedis(decode_responses=True))
+        await relay.start()
+        await relay.stop()
+
+        queue = asyncio.Queue()
+        await broadcaster.add_connection(queue)
+        await broadcaster.broadcast_event(EventType.SYSTEM_STATUS, {'active': True})
+        assert queue.qsize() == 1
+
+    def test_unreachable_redis_does_not_abort_startup(self):
+        broadcaster = EventBroadcaster()
+        with patch.dict(os.environ, {'REDIS_URL': 'redis://unreachable:6379/0'}), \
+                patch('app.services.events.event_broadcaster', broadcaster), \
+                patch.object(RedisEventRelay, 'start', side_effect=ConnectionError('connection refused')):
+            # Entering the client runs the startup hooks
+            with TestClient(create_app()) as client:
+                assert not hasattr(client.app.state, 'event_relay')
+        assert broadcaster._relay is None
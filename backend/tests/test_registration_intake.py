@@ -0,0 +1,132 @@
+"""Test the registration intake buffer and its 202 ticket flow"""
+import os
+import time
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, Mock, patch
+from app.app import create_app
+from app.database import QueueDatabase
+from app.engine import InMemoryQueueEngine
+from app.services.intake import RegistrationIntake, IntakeFull, TicketStatus
+
+
+@pytest.fixture
+def mock_db():
+    """A mock store that records the registration order, and the mocked broadcaster"""
+    db = Mock(spec=QueueDatabase)
+    db.register_callsign.side_effect = lambda callsign, qrz_info, include_queue: {
+        'callsign': callsign, 'position': db.register_callsign.call_count, 'version': 1, 'queue': []
+    }
+    with patch('app.services.intake.queue_db', db), \
+         patch('app.services.intake.qrz_service') as qrz, \
+         patch('app.services.intake.event_broadcaster') as broadcaster:
+        qrz.lookup_callsign.side_effect = lambda callsign: {'callsign': callsign}
+        broadcaster.broadcast_queue_update = AsyncMock()
+        broadcaster.broadcast_registration_result = AsyncMock()
+        yield db, broadcaster
+
+
+class TestRegistrationIntake:
+    """Test the buffer and worker"""
+
+    @pytest.mark.asyncio
+    async def test_commits_in_arrival_order(self, mock_db):
+        mock_db, broadcaster = mock_db
+        intake = RegistrationIntake(capacity=10)
+        await intake.start()
+        try:
+            tickets = [intake.submit(callsign) for callsign in ['W1AW', 'KC1ABC', 'W2AW']]
+            assert all(t['status'] == TicketStatus.PENDING for t in tickets)
+            await asyncio.wait_for(intake._buffer.join(), timeout=5)
+        finally:
+            await intake.stop()
+
+        assert [c.args[0] for c in mock_db.register_callsign.call_args_list] == ['W1AW', 'KC1ABC', 'W2AW']
+        results = [intake.get_ticket(t['ticket_id']) for t in tickets]
+        assert [r['status'] for r in results] == ['registered'] * 3
+        assert results[1]['entry']['position'] == 2
+        assert broadcaster.broadcast_registration_result.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_full_buffer_rejects(self, mock_db):
+        intake = RegistrationIntake(capacity=2)
+        await intake.start()
+        try:
+            intake.submit('W1AW')
+            intake.submit('W2AW')
+            with pytest.raises(IntakeFull):
+                intake.submit('W3AW')
+        finally:
+            await intake.stop()
+
+    @pytest.mark.asyncio
+    async def test_pending_callsign_keeps_its_ticket(self, mock_db):
+        intake = RegistrationIntake(capacity=5)
+        await intake.start()
+        try:
+            first = intake.submit('W1AW')
+            assert intake.submit('W1AW')['ticket_id'] == first['ticket_id']
+            assert intake.depth == 1
+        finally:
+            await intake.stop()
+
+    @pytest.mark.asyncio
+    async def test_rule_violation_rejects_ticket(self, mock_db):
+        mock_db, broadcaster = mock_db
+        mock_db.register_callsign.side_effect = ValueError('Callsign already in queue')
+        intake = RegistrationIntake(capacity=5)
+        await intake.start()
+        try:
+            ticket = intake.submit('W1AW')
+            await asyncio.wait_for(intake._buffer.join(), timeout=5)
+        finally:
+            await intake.stop()
+
+        result = intake.get_ticket(ticket['ticket_id'])
+        assert result['status'] == 'rejected'
+        assert result['error'] == 'Callsign already in queue'
+        broadcaster.broadcast_queue_update.assert_not_called()
+
+
+class TestIntakeEndpoints:
+    """Test the 202 response and the ticket-status endpoint"""
+
+    def test_register_returns_ticket_then_outcome(self):
+        store = InMemoryQueueEngine(store=None)
+        store.set_system_status(True, 'admin')
+        with patch.dict(os.environ, {'REGISTRATION_INTAKE': 'true'}), \
+             patch('app.routes.queue.queue_db', store), \
+             patch('app.services.intake.queue_db', store), \
+             patch('app.services.intake.qrz_service') as qrz:
+            qrz.lookup_callsign.side_effect = lambda callsign: {'callsign': callsign, 'name': 'Hiram'}
+            with TestClient(create_app()) as client:
+                response = client.post('/api/queue/register', json={'callsign': 'w1aw'})
+                assert response.status_code == 202
+                ticket_id = response.json()['ticket']['ticket_id']
+
+                deadline = time.monotonic() + 5
+                ticket = client.get(f'/api/queue/ticket/{ticket_id}').json()
+                while ticket['status'] == 'pending' and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                    ticket = client.get(f'/api/queue/ticket/{ticket_id}').json()
+
+        assert ticket['status'] == 'registered'
+        assert ticket['entry']['position'] == 1
+        assert store.find_callsign('W1AW')['qrz']['name'] == 'Hiram'
+
+    def test_inactive_system_gets_no_ticket(self):
+        store = InMemoryQueueEngine(store=None)
+        with patch.dict(os.environ, {'REGISTRATION_INTAKE': 'true'}), \
+             patch('app.routes.queue.queue_db', store), \
+             patch('app.services.intake.queue_db', store):
+            with TestClient(create_app()) as client:
+                response = client.post('/api/queue/register', json={'callsign': 'W1AW'})
+
+        assert response.status_code == 503
+        assert 'inactive' in response.json()['detail']
+        assert store.get_queue_count() == 0
+
+    def test_unknown_ticket_is_404(self):
+        with TestClient(create_app()) as client:
+            assert client.get('/api/queue/ticket/nope').status_code == 404
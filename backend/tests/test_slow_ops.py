@@ -0,0 +1,99 @@
+"""Test the slow-operation log"""
+import os
+import logging
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import Mock, patch
+from app.app import create_app
+from app.engine import InMemoryQueueEngine
+from app.slow_ops import SlowCommandListener, SlowOpLog, current_route, trace_storage
+from app.database import queue_settings
+
+
+class TestSlowOpLog:
+    """Test logging and the rolling top-N"""
+
+    def test_keeps_slowest_and_logs_over_threshold(self, caplog):
+        log = SlowOpLog(threshold_ms=50, top_n=3)
+        token = current_route.set('POST /api/admin/queue/next')
+        try:
+            with caplog.at_level(logging.WARNING, logger='app.slow_ops'):
+                for duration in [5, 80, 1, 30, 12]:
+                    log.record('storage', f'op{duration}', duration, documents=1)
+        finally:
+            current_route.reset(token)
+
+        assert [op['name'] for op in log.slowest()] == ['op80', 'op30', 'op12']
+        assert log.slowest()[0]['route'] == 'POST /api/admin/queue/next'
+        assert log.stats()['slow'] == 1
+        assert len(caplog.records) == 1
+        assert 'op80' in caplog.text and 'POST /api/admin/queue/next' in caplog.text
+
+    def test_window_rolls_over(self):
+        log = SlowOpLog(threshold_ms=1000, top_n=5, window=120, bucket=60)
+        with patch('app.slow_ops.time.time', return_value=1000.0):
+            log.record('storage', 'old', 500)
+        with patch('app.slow_ops.time.time', return_value=1090.0):
+            log.record('storage', 'recent', 1)
+            assert [op['name'] for op in log.slowest()] == ['old', 'recent']
+        with patch('app.slow_ops.time.time', return_value=1200.0):
+            assert [op['name'] for op in log.slowest()] == ['recent']
+
+
+class TestTracing:
+    """Test the storage wrapper and the MongoDB command listener"""
+
+    def test_storage_calls_recorded_with_document_counts(self):
+        log = SlowOpLog(threshold_ms=1000)
+        store = trace_storage(InMemoryQueueEngine(store=None), log)
+        store.set_system_status(True, 'admin')
+        with patch.object(queue_settings, 'max_size', 10):
+            store.register_callsign('W1AW')
+            store.register_callsign('KC1ABC')
+            with pytest.raises(ValueError):
+                store.register_callsign('W1AW')
+        store.get_queue_list()
+
+        ops = {op['name']: op for op in log.slowest()}
+        assert ops['InMemoryQueueEngine.get_queue_list']['documents'] == 2
+        assert any(op['error'] == 'Callsign already in queue' for op in log.slowest())
+        assert log.recorded >= 5
+
+    def test_command_listener_counts_documents(self):
+        log = SlowOpLog(threshold_ms=1000)
+        listener = SlowCommandListener(log)
+        listener.succeeded(Mock(command_name='find', duration_micros=2500,
+                                reply={'cursor': {'firstBatch': [{}, {}, {}]}, 'ok': 1}))
+        listener.succeeded(Mock(command_name='update', duration_micros=900, reply={'n': 1, 'ok': 1}))
+        listener.failed(Mock(command_name='insert', duration_micros=100, failure={'errmsg': 'duplicate key'}))
+
+        ops = log.slowest()
+        assert [(op['name'], op['documents'], op['duration_ms']) for op in ops[:2]] == [('find', 3, 2.5), ('update', 1, 0.9)]
+        assert 'duplicate key' in ops[2]['error']
+
+
+class TestSlowOpEndpoint:
+    """Test the admin endpoint and the originating route"""
+
+    def test_reports_route_behind_slow_call(self):
+        log = SlowOpLog(threshold_ms=0)
+        store = trace_storage(InMemoryQueueEngine(store=None), log)
+        store.set_system_status(True, 'admin')
+        with patch('app.slow_ops.slow_op_log', log), \
+             patch('app.routes.queue.queue_db', store), \
+             patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret'}):
+            client = TestClient(create_app())
+            client.get('/api/queue/status/W1AW')
+            response = client.get('/api/admin/slow-ops', auth=('admin', 'secret'))
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body['enabled'] is True
+        ops = {op['name']: op for op in body['slowest']}
+        assert ops['InMemoryQueueEngine.find_callsign']['route'] == 'GET /api/queue/status/W1AW'
+        assert ops['InMemoryQueueEngine.set_system_status']['route'] is None
+
+    def test_disabled_by_default(self):
+        with patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'secret'}):
+            response = TestClient(create_app()).get('/api/admin/slow-ops', auth=('admin', 'secret'))
+        assert response.json() == {'enabled': False, 'slowest': []}
@@ -0,0 +1,25 @@
+"""Test the SSE fan-out benchmark"""
+import os
+import pytest
+from benchmarks.sse_fanout import build_payload, measure
+
+
+class TestFanoutBenchmark:
+    """Test the fan-out, delivery and memory measurements"""
+
+    def test_payload_windowed(self):
+        before = dict(os.environ)
+        payload = build_payload(30, 10)
+        assert dict(os.environ) == before
+        assert len(payload['queue']) == 10
+        assert payload['total'] == 30
+
+    @pytest.mark.asyncio
+    async def test_measure(self):
+        payload = build_payload(5, 0)
+        result = await measure(200, payload, 3)
+
+        assert 0 < result['fanout_p50_ms'] <= result['last_delivery_p50_ms']
+        assert 0 <= result['lag_p50_ms'] <= result['lag_p99_ms']
+        assert result['memory_per_event_bytes'] > 0
+        assert result['memory_per_subscriber_bytes'] == result['memory_per_event_bytes'] / 200
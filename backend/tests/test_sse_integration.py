@@ -89,8 +89,11 @@ class TestSSEIntegration:
             # Setup mocks
             mock_db.get_system_status.return_value = {'active': True}
             mock_qrz.lookup_callsign.return_value = {'name': 'Test User'}
-            mock_db.register_callsign.return_value = {'callsign': 'TEST123', 'position': 1}
-            mock_db.get_queue_list.return_value = [{'callsign': 'TEST123', 'position': 1}]
+            mock_db.register_callsign.return_value = {
+                'callsign': 'TEST123',
+                'position': 1,
+                'queue': [{'callsign': 'TEST123', 'position': 1}]
+            }
             
             # Make the registration request
             response = client.post("/api/queue/register", json={"callsign": "TEST123"})
@@ -123,17 +126,15 @@ class TestSSEIntegration:
              patch.object(event_broadcaster, 'broadcast_queue_update', new_callable=AsyncMock) as mock_broadcast_queue:
             
             # Setup mocks
-            mock_db.clear_current_qso.return_value = None
-            mock_db.get_next_callsign.return_value = {
-                'callsign': 'TEST123',
-                'qrz': {'name': 'Test User'}
+            mock_db.advance.return_value = {
+                'previous_qso': None,
+                'current_qso': {
+                    'callsign': 'TEST123',
+                    'timestamp': '2024-01-01T12:00:00',
+                    'qrz': {'name': 'Test User'}
+                },
+                'queue': []
             }
-            mock_db.set_current_qso.return_value = {
-                'callsign': 'TEST123',
-                'timestamp': '2024-01-01T12:00:00',
-                'qrz': {'name': 'Test User'}
-            }
-            mock_db.get_queue_list.return_value = []
             
             # Make the next callsign request
             response = client.post("/api/admin/queue/next")
@@ -144,6 +145,10 @@ class TestSSEIntegration:
             # Verify that both events were broadcast
             mock_broadcast_qso.assert_called_once()
             mock_broadcast_queue.assert_called_once()
+            
+            # The new state comes back from the atomic advance instead of separate reads
+            mock_db.advance.assert_called_once_with(include_queue=True)
+            mock_db.get_queue_list.assert_not_called()
         
         # Clean up
         test_app.dependency_overrides.clear()
@@ -0,0 +1,121 @@
+"""Test the state version behind If-Match, If-None-Match and ETag"""
+import os
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from app.app import create_app
+from app.sqlite_database import SQLiteQueueDatabase
+from app.versioning import etag_matches, parse_version
+
+AUTH = ('admin', 'admin')
+
+
+@pytest.fixture
+def test_client(tmp_path):
+    """Create a test client backed by a real SQLite store"""
+    store = SQLiteQueueDatabase(str(tmp_path / 'queue.db'))
+    store.set_system_status(True, 'admin')
+    app = create_app()
+
+    with patch.dict(os.environ, {'ADMIN_USERNAME': 'admin', 'ADMIN_PASSWORD': 'admin'}), \
+         patch('app.routes.admin.queue_db', store), \
+         patch('app.routes.queue.queue_db', store):
+        with TestClient(app) as client:
+            yield client, store
+
+
+class TestVersionHeaders:
+    """Test parsing of version preconditions"""
+
+    def test_parse_version_accepts_etag_forms(self):
+        assert parse_version('12') == 12
+        assert parse_version('"12"') == 12
+        assert parse_version('W/"12"') == 12
+        assert parse_version(None) is None
+
+    def test_parse_version_rejects_garbage(self):
+        with pytest.raises(HTTPException) as exc_info:
+            parse_version('"abc"')
+        assert exc_info.value.status_code == 400
+
+    def test_etag_matches(self):
+        assert etag_matches('"3", "4"', 4)
+        assert etag_matches('*', 4)
+        assert not etag_matches('"3"', 4)
+        assert not etag_matches(None, 4)
+
+
+class TestConditionalRequests:
+    """Test version-aware endpoints"""
+
+    def test_queue_list_exposes_version_and_etag(self, test_client):
+        client, store = test_client
+        store.register_callsign('W1AW')
+
+        response = client.get('/api/queue/list')
+        assert response.status_code == 200
+        assert response.json()['version'] == store.get_state_version()
+        assert response.headers['etag'] == f'"{store.get_state_version()}"'
+
+    def test_unchanged_queue_list_returns_304(self, test_client):
+        client, store = test_client
+        etag = client.get('/api/queue/list').headers['etag']
+
+        assert client.get('/api/queue/list', headers={'If-None-Match': etag}).status_code == 304
+        store.register_callsign('W1AW')
+        assert client.get('/api/queue/list', headers={'If-None-Match': etag}).status_code == 200
+
+    def test_second_admin_with_same_version_gets_409(self, test_client):
+        client, store = test_client
+        store.register_callsign('W1AW')
+        store.register_callsign('KC1ABC')
+        version = client.get('/api/admin/queue', auth=AUTH).json()['version']
+
+        first = client.post('/api/admin/queue/next', auth=AUTH, headers={'If-Match': f'"{version}"'})
+        second = client.post('/api/admin/queue/next', auth=AUTH, headers={'If-Match': f'"{version}"'})
+
+        assert first.status_code == 200
+        assert first.json()['callsign'] == 'W1AW'
+        assert second.status_code == 409
+        assert second.headers['etag'] == f'"{store.get_state_version()}"'
+        # Only one station was advanced
+        assert store.get_current_qso()['callsign'] == 'W1AW'
+        assert store.get_queue_count() == 1
+
+    def test_conditional_write_reports_the_version_it_wrote(self, test_client):
+        client, store = test_client
+        version = store.register_callsign('W1AW')['version']
+
+        response = client.post('/api/admin/frequency', auth=AUTH, json={'frequency': '14.205'},
+                               headers={'If-Match': f'"{version}"'})
+
+        assert response.status_code == 200
+        # The precondition and the write move the version once
+        assert response.json()['frequency_data']['version'] == version + 1 == store.get_state_version()
+
+    def test_mutations_without_if_match_are_unconditional(self, test_client):
+        client, store = test_client
+        store.register_callsign('W1AW')
+
+        response = client.post('/api/admin/frequency', auth=AUTH, json={'frequency': '14.205'})
+        assert response.status_code == 200
+        assert response.json()['frequency_data']['version'] == store.get_state_version()
+
+    def test_clear_returns_the_version_it_wrote(self, test_client):
+        client, store = test_client
+        store.register_callsign('W1AW')
+
+        # A write landing right after the clear must not leak into the clear's response
+        clear_queue = store.clear_queue
+
+        def clear_then_write():
+            cleared = clear_queue()
+            store.set_frequency('14.205', 'admin')
+            return cleared
+
+        with patch.object(store, 'clear_queue', side_effect=clear_then_write):
+            response = client.post('/api/admin/queue/clear', auth=AUTH)
+
+        assert response.json()['cleared_count'] == 1
+        assert response.json()['version'] == store.get_state_version() - 1
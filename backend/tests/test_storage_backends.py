@@ -0,0 +1,402 @@
+"""Contract tests run against every queue storage backend"""
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from app.database import QueueDatabase, QueueStorage, SEQ_COUNTER_ID, VersionConflict, create_queue_db, queue_settings
+from app.engine import InMemoryQueueEngine
+from app.redis_database import RedisQueueDatabase
+from app.sqlite_database import SQLiteQueueDatabase
+
+
+@pytest.fixture(params=['mongo', 'memory', 'sqlite', 'redis'])
+def store(request, tmp_path):
+    """Each backend, active and with room for a few stations"""
+    if request.param == 'mongo':
+        mongomock = pytest.importorskip('mongomock')
+        with patch('app.database.MongoClient', mongomock.MongoClient):
+            backend = QueueDatabase()
+    elif request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')  # fakeredis needs lupa to run the Lua scripts
+        backend = RedisQueueDatabase(fakeredis.FakeRedis(decode_responses=True))
+    elif request.param == 'memory':
+        backend = InMemoryQueueEngine(store=None)
+    else:
+        backend = SQLiteQueueDatabase(str(tmp_path / 'queue.db'))
+
+    backend.set_system_status(True, 'admin')
+    with patch.object(queue_settings, 'max_size', 4):
+        yield backend
+
+
+class TestStorageContract:
+    """Test that every backend keeps the same queue semantics"""
+
+    def test_register_and_list(self, store):
+        store.register_callsign('W1AW')
+        entry = store.register_callsign('KC1ABC')
+
+        assert entry['position'] == 2
+        assert entry['qrz']['error'] == 'QRZ information not available'
+        assert [e['callsign'] for e in store.get_queue_list()] == ['W1AW', 'KC1ABC']
+        assert [e['position'] for e in store.get_queue_list()] == [1, 2]
+        assert store.get_queue_count() == 2
+
+    def test_register_rejects_duplicates(self, store):
+        store.register_callsign('W1AW')
+        with pytest.raises(ValueError, match='already in queue'):
+            store.register_callsign('W1AW')
+
+    def test_register_respects_max_queue_size(self, store):
+        for callsign in ['W1AW', 'W2AW', 'W3AW', 'W4AW']:
+            store.register_callsign(callsign)
+        with pytest.raises(ValueError, match='Queue is full'):
+            store.register_callsign('W5AW')
+
+    def test_register_when_inactive(self, store):
+        store.set_system_status(False, 'admin')
+        with pytest.raises(ValueError, match='inactive'):
+            store.register_callsign('W1AW')
+
+    def test_find_callsign_position(self, store):
+        store.register_callsign('W1AW')
+        store.register_callsign('KC1ABC')
+        store.remove_callsign('W1AW')
+
+        assert store.find_callsign('KC1ABC')['position'] == 1
+        assert store.find_callsign('W1AW') is None
+
+    def test_qrz_info_round_trips(self, store):
+        store.register_callsign('W1AW', {'callsign': 'W1AW', 'name': 'Hiram', 'dxcc_name': 'United States'})
+        assert store.find_callsign('W1AW')['qrz']['name'] == 'Hiram'
+        assert '_id' not in store.find_callsign('W1AW')
+
+    def test_next_callsign_is_fifo(self, store):
+        store.register_callsign('W1AW')
+        store.register_callsign('KC1ABC')
+
+        assert store.get_next_callsign()['callsign'] == 'W1AW'
+        assert store.get_next_callsign()['callsign'] == 'KC1ABC'
+        assert store.get_next_callsign() is None
+
+    def test_sequence_numbers_order_the_queue(self, store):
+        first = store.register_callsign('W1AW')
+        second = store.register_callsign('KC1ABC')
+        store.get_next_callsign()
+        again = store.register_callsign('W1AW')
+
+        assert first['seq'] < second['seq'] < again['seq']
+        assert [(e['callsign'], e['seq']) for e in store.get_queue_list()] == [('KC1ABC', second['seq']), ('W1AW', again['seq'])]
+        assert store.find_callsign('W1AW')['position'] == 2
+        assert isinstance(store.find_callsign('W1AW')['timestamp'], str)
+
+    def test_mutations_can_return_queue_snapshot(self, store):
+        store.register_callsign('W1AW')
+        entry = store.register_callsign('KC1ABC', include_queue=True)
+
+        assert [(e['callsign'], e['position']) for e in entry['queue']] == [('W1AW', 1), ('KC1ABC', 2)]
+        assert 'queue' not in store.find_callsign('KC1ABC')
+
+        next_entry = store.get_next_callsign(include_queue=True)
+        assert next_entry['callsign'] == 'W1AW'
+        assert [(e['callsign'], e['position']) for e in next_entry['queue']] == [('KC1ABC', 1)]
+        assert 'queue' not in store.register_callsign('W2AW')
+
+    def test_queue_list_pages_by_sequence_cursor(self, store):
+        store.register_callsign('W1AW')
+        store.register_callsign('W2AW')
+        store.get_next_callsign()
+        for callsign in ['W3AW', 'W4AW', 'W5AW']:
+            store.register_callsign(callsign)
+
+        first = store.get_queue_list(limit=2)
+        assert [(e['callsign'], e['position']) for e in first] == [('W2AW', 1), ('W3AW', 2)]
+        rest = store.get_queue_list(limit=2, after=first[-1]['seq'])
+        assert [(e['callsign'], e['position']) for e in rest] == [('W4AW', 3), ('W5AW', 4)]
+        assert store.get_queue_list(after=rest[-1]['seq']) == []
+
+    def test_queue_list_projects_fields(self, store):
+        store.register_callsign('W1AW', {'callsign': 'W1AW', 'name': 'Hiram', 'dxcc_name': 'United States'})
+
+        entry, = store.get_queue_list(fields=['qrz.dxcc_name'])
+        assert entry == {'callsign': 'W1AW', 'seq': entry['seq'], 'position': 1, 'qrz': {'dxcc_name': 'United States'}}
+        entry, = store.get_queue_list(fields=['timestamp'])
+        assert set(entry) == {'callsign', 'seq', 'position', 'timestamp'}
+
+    def test_neighborhood_surrounds_callsign(self, store):
+        for callsign in ['W1AW', 'W2AW', 'W3AW', 'W4AW']:
+            store.register_callsign(callsign)
+
+        assert [(e['callsign'], e['position']) for e in store.get_neighborhood('W3AW', 1)] == \
+            [('W2AW', 2), ('W3AW', 3), ('W4AW', 4)]
+        assert [e['callsign'] for e in store.get_neighborhood('W1AW', 2)] == ['W1AW', 'W2AW', 'W3AW']
+        assert store.get_neighborhood('K1ABC', 2) == []
+
+    def test_advance_can_skip_queue_snapshot(self, store):
+        store.register_callsign('W1AW')
+        store.register_callsign('KC1ABC')
+
+        state = store.advance(include_queue=False)
+        assert state['current_qso']['callsign'] == 'W1AW'
+        assert 'queue' not in state
+        assert state['version'] == store.get_state_version()
+
+    def test_clear_queue(self, store):
+        store.register_callsign('W1AW')
+        store.register_callsign('KC1ABC')
+
+        cleared = store.clear_queue()
+        assert cleared['cleared_count'] == 2
+        assert cleared['version'] == store.get_state_version()
+        assert store.get_queue_count() == 0
+
+    def test_status_change_clears_queue_and_qso(self, store):
+        store.register_callsign('W1AW')
+        store.set_current_qso('KC1ABC')
+
+        status = store.set_system_status(False, 'admin')
+
+        assert status['cleared_count'] == 1
+        assert status['qso_cleared'] is True
+        assert store.get_queue_list() == []
+        assert store.get_current_qso() is None
+        assert store.is_system_active() is False
+
+    def test_advance_promotes_next_callsign(self, store):
+        store.register_callsign('W1AW', {'callsign': 'W1AW', 'name': 'Hiram'})
+        store.register_callsign('KC1ABC')
+
+        state = store.advance()
+        assert state['previous_qso'] is None
+        assert state['current_qso']['callsign'] == 'W1AW'
+        assert state['current_qso']['qrz']['name'] == 'Hiram'
+        assert [(e['callsign'], e['position']) for e in state['queue']] == [('KC1ABC', 1)]
+        assert store.get_current_qso() == state['current_qso']
+
+        state = store.advance()
+        assert state['previous_qso']['callsign'] == 'W1AW'
+        assert state['current_qso']['callsign'] == 'KC1ABC'
+        assert state['queue'] == []
+
+        state = store.advance()
+        assert state['previous_qso']['callsign'] == 'KC1ABC'
+        assert state['current_qso'] is None
+        assert store.get_current_qso() is None
+
+    def test_concurrent_advances_promote_each_station_once(self, store):
+        if isinstance(store, QueueDatabase):
+            pytest.skip('mongomock is not thread-safe')
+        callsigns = ['W1AW', 'W2AW', 'W3AW', 'W4AW']
+        for callsign in callsigns:
+            store.register_callsign(callsign)
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            states = list(pool.map(lambda _: store.advance(), range(4)))
+
+        assert sorted(state['current_qso']['callsign'] for state in states) == callsigns
+        assert store.get_queue_count() == 0
+
+    def test_reset_clears_state_and_sets_status(self, store):
+        store.register_callsign('W1AW')
+        store.advance()
+        store.register_callsign('KC1ABC')
+
+        status = store.reset(False, 'admin')
+
+        assert status['active'] is False
+        assert status['cleared_count'] == 1
+        assert status['qso_cleared'] is True
+        assert store.get_queue_count() == 0
+        assert store.get_current_qso() is None
+
+    def test_current_qso(self, store):
+        assert store.get_current_qso() is None
+        store.set_current_qso('W1AW')
+        assert store.get_current_qso()['callsign'] == 'W1AW'
+        assert store.clear_current_qso()['callsign'] == 'W1AW'
+        assert store.clear_current_qso() is None
+
+    def test_frequency_and_split(self, store):
+        assert store.get_frequency() is None
+        store.set_frequency('14.205', 'admin')
+        assert store.get_frequency()['frequency'] == '14.205'
+        assert store.clear_frequency('admin')['cleared'] is True
+        assert store.get_frequency() is None
+
+        store.set_split('up 5', 'admin')
+        assert store.get_split()['split'] == 'up 5'
+        assert store.clear_split('admin')['split'] is None
+        assert store.get_split() is None
+
+    def test_every_write_bumps_state_version(self, store):
+        versions = [store.get_state_version()]
+        versions.append(store.register_callsign('W1AW')['version'])
+        versions.append(store.register_callsign('KC1ABC')['version'])
+        versions.append(store.remove_callsign('KC1ABC')['version'])
+        versions.append(store.advance()['version'])
+        versions.append(store.set_frequency('14.205', 'admin')['version'])
+        versions.append(store.clear_split('admin')['version'])
+        versions.append(store.clear_current_qso()['version'])
+        store.clear_queue()
+        versions.append(store.get_state_version())
+
+        # One write, one version
+        assert versions == list(range(versions[0], versions[0] + len(versions)))
+        # Reads leave the version alone
+        store.get_queue_list()
+        store.find_callsign('W1AW')
+        assert store.get_state_version() == versions[-1]
+
+    def test_reset_bumps_version_once(self, store):
+        store.register_callsign('W1AW')
+        store.register_callsign('KC1ABC')
+        store.advance()
+        version = store.get_state_version()
+
+        reset = store.reset(True, 'admin')
+
+        assert reset['cleared_count'] == 1
+        assert reset['qso_cleared'] is True
+        assert reset['version'] == version + 1 == store.get_state_version()
+
+    def test_claim_version_admits_one_writer(self, store):
+        version = store.register_callsign('W1AW')['version']
+
+        # The claim reserves the version without bumping it
+        assert store.claim_version(version) == version
+        assert store.get_state_version() == version
+        with pytest.raises(VersionConflict) as conflict:
+            store.claim_version(version)
+        assert conflict.value.current == version
+
+        store.release_version(version)
+        assert store.claim_version(version) == version
+        # The next write moves past the claim
+        assert store.register_callsign('KC1ABC')['version'] == version + 1
+        assert store.claim_version(version + 1) == version + 1
+
+    def test_write_if_version_bumps_once(self, store):
+        version = store.register_callsign('W1AW')['version']
+
+        assert store.write_if_version(version, lambda: store.set_frequency('14.205', 'admin'))['version'] == version + 1
+        assert store.get_state_version() == version + 1
+        with pytest.raises(VersionConflict) as conflict:
+            store.write_if_version(version, lambda: store.set_frequency('7.025', 'admin'))
+        assert conflict.value.current == version + 1
+        assert store.get_frequency()['frequency'] == '14.205'
+
+    def test_write_if_version_releases_unused_claim(self, store):
+        version = store.register_callsign('W1AW')['version']
+
+        # Nothing to clear, so the version doesn't move and stays claimable
+        assert store.write_if_version(version, store.clear_current_qso) is None
+        assert store.write_if_version(version, lambda: store.remove_callsign('W1AW'))['callsign'] == 'W1AW'
+        assert store.get_state_version() == version + 1
+
+
+class TestQueueDatabase:
+    """Test MongoDB specifics"""
+
+    @pytest.fixture
+    def mongo_db(self):
+        mongomock = pytest.importorskip('mongomock')
+        with patch('app.database.MongoClient', mongomock.MongoClient):
+            db = QueueDatabase()
+        db.set_system_status(True, 'admin')
+        return db
+
+    def test_timestamps_are_stored_as_datetimes(self, mongo_db):
+        mongo_db.register_callsign('W1AW')
+        mongo_db.set_current_qso('KC1ABC')
+
+        assert isinstance(mongo_db.collection.find_one({'callsign': 'W1AW'})['timestamp'], datetime)
+        assert isinstance(mongo_db.currentqso_collection.find_one({})['timestamp'], datetime)
+        assert isinstance(mongo_db.get_current_qso()['timestamp'], str)
+
+    def test_advance_recovers_from_interrupted_advance(self, mongo_db):
+        first = mongo_db.register_callsign('W1AW')
+        mongo_db.register_callsign('KC1ABC')
+        # Crash after promoting W1AW but before removing it from the queue
+        mongo_db.currentqso_collection.insert_one({
+            '_id': 'current_qso', 'callsign': 'W1AW', 'seq': first['seq'],
+            'timestamp': datetime.utcnow(), 'qrz': first['qrz']
+        })
+
+        state = mongo_db.advance()
+
+        assert state['previous_qso']['callsign'] == 'W1AW'
+        assert state['current_qso']['callsign'] == 'KC1ABC'
+        assert mongo_db.get_queue_count() == 0
+
+    def test_entries_without_seq_are_backfilled(self):
+        mongomock = pytest.importorskip('mongomock')
+        client = mongomock.MongoClient()
+        # Documents as written before entries carried a seq
+        started = datetime(2024, 1, 1, 12, 0)
+        client.pileup_buster.queue.insert_many([
+            {'callsign': 'KC1ABC', 'timestamp': started + timedelta(minutes=1), 'position': 2, 'qrz': {}},
+            {'callsign': 'W1AW', 'timestamp': started, 'position': 1, 'qrz': {}},
+        ])
+        client.pileup_buster.status.insert_one({'_id': 'system_status', 'active': True})
+        with patch('app.database.MongoClient', return_value=client):
+            db = QueueDatabase()
+        db.register_callsign('K1ABC')
+
+        assert [e['callsign'] for e in db.get_queue_list()] == ['W1AW', 'KC1ABC', 'K1ABC']
+        assert db.find_callsign('KC1ABC')['position'] == 2
+        assert [e['callsign'] for e in db.get_neighborhood('KC1ABC', radius=1)] == ['W1AW', 'KC1ABC', 'K1ABC']
+        assert db.advance()['current_qso']['callsign'] == 'W1AW'
+        assert db.advance()['current_qso']['callsign'] == 'KC1ABC'
+
+    def test_sequence_comes_from_counter(self, mongo_db):
+        mongo_db.register_callsign('W1AW')
+        mongo_db.register_callsign('KC1ABC')
+
+        assert mongo_db.status_collection.find_one({'_id': SEQ_COUNTER_ID})['seq'] == 2
+        # Clearing the queue doesn't reset the counter
+        mongo_db.clear_queue()
+        assert mongo_db.register_callsign('W2AW')['seq'] == 3
+
+
+class TestSQLiteQueueDatabase:
+    """Test SQLite specifics"""
+
+    def test_uses_wal_journal(self, tmp_path):
+        store = SQLiteQueueDatabase(str(tmp_path / 'queue.db'))
+        assert store.conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    def test_state_survives_reopen(self, tmp_path):
+        path = str(tmp_path / 'queue.db')
+        store = SQLiteQueueDatabase(path)
+        store.set_system_status(True, 'admin')
+        store.register_callsign('W1AW')
+        store.set_frequency('7.155', 'admin')
+        store.conn.close()
+
+        reopened = SQLiteQueueDatabase(path)
+        assert reopened.is_system_active()
+        assert reopened.find_callsign('W1AW')['position'] == 1
+        assert reopened.get_frequency()['frequency'] == '7.155'
+
+    def test_failed_registration_rolls_back(self, tmp_path):
+        store = SQLiteQueueDatabase(str(tmp_path / 'queue.db'))
+        store.set_system_status(True, 'admin')
+        store.register_callsign('W1AW')
+        with pytest.raises(ValueError):
+            store.register_callsign('W1AW')
+        # Connection is usable again after the rollback
+        assert store.register_callsign('KC1ABC')['position'] == 2
+
+
+class TestCreateQueueDb:
+    """Test backend selection from the environment"""
+
+    def test_sqlite_uri_selects_sqlite(self, tmp_path):
+        uri = f"sqlite:///{tmp_path / 'queue.db'}"
+        with patch.dict(os.environ, {'MONGO_URI': uri}):
+            store = create_queue_db()
+        assert isinstance(store, SQLiteQueueDatabase)
+        assert isinstance(store, QueueStorage)
+        assert store.path == str(tmp_path / 'queue.db')
@@ -0,0 +1,114 @@
+"""Test request, storage, QRZ, broadcast and intake spans"""
+import os
+import json
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+
+pytest.importorskip('opentelemetry.sdk')
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from app import tracing
+from app.app import create_app
+from app.engine import InMemoryQueueEngine
+from app.services.intake import RegistrationIntake
+from app.database import queue_settings
+
+
+@pytest.fixture
+def exporter():
+    """Record spans in memory for the test"""
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracing.configure_tracing(provider)
+    yield exporter
+    tracing.shutdown_tracing()
+
+
+@pytest.fixture
+def store():
+    store = InMemoryQueueEngine(store=None)
+    store.set_system_status(True, 'admin')
+    with patch.dict(os.environ, {'QRZ_USERNAME': '', 'QRZ_PASSWORD': ''}), patch.object(queue_settings, 'max_size', 10):
+        yield store
+
+
+class TestRequestTracing:
+    """Test the spans of a registration"""
+
+    def test_registration_is_one_trace(self, exporter, store):
+        with patch('app.routes.queue.queue_db', tracing.span_storage(store)):
+            response = TestClient(create_app()).post('/api/queue/register', json={'callsign': 'W1AW'})
+        assert response.status_code == 200
+
+        spans = {span.name: span for span in exporter.get_finished_spans()}
+        request = spans['POST /api/queue/register']
+        assert request.attributes['http.route'] == '/api/queue/register'
+        assert request.attributes['http.response.status_code'] == 200
+        for name in ('InMemoryQueueEngine.register_callsign', 'qrz.lookup_callsign', 'sse.broadcast'):
+            assert spans[name].context.trace_id == request.context.trace_id
+            assert spans[name].parent.span_id == request.context.span_id
+        assert spans['sse.broadcast'].attributes['event.type'] == 'queue_update'
+
+    def test_continues_caller_trace(self, exporter):
+        trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+        TestClient(create_app()).get('/api/queue/status', headers={
+            'traceparent': f'00-{trace_id}-00f067aa0ba902b7-01'
+        })
+        request = next(span for span in exporter.get_finished_spans() if span.name == 'GET /api/queue/status')
+        assert format(request.context.trace_id, '032x') == trace_id
+
+    def test_off_without_exporter(self):
+        assert not tracing.tracing_enabled()
+        assert tracing.span('anything') is tracing._NOOP
+        assert tracing.capture_context() is None
+
+
+class TestBackgroundTracing:
+    """Test that intake work continues the submitting request's trace"""
+
+    @pytest.mark.asyncio
+    async def test_intake_processing_joins_submit_trace(self, exporter, store):
+        with patch('app.services.intake.queue_db', tracing.span_storage(store)), \
+             patch('app.services.intake.event_broadcaster') as broadcaster:
+            broadcaster.broadcast_queue_update = AsyncMock()
+            broadcaster.broadcast_registration_result = AsyncMock()
+            intake = RegistrationIntake(capacity=5)
+            await intake.start()
+            try:
+                with tracing.span('submit') as submit_span:
+                    intake.submit('W1AW')
+                await asyncio.wait_for(intake._buffer.join(), timeout=5)
+            finally:
+                await intake.stop()
+
+        spans = {span.name: span for span in exporter.get_finished_spans()}
+        trace_id = submit_span.get_span_context().trace_id
+        assert spans['intake.process'].context.trace_id == trace_id
+        assert spans['intake.process'].parent.span_id == submit_span.get_span_context().span_id
+        assert spans['InMemoryQueueEngine.register_callsign'].parent.span_id == spans['intake.process'].context.span_id
+
+
+class TestExporters:
+    """Test the offline file exporter"""
+
+    def test_file_exporter_writes_json_lines(self, tmp_path):
+        path = tmp_path / 'traces.jsonl'
+        with patch.dict(os.environ, {'TRACING_FILE': str(path)}):
+            exporter = tracing.create_exporter('file')
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        with provider.get_tracer('test').start_as_current_span('one'):
+            pass
+        provider.shutdown()
+
+        lines = path.read_text().splitlines()
+        assert json.loads(lines[0])['name'] == 'one'
+
+    def test_unknown_exporter(self):
+        with pytest.raises(ValueError):
+            tracing.create_exporter('zipkin')
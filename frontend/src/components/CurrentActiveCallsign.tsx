@@ -1,4 +1,4 @@
-import { QRZ_LOOKUP_URL_TEMPLATE } from '../config/api';
+import { QRZ_LOOKUP_URL_TEMPLATE, getProfileImageUrl } from '../config/api';
 
 interface CurrentActiveUser {
   callsign: string;
@@ -68,7 +68,7 @@ function CurrentActiveCallsign({ activeUser, qrzData, onCompleteQso, isAdminLogg
           title={isAdminLoggedIn && activeUser ? 'Click to complete current QSO' : undefined}
         >
           {hasQrzImage ? (
-            <img src={qrzData.image} alt="Operator" className="operator-image" />
+            <img src={getProfileImageUrl(activeUser.callsign)} alt="Operator" className="operator-image" />
           ) : (
             <div className="placeholder-image" style={{ fontSize: '3rem' }}>👤</div>
           )}
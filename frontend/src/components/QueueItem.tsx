@@ -1,4 +1,5 @@
 import React from 'react';
+import { getProfileImageUrl } from '../config/api';
 
 export interface QueueItemData {
   callsign: string
@@ -50,7 +51,7 @@ export default function QueueItem({ item, index, onWorkNext, isAdminLoggedIn }:
       >
         {hasQrzImage ? (
           <img 
-            src={item.qrz.image} 
+            src={getProfileImageUrl(item.callsign)} 
             alt={`${item.callsign} profile`}
             className="operator-image-qrz"
             onError={() => {
@@ -11,4 +11,9 @@ const getQrzLookupUrl = (): string => {
 }
 
 export const API_BASE_URL = getApiBaseUrl()
-export const QRZ_LOOKUP_URL_TEMPLATE = getQrzLookupUrl()
\ No newline at end of file
+export const QRZ_LOOKUP_URL_TEMPLATE = getQrzLookupUrl()
+
+// Profile images are served through the backend thumbnail cache rather than hot-linked from QRZ
+export const getProfileImageUrl = (callsign: string): string => {
+  return `${API_BASE_URL}/images/${encodeURIComponent(callsign)}`
+}
@@ -38,6 +38,18 @@ export interface RegisterResponse {
   entry: QueueEntry
 }
 
+// Outcome of a registration accepted in intake mode (202 response)
+export interface RegistrationTicket {
+  ticket_id: string
+  callsign: string
+  status: 'pending' | 'registered' | 'rejected'
+  entry?: QueueEntry
+  error?: string
+}
+
+const TICKET_POLL_INTERVAL_MS = 500
+const TICKET_TIMEOUT_MS = 60000
+
 export class ApiError extends Error {
   status: number
   detail?: string
@@ -66,6 +78,26 @@ async function handleResponse<T>(response: Response): Promise<T> {
   return response.json()
 }
 
+// Poll an intake ticket until the registration has been processed
+async function waitForTicket(ticketId: string): Promise<RegistrationTicket> {
+  const deadline = Date.now() + TICKET_TIMEOUT_MS
+  for (;;) {
+    const response = await fetch(`${API_BASE_URL}/queue/ticket/${ticketId}`)
+    const ticket = await handleResponse<RegistrationTicket>(response)
+    if (ticket.status !== 'pending') {
+      return ticket
+    }
+    if (Date.now() > deadline) {
+      throw new ApiError(
+        'Registration still pending',
+        504,
+        'Registration is still being processed. Check the queue in a moment.'
+      )
+    }
+    await new Promise((resolve) => setTimeout(resolve, TICKET_POLL_INTERVAL_MS))
+  }
+}
+
 export const apiService = {
   // Register a new callsign in the queue
   async registerCallsign(callsign: string): Promise<RegisterResponse> {
@@ -76,6 +108,15 @@ export const apiService = {
       },
       body: JSON.stringify({ callsign }),
     })
+    if (response.status === 202) {
+      // Intake mode: the registration was queued, so wait for its outcome
+      const { message, ticket } = await response.json() as { message: string; ticket: RegistrationTicket }
+      const outcome = await waitForTicket(ticket.ticket_id)
+      if (outcome.status === 'rejected' || !outcome.entry) {
+        throw new ApiError('Registration rejected', 400, outcome.error || 'Failed to register callsign')
+      }
+      return { message, entry: outcome.entry }
+    }
     return handleResponse<RegisterResponse>(response)
   },
 